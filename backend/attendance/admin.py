@@ -1,7 +1,12 @@
 # attendance/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, AttendanceRecord, SecurityLog
+from .models import (
+    User, AttendanceRecord, SecurityLog, WorkCalendar, Holiday, DeviceFingerprint, OutboxEvent, WebhookEndpoint,
+    ExportJob
+)
+from .security import search_security_logs
+from .utils import ip_network_bounds
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -21,20 +26,68 @@ class UserAdmin(BaseUserAdmin):
 
 @admin.register(AttendanceRecord)
 class AttendanceRecordAdmin(admin.ModelAdmin):
-    list_display = ('user', 'date', 'check_in_time', 'check_out_time', 'is_late')
-    list_filter = ('date', 'is_late', 'user__role')
+    list_display = ('user', 'date', 'check_in_time', 'check_out_time', 'is_late', 'auto_closed')
+    list_filter = ('date', 'is_late', 'auto_closed', 'user__role')
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
-    readonly_fields = ('check_in_ip', 'check_out_ip', 'check_in_device_info', 'check_out_device_info')
+    readonly_fields = ('check_in_ip', 'check_out_ip', 'check_in_device', 'check_out_device')
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user')
 
 @admin.register(SecurityLog)
 class SecurityLogAdmin(admin.ModelAdmin):
-    list_display = ('user', 'log_type', 'timestamp', 'ip_address')
+    list_display = ('user', 'log_type', 'count', 'timestamp', 'last_seen', 'ip_address')
     list_filter = ('log_type', 'timestamp', 'user__role')
-    search_fields = ('user__username', 'description', 'ip_address')
-    readonly_fields = ('timestamp',)
+    search_fields = ('user__username',)
+    search_help_text = 'Username, IP address or CIDR network, or words from the description'
+    readonly_fields = ('timestamp', 'count', 'last_seen', 'device')
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user')
\ No newline at end of file
+        return super().get_queryset(request).select_related('user')
+    
+    def get_search_results(self, request, queryset, search_term):
+        # IPs and networks use the packed IP index, other text the description index
+        try:
+            first, last = ip_network_bounds(search_term.strip())
+        except ValueError:
+            pass
+        else:
+            return queryset.filter(ip_packed__gte=first, ip_packed__lte=last), False
+        
+        if not search_term.strip():
+            return queryset, False
+        by_username = queryset.filter(user__username=search_term.strip())
+        return by_username | search_security_logs(queryset, search_term), False
+
+class HolidayInline(admin.TabularInline):
+    model = Holiday
+    extra = 1
+
+@admin.register(WorkCalendar)
+class WorkCalendarAdmin(admin.ModelAdmin):
+    list_display = ('name', 'role', 'weekend_days', 'updated_at')
+    inlines = [HolidayInline]
+
+@admin.register(DeviceFingerprint)
+class DeviceFingerprintAdmin(admin.ModelAdmin):
+    list_display = ('user_agent', 'accept_language', 'first_seen')
+    search_fields = ('user_agent', 'fingerprint')
+    readonly_fields = ('fingerprint', 'first_seen')
+
+@admin.register(WebhookEndpoint)
+class WebhookEndpointAdmin(admin.ModelAdmin):
+    list_display = ('url', 'event_types', 'is_active', 'last_event_id', 'failures', 'next_attempt_at')
+    list_filter = ('is_active',)
+    readonly_fields = ('last_event_id', 'failures', 'next_attempt_at', 'last_error', 'created_at')
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'created_at')
+    list_filter = ('event_type',)
+    readonly_fields = ('event_type', 'payload', 'created_at')
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'file_type', 'status', 'row_count', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'file_type')
+    readonly_fields = ('cache_key', 'row_count', 'file_size', 'error', 'created_at', 'finished_at')
@@ -0,0 +1,210 @@
+# attendance/anomalies.py
+from collections import defaultdict
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from .models import User, AttendanceRecord, SecurityLog
+from .reports import fetch_raw_rows, to_epoch_seconds
+from .utils import pack_ip_address
+
+EARTH_RADIUS_KM = 6371.0
+
+RECORD_FIELDS = (
+    'user_id', 'date', 'check_in_time', 'check_out_time', 'check_in_ip', 'check_in_device_id',
+    'check_in_latitude', 'check_in_longitude', 'check_out_latitude', 'check_out_longitude',
+)
+
+# Used when the record behind a finding has no IP (SecurityLog.ip_address is required)
+UNKNOWN_IP = '0.0.0.0'
+
+def anomaly_setting(name):
+    return settings.ANOMALY_DETECTION[name]
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distances between arrays of coordinates, in kilometres"""
+    lat1, lon1, lat2, lon2 = (np.radians(values) for values in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def factorize(keys):
+    """Integer code of each key through a hash index, None becomes -1"""
+    index = {}
+    return np.fromiter(
+        (-1 if key is None else index.setdefault(key, len(index)) for key in keys),
+        dtype=np.int64, count=len(keys)
+    )
+
+def _float_array(values):
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+
+def shared_check_ins(codes, users, times, window, min_users):
+    """Row groups where one key checked in at least min_users distinct users within window seconds"""
+    rows = np.flatnonzero((codes >= 0) & ~np.isnan(times))
+    if len(rows) < min_users:
+        return []
+    rows = rows[np.lexsort((times[rows], codes[rows]))]
+    offsets = times[rows] - times[rows].min()
+
+    # Key and time folded into one ascending value, so one searchsorted finds every window's end
+    position = codes[rows] * (offsets.max() + window + 1) + offsets
+    ends = np.searchsorted(position, position + window, side='right')
+
+    clusters = []
+    covered = 0
+    for start in np.flatnonzero(ends - np.arange(len(rows)) >= min_users):
+        if start < covered:
+            continue
+        members = rows[start:ends[start]]
+        if len(set(users[members].tolist())) >= min_users:
+            clusters.append(members)
+            covered = ends[start]
+    return clusters
+
+def impossible_travel(check_in, check_out, distance_km, max_speed_kmh, min_distance_km):
+    """Rows whose check-out is further from the check-in than max_speed_kmh allows"""
+    hours = (check_out - check_in) / 3600
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = distance_km / hours
+    # NaN (missing check-out or coordinates) compares False and drops out
+    return np.flatnonzero((distance_km >= min_distance_km) & (hours >= 0) & (speed > max_speed_kmh))
+
+class AnomalyScan:
+    """Suspicious patterns in the attendance records of a date range.
+
+    Records are read a chunk of days at a time straight from the cursor.
+    Shared device/IP check-ins and impossible travel are found per chunk
+    with array operations; reused coordinates are counted across the whole
+    range in a hash index keyed by user and rounded coordinate cell.
+    """
+
+    def __init__(self, from_date, to_date, chunk_days=7):
+        self.from_date = from_date
+        self.to_date = to_date
+        self.chunk_days = chunk_days
+        self.window = anomaly_setting('SHARED_WINDOW_MINUTES') * 60
+        self.decimals = anomaly_setting('COORDINATE_DECIMALS')
+        self.findings = []
+        self.usernames = {}
+        self._coordinate_days = defaultdict(set)
+        self._coordinate_source = {}
+
+    def run(self):
+        """Findings as SecurityLog field dicts"""
+        day = self.from_date
+        while day <= self.to_date:
+            last_day = min(day + timedelta(days=self.chunk_days - 1), self.to_date)
+            self._scan_chunk(day, last_day)
+            day = last_day + timedelta(days=1)
+        self._reused_coordinates()
+        return self.findings
+
+    def _finding(self, user_id, kind, description, ip_address, device_id, latitude=None, longitude=None):
+        self.findings.append({
+            'kind': kind,
+            'user_id': user_id,
+            'log_type': 'suspicious_activity',
+            'description': description,
+            'ip_address': ip_address or UNKNOWN_IP,
+            'device_id': device_id,
+            'latitude': latitude,
+            'longitude': longitude,
+        })
+
+    def _scan_chunk(self, first_day, last_day):
+        rows = fetch_raw_rows(AttendanceRecord.objects.filter(
+            date__gte=first_day, date__lte=last_day, check_in_time__isnull=False
+        ).order_by().values_list(*RECORD_FIELDS))
+        if not rows:
+            return
+
+        (record_users, record_dates, check_in_times, check_out_times, ips, device_ids,
+         in_lats, in_lons, out_lats, out_lons) = zip(*rows)
+        users = np.array(record_users, dtype=np.int64)
+        check_in = to_epoch_seconds(check_in_times)
+        check_out = to_epoch_seconds(check_out_times)
+        in_lat, in_lon = _float_array(in_lats), _float_array(in_lons)
+        out_lat, out_lon = _float_array(out_lats), _float_array(out_lons)
+        self.usernames.update(User.objects.filter(pk__in=set(record_users)).values_list('id', 'username'))
+
+        # Buddy punching: one device or IP checking in several people within minutes
+        for kind, keys, min_users in (
+            ('shared_device', device_ids, anomaly_setting('SHARED_DEVICE_MIN_USERS')),
+            ('shared_ip', ips, anomaly_setting('SHARED_IP_MIN_USERS')),
+        ):
+            for members in shared_check_ins(factorize(keys), users, check_in, self.window, min_users):
+                member_users = sorted(set(users[members].tolist()))
+                first = members[0]
+                source = f'Device {device_ids[first]}' if kind == 'shared_device' else f'IP {ips[first]}'
+                description = (
+                    f"{source} checked in {len(member_users)} users within "
+                    f"{anomaly_setting('SHARED_WINDOW_MINUTES')} minutes on {record_dates[first]}: "
+                    f"{', '.join(self.usernames[user_id] for user_id in member_users)}"
+                )
+                for user_id in member_users:
+                    self._finding(user_id, kind, description, ips[first], device_ids[first])
+
+        # Spoofed GPS: check-out too far from the check-in for the time between them
+        distance = haversine_km(in_lat, in_lon, out_lat, out_lon)
+        for i in impossible_travel(
+            check_in, check_out, distance,
+            anomaly_setting('MAX_SPEED_KMH'), anomaly_setting('MIN_TRAVEL_KM')
+        ):
+            minutes = (check_out[i] - check_in[i]) / 60
+            self._finding(
+                record_users[i], 'impossible_travel',
+                f"Checked out {distance[i]:.1f} km from the check-in location "
+                f"{minutes:.0f} minutes later on {record_dates[i]}",
+                ips[i], device_ids[i], out_lats[i], out_lons[i]
+            )
+
+        # Spoofed GPS: real fixes jitter, so the same coordinates on several days are suspect
+        scale = 10 ** self.decimals
+        located = ~(np.isnan(in_lat) | np.isnan(in_lon))
+        cells = zip(
+            users[located].tolist(),
+            np.round(in_lat[located] * scale).astype(np.int64).tolist(),
+            np.round(in_lon[located] * scale).astype(np.int64).tolist(),
+        )
+        for i, key in zip(np.flatnonzero(located).tolist(), cells):
+            self._coordinate_days[key].add(record_dates[i])
+            self._coordinate_source.setdefault(key, (ips[i], device_ids[i], in_lats[i], in_lons[i]))
+
+    def _reused_coordinates(self):
+        min_days = anomaly_setting('REUSED_COORDINATE_MIN_DAYS')
+        for key, days in self._coordinate_days.items():
+            if len(days) < min_days:
+                continue
+            user_id = key[0]
+            ip_address, device_id, latitude, longitude = self._coordinate_source[key]
+            # Only the coordinates go in the description: record_anomalies skips logs already written
+            # by description, so a rerun over more days must describe the same finding the same way
+            self._finding(
+                user_id, 'reused_coordinates',
+                f"Checked in at identical coordinates {float(latitude):.{self.decimals}f}, "
+                f"{float(longitude):.{self.decimals}f} on {min_days} or more days",
+                ip_address, device_id, latitude, longitude
+            )
+
+def record_anomalies(findings):
+    """Bulk write findings as SecurityLogs, skipping any already logged by an earlier run.
+
+    Returns the number of logs written.
+    """
+    existing = set(SecurityLog.objects.filter(
+        log_type='suspicious_activity',
+        user_id__in={finding['user_id'] for finding in findings},
+        description__in={finding['description'] for finding in findings},
+    ).values_list('user_id', 'description'))
+
+    new_logs = []
+    for finding in findings:
+        key = (finding['user_id'], finding['description'])
+        if key in existing:
+            continue
+        existing.add(key)
+        fields = {name: value for name, value in finding.items() if name != 'kind'}
+        new_logs.append(SecurityLog(ip_packed=pack_ip_address(fields['ip_address']), **fields))
+
+    SecurityLog.objects.bulk_create(new_logs, batch_size=500)
+    return len(new_logs)
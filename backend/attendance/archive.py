@@ -0,0 +1,106 @@
+# attendance/archive.py
+import heapq
+from operator import itemgetter
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import AttendanceRecord, ArchivedAttendanceRecord, SecurityLog, ArchivedSecurityLog
+from .signals import keeping_attendance_history
+
+def _move_batches(queryset, archive_model, batch_size):
+    """Copy rows of a queryset into an archive model and delete them, one transaction per batch"""
+    model = queryset.model
+    attnames = [field.attname for field in model._meta.concrete_fields]
+    queryset = queryset.order_by('pk')
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.values(*attnames)[:batch_size])
+            if not rows:
+                break
+            archive_model.objects.bulk_create(archive_model(**row) for row in rows)
+            # Archived days stay in the monthly attendance bitmaps
+            with keeping_attendance_history():
+                model.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+    return moved
+
+def archive_horizon(days):
+    """First day that stays live when rows older than a number of days are archived"""
+    return timezone.localdate() - timedelta(days=days)
+
+def archive_attendance_records(before, batch_size=1000):
+    """Move attendance records dated before a day into the archive, returns the number moved"""
+    return _move_batches(AttendanceRecord.objects.filter(date__lt=before), ArchivedAttendanceRecord, batch_size)
+
+def archive_security_logs(before, batch_size=1000):
+    """Move security logs last seen before a day into the archive, returns the number moved"""
+    cutoff = timezone.make_aware(datetime.combine(before, time.min))
+    return _move_batches(SecurityLog.objects.filter(last_seen__lt=cutoff), ArchivedSecurityLog, batch_size)
+
+# Reads across live and archived rows. filter_queryset applies a view's filters
+# to a queryset of either model; archived rows are only read when from_date
+# reaches back to them (or is open), so recent ranges never touch the archive tables.
+def _archived_in_range(filter_queryset, archive_model, from_date, date_lookup):
+    archived = filter_queryset(archive_model.objects.all())
+    in_range = archived if from_date is None else archived.filter(**{date_lookup: from_date})
+    if not in_range.exists():
+        return None
+    return archived
+
+def archived_attendance_through(filter_queryset, from_date):
+    """Last archived day of the records a range starting at from_date reaches, or None when all are live"""
+    archived = _archived_in_range(filter_queryset, ArchivedAttendanceRecord, from_date, 'date__gte')
+    if archived is None:
+        return None
+    return archived.aggregate(last_day=Max('date'))['last_day']
+
+def attendance_queryset(filter_queryset, from_date):
+    """Attendance records, unioned with archived ones when from_date reaches back or is None.
+
+    Combined results are AttendanceRecord instances and cannot use select_related.
+    """
+    live = filter_queryset(AttendanceRecord.objects.all())
+    archived = _archived_in_range(filter_queryset, ArchivedAttendanceRecord, from_date, 'date__gte')
+    if archived is None:
+        return live
+    return live.order_by().union(archived.order_by(), all=True)
+
+def security_log_queryset(filter_queryset, from_date):
+    """Security logs, unioned with archived ones when from_date reaches back or is None"""
+    live = filter_queryset(SecurityLog.objects.all())
+    archived = _archived_in_range(filter_queryset, ArchivedSecurityLog, from_date, 'last_seen__date__gte')
+    if archived is None:
+        return live
+    return live.order_by().union(archived.order_by(), all=True)
+
+def merged_attendance_records(filter_queryset, from_date):
+    """Attendance records with their users, ordered by date and username, archived ones merged in"""
+    live = filter_queryset(AttendanceRecord.objects.all()).select_related('user').order_by('date', 'user__username')
+    archived = _archived_in_range(filter_queryset, ArchivedAttendanceRecord, from_date, 'date__gte')
+    if archived is None:
+        return live.iterator()
+
+    archived = archived.select_related('user').order_by('date', 'user__username')
+    return heapq.merge(
+        live.iterator(), archived.iterator(),
+        key=lambda record: (record.date, record.user.username)
+    )
+
+def merged_attendance_rows(filter_queryset, from_date, fields):
+    """values_list rows of attendance records ordered by date and username, archived ones merged in.
+
+    fields must include 'date' and 'user__username'.
+    """
+    order = ('date', 'user__username')
+    live = filter_queryset(AttendanceRecord.objects.all()).order_by(*order).values_list(*fields)
+    archived = _archived_in_range(filter_queryset, ArchivedAttendanceRecord, from_date, 'date__gte')
+    if archived is None:
+        return live.iterator()
+
+    archived = archived.order_by(*order).values_list(*fields)
+    return heapq.merge(
+        live.iterator(), archived.iterator(),
+        key=itemgetter(*(fields.index(name) for name in order))
+    )
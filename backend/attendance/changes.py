@@ -0,0 +1,57 @@
+# attendance/changes.py
+import base64
+import binascii
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import AttendanceRecord, SecurityLog
+
+# Resource: (model, change stamp field, related objects loaded with each row)
+CHANGE_FEEDS = {
+    'attendance': (AttendanceRecord, 'updated_at', ['user']),
+    'security_logs': (SecurityLog, 'last_seen', ['user', 'device']),
+}
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(resource, changed_at, pk):
+    """Opaque cursor of a feed position: the (change stamp, id) of the last row read"""
+    payload = json.dumps([resource, changed_at.isoformat(), pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(resource, cursor):
+    """(change stamp, id) of a cursor, which must belong to the same resource"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_resource, changed_at, pk = json.loads(payload)
+        changed_at = parse_datetime(changed_at)
+    except (binascii.Error, TypeError, ValueError):
+        raise InvalidCursor('Malformed cursor')
+    if cursor_resource != resource or changed_at is None or not isinstance(pk, int):
+        raise InvalidCursor(f'Not a {resource} cursor')
+    return changed_at, pk
+
+def changes_after(resource, position=None, limit=500):
+    """Rows of a resource created or changed after a (change stamp, id) position, oldest first.
+
+    Returns (rows, position of the last row or the one given, has_more).
+    """
+    model, field, related = CHANGE_FEEDS[resource]
+    # A row stamped just now may belong to a transaction that commits after a later-stamped
+    # one; holding recent rows back keeps the cursor from skipping past it
+    horizon = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_LAG_SECONDS)
+    queryset = model.objects.filter(**{f'{field}__lte': horizon})
+    if position is not None:
+        changed_at, pk = position
+        queryset = queryset.filter(Q(**{f'{field}__gt': changed_at}) | Q(**{field: changed_at, 'pk__gt': pk}))
+
+    rows = list(queryset.select_related(*related).order_by(field, 'pk')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        position = (getattr(rows[-1], field), rows[-1].pk)
+    return rows, position, has_more
@@ -0,0 +1,23 @@
+# attendance/checks.py
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Backends whose entries are seen by one process only
+LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+@register('caches')
+def check_shared_cache(app_configs, **kwargs):
+    """The default cache must be shared by every worker process"""
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        'The default cache is not shared between processes',
+        hint=(
+            'Idempotency claims, replica pins and the enrollment version only hold within one worker. '
+            'Set REDIS_URL or use the database cache of the default settings.'
+        ),
+        id='attendance.W001',
+    )]
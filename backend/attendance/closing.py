@@ -0,0 +1,78 @@
+# attendance/closing.py
+from datetime import datetime
+from django.db import transaction
+from django.db.models import Case, F, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import User, AttendanceRecord, RoleShiftTiming, SHIFT_ROLES
+from .outbox import emit_attendance_events
+
+class EpochSeconds(Func):
+    """Whole seconds since the epoch of a datetime column, computed in SQL"""
+    output_field = IntegerField()
+    template = 'CAST(EXTRACT(EPOCH FROM %(expressions)s) AS INTEGER)'
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Stored as UTC text; '%%%%' survives template formatting and placeholder conversion as '%'
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)")
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)')
+
+def open_records(day):
+    """Records of a day with a check-in and no check-out"""
+    return AttendanceRecord.objects.filter(date=day, check_in_time__isnull=False, check_out_time__isnull=True)
+
+def closing_times(day):
+    """Aware shift end of each role on a day; roles without a shift timing close at the default end"""
+    shift_timings = RoleShiftTiming.get_shift_timings()
+    default_end = RoleShiftTiming._meta.get_field('end_time').default
+    return {
+        role: timezone.make_aware(datetime.combine(
+            day, shift_timings[role].end_time if role in SHIFT_ROLES else default_end
+        ))
+        for role, _ in User.ROLE_CHOICES
+    }
+
+def auto_close_records(day, now=None):
+    """Mark out every open record of a day at its role's shift end, in a single UPDATE.
+
+    Roles whose shift has not ended yet are left open. A check-in after the
+    shift end is closed at the check-in itself. A marked_out event is queued
+    for each closed record in the same transaction. Returns the number closed.
+    """
+    now = now or timezone.now()
+    ends = {role: end for role, end in closing_times(day).items() if end <= now}
+    if not ends:
+        return 0
+
+    # update() cannot join to users, so each role matches through a subquery
+    roles = {role: Q(user__in=User.objects.filter(role=role).values('pk')) for role in ends}
+    check_in = EpochSeconds(F('check_in_time'))
+
+    def by_role(value):
+        return Case(*[When(roles[role], then=value(role, end)) for role, end in ends.items()], default=None)
+
+    with transaction.atomic():
+        # Locked so a mark out landing meanwhile waits, and the events cover exactly the rows updated
+        ids = list(
+            open_records(day).filter(user__role__in=ends).order_by()
+            .select_for_update(of=('self',)).values_list('pk', flat=True)
+        )
+        if not ids:
+            return 0
+        AttendanceRecord.objects.filter(pk__in=ids).update(
+            check_out_time=by_role(lambda role, end: Greatest(Value(end), F('check_in_time'))),
+            worked_seconds=by_role(
+                lambda role, end: Greatest(Value(int(end.timestamp())) - check_in, Value(0))
+            ),
+            # Closed at the shift end, or at a later check-in with nothing worked, so never overtime;
+            # roles without a shift have none (as in apply_worked_time)
+            overtime_seconds=by_role(
+                lambda role, end: Value(0) if role in SHIFT_ROLES else Value(None, output_field=IntegerField())
+            ),
+            auto_closed=True,
+            updated_at=now,
+        )
+        emit_attendance_events([(record, 'out') for record in AttendanceRecord.objects.filter(pk__in=ids).order_by()])
+    return len(ids)
@@ -0,0 +1,67 @@
+# attendance/devices.py
+import hashlib
+import threading
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from .models import DeviceFingerprint
+
+FINGERPRINT_FIELDS = ('user_agent', 'accept_language', 'accept_encoding')
+
+def normalize_device_info(info):
+    """Fingerprint field values of a get_device_info() dict, with whitespace collapsed"""
+    return {field: ' '.join(str(info.get(field) or '').split()) for field in FINGERPRINT_FIELDS}
+
+def fingerprint_hash(values):
+    return hashlib.sha256('\x1f'.join(values[field] for field in FINGERPRINT_FIELDS).encode()).hexdigest()
+
+class DeviceInternCache:
+    """Bounded in-process map of fingerprint hash to DeviceFingerprint id, evicting least recently used"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            device_id = self._entries.get(key)
+            if device_id is not None:
+                self._entries.move_to_end(key)
+            return device_id
+
+    def set(self, key, device_id):
+        with self._lock:
+            self._entries[key] = device_id
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+device_cache = DeviceInternCache(getattr(settings, 'DEVICE_CACHE_MAX_ENTRIES', 10000))
+
+def device_fingerprint_id(info):
+    """Id of the DeviceFingerprint for get_device_info() output, created on first sight"""
+    values = normalize_device_info(info)
+    key = fingerprint_hash(values)
+    device_id = device_cache.get(key)
+    if device_id is None:
+        device, _ = DeviceFingerprint.objects.get_or_create(fingerprint=key, defaults=values)
+        device_id = device.pk
+        # Only cache committed rows, an id from a rolled back insert must never be handed out
+        transaction.on_commit(lambda: device_cache.set(key, device_id))
+    return device_id
+
+async def adevice_fingerprint_id(info):
+    """Async counterpart of device_fingerprint_id, cache hits never leave the event loop"""
+    device_id = device_cache.get(fingerprint_hash(normalize_device_info(info)))
+    if device_id is None:
+        device_id = await sync_to_async(device_fingerprint_id)(info)
+    return device_id
@@ -0,0 +1,139 @@
+# attendance/enrollment.py
+import threading
+import time
+from datetime import date, timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from .models import User
+from .reports import ENROLLMENT_EXEMPT_ROLES
+
+# Bumped whenever enrollment windows change, so anything derived from them can tell it is stale
+ENROLLMENT_VERSION_KEY = 'enrollment:version'
+ENROLLMENT_FIELDS = {'role', 'start_date', 'end_date', 'is_active_period'}
+
+def _initial_version():
+    # Versions restart from the clock after an eviction, never from a number a process may still hold
+    return time.time_ns()
+
+def enrollment_version():
+    return cache.get_or_set(ENROLLMENT_VERSION_KEY, _initial_version, None)
+
+async def aenrollment_version():
+    return await cache.aget_or_set(ENROLLMENT_VERSION_KEY, _initial_version, None)
+
+def bump_enrollment_version():
+    try:
+        cache.incr(ENROLLMENT_VERSION_KEY)
+    except ValueError:
+        # Evicted or never set
+        cache.set(ENROLLMENT_VERSION_KEY, _initial_version(), None)
+
+def enrollment_conflicts(users, values):
+    """Selected users whose window would end up with start_date on or after end_date"""
+    if 'start_date' in values and 'end_date' in values:
+        return users.none()
+    if 'end_date' in values:
+        return users.filter(start_date__gte=values['end_date'])
+    if 'start_date' in values:
+        return users.filter(end_date__lte=values['start_date'])
+    return users.none()
+
+def update_enrollment_windows(users, values):
+    """Apply new start_date/end_date/is_active_period values to a user queryset in one UPDATE.
+
+    Rows that already hold the new values are not written. Returns
+    (matched, changed) row counts.
+    """
+    matched = users.count()
+    unchanged = Q(**values)
+    changed = users.exclude(unchanged).update(**values)
+    if changed:
+        # update() skips post_save, so signal the change here
+        bump_enrollment_version()
+    return matched, changed
+
+def sweep_enrollments(today=None, since=None):
+    """Flip is_active_period for windows that ended or started, one UPDATE each.
+
+    Windows that ended before today are deactivated. Inactive windows that
+    started between since (default yesterday) and today are activated; an
+    older inactive window was switched off by an admin and is left alone.
+    Returns (deactivated, activated) counts.
+    """
+    today = today or date.today()
+    since = since or today - timedelta(days=1)
+    enrolled = User.objects.exclude(role__in=ENROLLMENT_EXEMPT_ROLES)
+    deactivated = enrolled.filter(is_active_period=True, end_date__lt=today).update(is_active_period=False)
+    activated = enrolled.filter(
+        is_active_period=False, start_date__gte=since, start_date__lte=today, end_date__gte=today
+    ).update(is_active_period=True)
+    if deactivated or activated:
+        bump_enrollment_version()
+    return deactivated, activated
+
+class ActiveUserSet:
+    """Ids of the users whose enrollment is active today, held in process.
+
+    Rebuilt with one query when the day or the enrollment version changes,
+    and at least every ACTIVE_USERS_CACHE_SECONDS for changes made by other
+    processes, so checks are set lookups instead of date comparisons.
+    """
+
+    def __init__(self):
+        self._ids = frozenset()
+        self._key = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _current_key(self):
+        return date.today(), enrollment_version()
+
+    def _is_stale(self, key):
+        return self._key != key or time.monotonic() - self._loaded_at >= settings.ACTIVE_USERS_CACHE_SECONDS
+
+    def is_stale(self):
+        return self._is_stale(self._current_key())
+
+    def refresh(self):
+        # Key first, so a change during the query makes the next check reload
+        key = self._current_key()
+        today = key[0]
+        ids = frozenset(User.objects.filter(
+            Q(role__in=ENROLLMENT_EXEMPT_ROLES) |
+            Q(start_date__lte=today, end_date__gte=today, is_active_period=True)
+        ).values_list('id', flat=True))
+        with self._lock:
+            self._ids, self._key, self._loaded_at = ids, key, time.monotonic()
+
+    def ids(self):
+        if self.is_stale():
+            self.refresh()
+        return self._ids
+
+    def __contains__(self, user_id):
+        return user_id in self.ids()
+
+    async def acontains(self, user_id):
+        # The version lives in the shared cache, which may be a database the event loop cannot query
+        if self._is_stale((date.today(), await aenrollment_version())):
+            await sync_to_async(self.refresh)()
+        return user_id in self._ids
+
+active_users = ActiveUserSet()
+
+def is_enrollment_active(user, check_date=None):
+    """User.is_enrollment_active, answered from the active-user set for today.
+
+    The set can trail a change committed by another process until its
+    version bump is seen, so a user found in it is confirmed against the row
+    loaded for the request.
+    """
+    if check_date is None or check_date == date.today():
+        return user.pk in active_users and user.is_enrollment_active()
+    return user.is_enrollment_active(check_date)
+
+async def ais_enrollment_active(user):
+    """Async counterpart of is_enrollment_active for today"""
+    return await active_users.acontains(user.pk) and user.is_enrollment_active()
@@ -0,0 +1,205 @@
+# attendance/export_jobs.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import AttendanceRecord, ArchivedAttendanceRecord, ExportJob
+from .exports import attendance_export_filter, write_export
+from .reports import attendance_data_version
+
+def export_job_setting(name):
+    return settings.EXPORT_JOBS[name]
+
+def normalize_export_filters(data):
+    """Filters as a JSON-ready dict with unset values dropped, so equal requests hash equally"""
+    filters = {}
+    for name in ('user_id', 'role', 'from_date', 'to_date'):
+        value = data.get(name)
+        if value in (None, ''):
+            continue
+        filters[name] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return filters
+
+def parse_export_filters(filters):
+    """Keyword arguments of attendance_export_filter for normalized filters"""
+    parsed = dict(filters)
+    for name in ('from_date', 'to_date'):
+        if name in parsed:
+            parsed[name] = date.fromisoformat(parsed[name])
+    return parsed
+
+def export_data_version(filters):
+    """Change stamp of the live and archived records a filter set covers"""
+    filter_records = attendance_export_filter(**parse_export_filters(filters))
+    return [
+        attendance_data_version(filter_records(model.objects.all()))
+        for model in (AttendanceRecord, ArchivedAttendanceRecord)
+    ]
+
+def export_cache_key(filters, file_type, version):
+    payload = json.dumps({'filters': filters, 'file_type': file_type, 'version': version}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ExportCache:
+    """Directory of finished export files named by cache key, bounded in total size.
+
+    Reads refresh a file's mtime, so eviction drops the least recently used
+    files first. Files are written under a temporary name and renamed into
+    place, a reader never sees a partial file.
+    """
+
+    # Shared by every instance, eviction scans the whole directory
+    _lock = threading.Lock()
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, key, file_type):
+        return self.directory / f"{key}.{file_type}"
+
+    def get(self, key, file_type):
+        """Path of a cached file, or None"""
+        path = self.path(key, file_type)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, file_type, write):
+        """Create a cached file by calling write(binary file), returns (result of write, size)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                result = write(output)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, self.path(key, file_type))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict(keep=self.path(key, file_type))
+        return result, size
+
+    def evict(self, keep=None):
+        """Delete least recently used files until the cache fits max_bytes, returns the number deleted"""
+        with self._lock:
+            files = []
+            for path in self.directory.glob('*'):
+                if path.suffix == '.part':
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            deleted = 0
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                path.unlink(missing_ok=True)
+                total -= size
+                deleted += 1
+            return deleted
+
+def export_cache():
+    return ExportCache(export_job_setting('CACHE_DIR'), export_job_setting('CACHE_MAX_BYTES'))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def export_executor():
+    """Process-wide pool of export worker threads, started on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=export_job_setting('WORKERS'), thread_name_prefix='attendance-export'
+            )
+        return _executor
+
+def fail_stale_export_jobs():
+    """Fail pending and running jobs older than the timeout, their worker is gone. Returns the number failed"""
+    cutoff = timezone.now() - timedelta(seconds=export_job_setting('TIMEOUT_SECONDS'))
+    return ExportJob.objects.filter(status__in=['pending', 'running'], created_at__lt=cutoff).update(
+        status='failed', error='Export job timed out before its worker finished', finished_at=timezone.now()
+    )
+
+def submit_export_job(user, filters, file_type):
+    """Create an export job for normalized filters and queue it, unless its file is already cached.
+
+    A request matching a cached file, or a job still being built, is answered
+    from it. Cache keys carry the data version, so any change to the records
+    in range makes a new file. A timed out job is failed and queued afresh.
+    """
+    cache_key = export_cache_key(filters, file_type, export_data_version(filters))
+    job = ExportJob(requested_by=user, file_type=file_type, filters=filters, cache_key=cache_key)
+
+    cached = export_cache().get(cache_key, file_type)
+    if cached is not None:
+        done = ExportJob.objects.filter(cache_key=cache_key, status='done').order_by('-finished_at').first()
+        job.status = 'done'
+        job.row_count = done.row_count if done else None
+        job.file_size = cached.stat().st_size
+        job.finished_at = timezone.now()
+        job.save()
+        return job
+
+    fail_stale_export_jobs()
+    in_progress = ExportJob.objects.filter(cache_key=cache_key, status__in=['pending', 'running']).first()
+    if in_progress is not None:
+        return in_progress
+
+    job.save()
+    transaction.on_commit(lambda: export_executor().submit(_run_in_worker, job.pk))
+    return job
+
+def run_export_job(job_id):
+    """Build a pending job's file into the export cache, returns the job"""
+    # Claimed with a conditional update, a job is only ever run once
+    if not ExportJob.objects.filter(pk=job_id, status='pending').update(status='running'):
+        return ExportJob.objects.get(pk=job_id)
+
+    job = ExportJob.objects.get(pk=job_id)
+    try:
+        job.row_count, job.file_size = export_cache().put(
+            job.cache_key, job.file_type,
+            lambda output: write_export(output, job.file_type, **parse_export_filters(job.filters))
+        )
+        job.status = 'done'
+    except ImportError:
+        job.status = 'failed'
+        job.error = f"{job.file_type.title()} export requires the pyarrow package"
+    except Exception as error:
+        job.status = 'failed'
+        job.error = str(error) or error.__class__.__name__
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'row_count', 'file_size', 'error', 'finished_at'])
+    return job
+
+def run_pending_export_jobs():
+    """Fail timed out jobs and run the pending ones in this process, returns the jobs run"""
+    fail_stale_export_jobs()
+    return [
+        run_export_job(job_id)
+        for job_id in ExportJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True)
+    ]
+
+def _run_in_worker(job_id):
+    try:
+        run_export_job(job_id)
+    finally:
+        # Worker threads keep their own connection, it must not outlive the job
+        connection.close()
@@ -0,0 +1,136 @@
+# attendance/exports.py
+import json
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from .archive import merged_attendance_records, merged_attendance_rows
+from .utils import generate_attendance_csv_rows
+
+# Typed export columns in file order: (column name, values_list lookup)
+EXPORT_COLUMNS = [
+    ('record_id', 'id'),
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('first_name', 'user__first_name'),
+    ('last_name', 'user__last_name'),
+    ('role', 'user__role'),
+    ('date', 'date'),
+    ('check_in_time', 'check_in_time'),
+    ('check_out_time', 'check_out_time'),
+    ('is_late', 'is_late'),
+    ('auto_closed', 'auto_closed'),
+    ('expected_start_time', 'expected_start_time'),
+    ('worked_seconds', 'worked_seconds'),
+    ('overtime_seconds', 'overtime_seconds'),
+    ('notes', 'notes'),
+]
+EXPORT_COLUMN_NAMES = [name for name, _ in EXPORT_COLUMNS]
+
+# Rows per record batch of a columnar file
+EXPORT_BATCH_ROWS = 10000
+
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+EXPORT_FILE_TYPES = ['csv', *EXPORT_CONTENT_TYPES]
+
+def attendance_export_filter(user_id=None, role=None, from_date=None, to_date=None):
+    """Queryset filter of the export parameters, applicable to live and archived records"""
+    def filter_records(queryset):
+        if user_id:
+            queryset = queryset.filter(user_id=user_id)
+        
+        if role:
+            queryset = queryset.filter(user__role=role)
+        
+        if from_date:
+            queryset = queryset.filter(date__gte=from_date)
+        
+        if to_date:
+            queryset = queryset.filter(date__lte=to_date)
+        
+        return queryset
+    return filter_records
+
+def export_rows(filter_records, from_date):
+    """Export column tuples of the filtered records, live and archived, ordered by date and username"""
+    return merged_attendance_rows(filter_records, from_date, [lookup for _, lookup in EXPORT_COLUMNS])
+
+def batches(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+def generate_ndjson_lines(rows):
+    """Yield one JSON object per row, with ISO timestamps carrying their offset"""
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMN_NAMES, row)), cls=DjangoJSONEncoder) + '\n'
+
+def arrow_schema():
+    """Arrow schema of the export columns, requires pyarrow"""
+    import pyarrow as pa
+    
+    timestamp = pa.timestamp('us', tz='UTC')
+    return pa.schema([
+        ('record_id', pa.int64()),
+        ('user_id', pa.int64()),
+        ('username', pa.string()),
+        ('first_name', pa.string()),
+        ('last_name', pa.string()),
+        ('role', pa.string()),
+        ('date', pa.date32()),
+        ('check_in_time', timestamp),
+        ('check_out_time', timestamp),
+        ('is_late', pa.bool_()),
+        ('auto_closed', pa.bool_()),
+        ('expected_start_time', pa.time64('us')),
+        ('worked_seconds', pa.int64()),
+        ('overtime_seconds', pa.int64()),
+        ('notes', pa.string()),
+    ])
+
+def write_columnar(rows, output, file_type):
+    """Write rows to a binary file as Parquet or an Arrow IPC file, one record batch per chunk.
+    
+    Requires pyarrow. Returns the number of rows written.
+    """
+    import pyarrow as pa
+    
+    schema = arrow_schema()
+    if file_type == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(output, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(output, schema)
+    
+    written = 0
+    with writer:
+        for chunk in batches(rows, EXPORT_BATCH_ROWS):
+            columns = zip(*chunk)
+            writer.write_batch(pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            written += len(chunk)
+    return written
+
+def write_export(output, file_type, user_id=None, role=None, from_date=None, to_date=None):
+    """Write the export of a filter set to a binary file in any EXPORT_FILE_TYPES format.
+    
+    Returns the number of records written. Parquet and Arrow require pyarrow.
+    """
+    filter_records = attendance_export_filter(user_id, role, from_date, to_date)
+    if file_type in ('parquet', 'arrow'):
+        return write_columnar(export_rows(filter_records, from_date), output, file_type)
+    
+    if file_type == 'ndjson':
+        lines = generate_ndjson_lines(export_rows(filter_records, from_date))
+        written = 0
+    else:
+        lines = generate_attendance_csv_rows(merged_attendance_records(filter_records, from_date))
+        written = -1  # Header line
+    for line in lines:
+        output.write(line.encode())
+        written += 1
+    return written
@@ -0,0 +1,245 @@
+# attendance/history.py
+from datetime import date, timedelta
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import AttendanceMonth, AttendanceRecord, ArchivedAttendanceRecord
+from .reports import ENROLLMENT_EXEMPT_ROLES, MonthlyAttendanceMatrix, fetch_raw_rows, to_day_array
+from .workdays import get_calendar
+
+MONTH_MASK = (1 << 31) - 1
+
+def month_start(day):
+    return day.replace(day=1)
+
+def _day_bits(day, present, late):
+    """Present bit, late bit and keep-mask of one day in its month's bitmaps"""
+    bit = 1 << (day.day - 1)
+    return (bit if present else 0), (bit if present and late else 0), MONTH_MASK ^ bit
+
+def record_attendance_day(user_id, day, present, late=False):
+    """Set or clear one day in a user's monthly bitmaps, without reading the rest of the month"""
+    present_bit, late_bit, keep = _day_bits(day, present, late)
+    months = AttendanceMonth.objects.filter(user_id=user_id, month=month_start(day))
+    updates = {
+        'present_days': F('present_days').bitand(keep).bitor(present_bit),
+        'late_days': F('late_days').bitand(keep).bitor(late_bit),
+    }
+    # Clearing a day of a month that has no bitmap yet is a no-op
+    if months.update(**updates) or not present:
+        return
+
+    try:
+        with transaction.atomic():
+            AttendanceMonth.objects.create(
+                user_id=user_id, month=month_start(day), present_days=present_bit, late_days=late_bit
+            )
+    except IntegrityError:
+        # Created by a concurrent request in the meantime
+        months.update(**updates)
+
+def record_attendance_days(entries):
+    """Bulk record_attendance_day for (user_id, day, present, late) entries, one write per month"""
+    changes = {}
+    for user_id, day, present, late in entries:
+        present_bit, late_bit, keep = _day_bits(day, present, late)
+        key = (user_id, month_start(day))
+        present_bits, late_bits, keep_bits = changes.get(key, (0, 0, MONTH_MASK))
+        changes[key] = ((present_bits & keep) | present_bit, (late_bits & keep) | late_bit, keep_bits & keep)
+    if not changes:
+        return
+
+    with transaction.atomic():
+        existing = {
+            (month.user_id, month.month): month
+            for month in AttendanceMonth.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in changes},
+                month__in={month for _, month in changes},
+            )
+        }
+        new_months = []
+        for (user_id, month_date), (present_bits, late_bits, keep) in changes.items():
+            month = existing.get((user_id, month_date))
+            if month is None:
+                if present_bits:
+                    new_months.append(AttendanceMonth(
+                        user_id=user_id, month=month_date, present_days=present_bits, late_days=late_bits
+                    ))
+                continue
+            month.present_days = (month.present_days & keep) | present_bits
+            month.late_days = (month.late_days & keep) | late_bits
+
+        AttendanceMonth.objects.bulk_create(new_months)
+        AttendanceMonth.objects.bulk_update(existing.values(), ['present_days', 'late_days'], batch_size=500)
+
+def rebuild_attendance_months(user_ids=None):
+    """Recompute the monthly bitmaps of some users (or everyone) from live and archived records.
+
+    Returns the number of months written.
+    """
+    months = AttendanceMonth.objects.all()
+    if user_ids is not None:
+        months = months.filter(user_id__in=user_ids)
+
+    # Archived records still count towards the history
+    rows = []
+    for model in (AttendanceRecord, ArchivedAttendanceRecord):
+        records = model.objects.filter(check_in_time__isnull=False)
+        if user_ids is not None:
+            records = records.filter(user_id__in=user_ids)
+        rows.extend(fetch_raw_rows(records.order_by().values_list('user_id', 'date', 'is_late')))
+    new_months = []
+    if rows:
+        record_users, record_days, is_late = zip(*rows)
+        record_users = np.array(record_users, dtype=np.int64)
+        record_days = to_day_array(record_days)
+        is_late = np.array(is_late, dtype=bool)
+        record_months = record_days.astype('datetime64[M]')
+        bits = np.left_shift(1, (record_days - record_months.astype('datetime64[D]')).astype(np.int64))
+
+        # OR the day bits of each (user, month) group together
+        order = np.lexsort((record_months.astype(np.int64), record_users))
+        record_users, record_months = record_users[order], record_months[order]
+        starts = np.flatnonzero(np.concatenate((
+            [True], (record_users[1:] != record_users[:-1]) | (record_months[1:] != record_months[:-1])
+        )))
+        present_bits = np.bitwise_or.reduceat(bits[order], starts)
+        late_bits = np.bitwise_or.reduceat(np.where(is_late, bits, 0)[order], starts)
+
+        new_months = [
+            AttendanceMonth(user_id=user_id, month=month_date, present_days=present, late_days=late)
+            for user_id, month_date, present, late in zip(
+                record_users[starts].tolist(),
+                record_months[starts].astype('datetime64[D]').tolist(),
+                present_bits.tolist(),
+                late_bits.tolist(),
+            )
+        ]
+
+    with transaction.atomic():
+        months.delete()
+        AttendanceMonth.objects.bulk_create(new_months, batch_size=1000)
+    return len(new_months)
+
+def _shifted(bits, offset):
+    return bits << offset if offset >= 0 else bits >> -offset
+
+def _span(first, last):
+    """Bits first..last inclusive"""
+    return ((1 << (last - first + 1)) - 1) << first if last >= first else 0
+
+def _unpack(bits, length):
+    packed = np.frombuffer(bits.to_bytes((length + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(packed, bitorder='little')[:length].astype(bool)
+
+class AttendanceHistory:
+    """A user's attendance over a date range, answered from the monthly bitmaps.
+
+    The range is widened to whole months and held as Python ints, bit n
+    standing for n days after the first month's first day, so totals are
+    popcounts and no AttendanceRecord row is read.
+    """
+
+    def __init__(self, user, from_date=None, to_date=None):
+        today = date.today()
+        self.user = user
+        self.to_date = min(to_date or today, today)
+        self.from_date = from_date or user.start_date or user.date_joined.date()
+
+        self.first_day = month_start(self.from_date)
+        next_month = (self.to_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+        self.length = (next_month - self.first_day).days
+
+        in_range = _span(self._offset(self.from_date), self._offset(self.to_date))
+        self.enrolled = in_range & self._enrollment_bits()
+        self.working = self.enrolled & self._working_bits()
+
+        self.present = 0
+        self.late = 0
+        for month_date, present, late in AttendanceMonth.objects.filter(
+            user=user, month__gte=self.first_day, month__lte=self.to_date
+        ).values_list('month', 'present_days', 'late_days'):
+            offset = self._offset(month_date)
+            self.present |= present << offset
+            self.late |= late << offset
+        self.present &= in_range
+        self.late &= in_range
+
+    def _offset(self, day):
+        return (day - self.first_day).days
+
+    def _enrollment_bits(self):
+        if self.user.role in ENROLLMENT_EXEMPT_ROLES:
+            return _span(0, self.length - 1)
+        if not (self.user.start_date and self.user.end_date and self.user.is_active_period):
+            return 0
+        return _span(
+            max(self._offset(self.user.start_date), 0),
+            min(self._offset(self.user.end_date), self.length - 1)
+        )
+
+    def _working_bits(self):
+        calendar = get_calendar(self.user.role)
+        bits = 0
+        for year in range(self.first_day.year, self.to_date.year + 1):
+            bits |= _shifted(calendar.year_bits(year), self._offset(date(year, 1, 1)))
+        return bits & _span(0, self.length - 1)
+
+    def summary(self):
+        """Working, present, late and absent day counts with the attendance percentage"""
+        working_days = self.working.bit_count()
+        attended = (self.present & self.working).bit_count()
+        return {
+            'from_date': self.from_date,
+            'to_date': self.to_date,
+            'working_days': working_days,
+            'present_days': self.present.bit_count(),
+            'late_days': self.late.bit_count(),
+            'absent_days': working_days - attended,
+            'attendance_percentage': round(attended * 100 / working_days, 1) if working_days else None,
+        }
+
+    def streaks(self):
+        """Current and longest runs of attended working days, non-working days neither count nor break a run"""
+        working = self.working
+        attended = self.present | (self.enrolled & ~self.working)
+
+        # Today only extends a streak once checked in, it never breaks one
+        today_bit = 1 << self._offset(self.to_date)
+        if self.to_date == date.today() and not self.present & today_bit:
+            attended |= today_bit
+            working &= ~today_bit
+
+        runs = np.diff(np.concatenate(([0], _unpack(attended, self.length).astype(np.int8), [0])))
+        starts, ends = np.flatnonzero(runs == 1), np.flatnonzero(runs == -1)
+        working_before = np.concatenate(([0], np.cumsum(_unpack(working, self.length))))
+        lengths = working_before[ends] - working_before[starts]
+
+        current = 0
+        if len(ends) and ends[-1] > self._offset(self.to_date):
+            current = int(lengths[-1])
+        return {
+            'current_streak': current,
+            'longest_streak': int(lengths.max()) if len(lengths) else 0,
+        }
+
+    def heatmap(self):
+        """One cell string per month, with the MonthlyAttendanceMatrix codes"""
+        cells = np.full(self.length, MonthlyAttendanceMatrix.NOT_ENROLLED, dtype=np.int8)
+        cells[_unpack(self.enrolled, self.length)] = MonthlyAttendanceMatrix.NON_WORKING
+        cells[_unpack(self.working, self.length)] = MonthlyAttendanceMatrix.ABSENT
+        cells[_unpack(self.present, self.length)] = MonthlyAttendanceMatrix.PRESENT
+        cells[_unpack(self.late, self.length)] = MonthlyAttendanceMatrix.LATE
+        codes = MonthlyAttendanceMatrix.CELL_CODES[cells]
+
+        months = []
+        month_date = self.first_day
+        while month_date <= self.to_date:
+            next_month = (month_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+            offset = self._offset(month_date)
+            months.append({
+                'month': month_date.strftime('%Y-%m'),
+                'cells': ''.join(codes[offset:offset + (next_month - month_date).days]),
+            })
+            month_date = next_month
+        return months
@@ -0,0 +1,215 @@
+# attendance/idempotency.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from .utils import create_json_response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+CachedResponse = namedtuple('CachedResponse', ['fingerprint', 'data', 'status_code'])
+# Held under a key while its first request runs, so a concurrent retry is not run twice
+InFlight = namedtuple('InFlight', ['fingerprint'])
+
+class IdempotencyCache:
+    """Responses of recent requests by idempotency key.
+
+    Claims and responses are kept in the shared Django cache, so a retry
+    reaching any worker is answered. A key is claimed with cache.add() before
+    its view runs, so only one request per key ever runs the view. Each
+    process also keeps a bounded LRU of responses, which answers repeats
+    without a round trip to the shared cache; every entry expires ttl_seconds
+    after it was stored, in both tiers.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=24 * 60 * 60, in_flight_seconds=60, prefix='idempotency'):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.in_flight_seconds = in_flight_seconds
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cache_key(self, key):
+        # Keys hold user input, hash them into a valid cache key of fixed length
+        return f"{self.prefix}:{hashlib.sha256(repr(key).encode()).hexdigest()}"
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            response, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def _local_set(self, key, response):
+        with self._lock:
+            self._entries[key] = (response, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            # Reads move entries to the end, so expiry order is not LRU order: expired entries are
+            # dropped when read, the bound evicts the least recently used whether expired or not
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _shared_entry(self, key, entry, fingerprint):
+        if isinstance(entry, CachedResponse):
+            self._local_set(key, entry)
+        # An entry expiring between the two calls leaves nothing to answer with, the retry waits as in flight
+        return entry or InFlight(fingerprint)
+
+    def claim(self, key, fingerprint):
+        """Mark key in flight, returns None when claimed or the entry already held (response or InFlight)"""
+        local = self._local_get(key)
+        if local is not None:
+            return local
+        if cache.add(self.cache_key(key), InFlight(fingerprint), self.in_flight_seconds):
+            return None
+        return self._shared_entry(key, cache.get(self.cache_key(key)), fingerprint)
+
+    async def aclaim(self, key, fingerprint):
+        """Async counterpart of claim"""
+        local = self._local_get(key)
+        if local is not None:
+            return local
+        if await cache.aadd(self.cache_key(key), InFlight(fingerprint), self.in_flight_seconds):
+            return None
+        return self._shared_entry(key, await cache.aget(self.cache_key(key)), fingerprint)
+
+    def get(self, key):
+        """Return the cached response or in-flight marker for key, or None"""
+        return self._local_get(key) or cache.get(self.cache_key(key))
+
+    def set(self, key, fingerprint, data, status_code):
+        """Store a response, replacing the in-flight marker"""
+        response = CachedResponse(fingerprint, data, status_code)
+        cache.set(self.cache_key(key), response, self.ttl_seconds)
+        self._local_set(key, response)
+
+    async def aset(self, key, fingerprint, data, status_code):
+        response = CachedResponse(fingerprint, data, status_code)
+        await cache.aset(self.cache_key(key), response, self.ttl_seconds)
+        self._local_set(key, response)
+
+    def release(self, key):
+        """Drop a key's in-flight marker without a response, so the request can be retried"""
+        cache.delete(self.cache_key(key))
+
+    async def arelease(self, key):
+        await cache.adelete(self.cache_key(key))
+
+    def clear(self):
+        """Forget the responses kept by this process"""
+        with self._lock:
+            self._entries.clear()
+
+_config = getattr(settings, 'IDEMPOTENCY_CACHE', {})
+idempotency_cache = IdempotencyCache(
+    max_entries=_config.get('MAX_ENTRIES', 10000),
+    ttl_seconds=_config.get('TTL_SECONDS', 24 * 60 * 60),
+    in_flight_seconds=_config.get('IN_FLIGHT_SECONDS', 60),
+)
+
+def _parse(request, user_id):
+    """Cache key and body fingerprint of a request, returns (cache_key, fingerprint, error)"""
+    idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not idempotency_key:
+        return None, None, None
+
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        return None, None, (
+            {'error': f'{IDEMPOTENCY_HEADER} cannot exceed {MAX_KEY_LENGTH} characters'},
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    cache_key = (user_id, request.method, request.path, idempotency_key)
+    return cache_key, hashlib.sha256(request.body).hexdigest(), None
+
+def _answer(fingerprint, entry):
+    """Error for an entry held by another request, returns (error, cached response)"""
+    if isinstance(entry, InFlight):
+        return (
+            {'error': f'A request with this {IDEMPOTENCY_HEADER} is still being processed'},
+            status.HTTP_409_CONFLICT
+        ), None
+    if entry.fingerprint != fingerprint:
+        return (
+            {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'},
+            status.HTTP_422_UNPROCESSABLE_ENTITY
+        ), None
+    return None, entry
+
+def _cacheable(response):
+    # Server errors are not cached so the client can retry them
+    return response.status_code < 500
+
+def idempotent(view_func):
+    """Replay the original response for a repeated Idempotency-Key instead of re-running a DRF view"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        cache_key, fingerprint, error = _parse(request, request.user.pk)
+        if error is not None:
+            return Response(error[0], status=error[1])
+        if cache_key is None:
+            return view_func(request, *args, **kwargs)
+
+        entry = idempotency_cache.claim(cache_key, fingerprint)
+        if entry is not None:
+            error, cached = _answer(fingerprint, entry)
+            if error is not None:
+                return Response(error[0], status=error[1])
+            return Response(cached.data, status=cached.status_code, headers={REPLAYED_HEADER: 'true'})
+
+        try:
+            response = view_func(request, *args, **kwargs)
+        except BaseException:
+            idempotency_cache.release(cache_key)
+            raise
+        if _cacheable(response):
+            idempotency_cache.set(cache_key, fingerprint, response.data, response.status_code)
+        else:
+            idempotency_cache.release(cache_key)
+        return response
+    return wrapper
+
+def aidempotent(view_func):
+    """Async counterpart of idempotent for views called as view_func(request, user)"""
+    @wraps(view_func)
+    async def wrapper(request, user, *args, **kwargs):
+        cache_key, fingerprint, error = _parse(request, user.pk)
+        if error is not None:
+            return create_json_response(error[0], error[1])
+        if cache_key is None:
+            return await view_func(request, user, *args, **kwargs)
+
+        entry = await idempotency_cache.aclaim(cache_key, fingerprint)
+        if entry is not None:
+            error, cached = _answer(fingerprint, entry)
+            if error is not None:
+                return create_json_response(error[0], error[1])
+            return create_json_response(cached.data, cached.status_code, headers={REPLAYED_HEADER: 'true'})
+
+        try:
+            response = await view_func(request, user, *args, **kwargs)
+        except BaseException:
+            await idempotency_cache.arelease(cache_key)
+            raise
+        if _cacheable(response):
+            await idempotency_cache.aset(cache_key, fingerprint, response.data, response.status_code)
+        else:
+            await idempotency_cache.arelease(cache_key)
+        return response
+    return wrapper
@@ -0,0 +1,177 @@
+# attendance/imports.py
+import csv
+import io
+import json
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from .enrollment import bump_enrollment_version
+from .models import User, UserImportJob
+from .serializers import UserImportRowSerializer
+
+def read_user_rows(content, filename=''):
+    """Rows of an uploaded CSV or JSON user file.
+
+    JSON may be a list of objects or {"users": [...]}. Empty CSV cells are
+    dropped so optional columns fall back to their defaults.
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    if filename.lower().endswith('.json') or content.lstrip()[:1] in ('[', '{'):
+        rows = json.loads(content)
+        if isinstance(rows, dict):
+            rows = rows.get('users')
+        if not isinstance(rows, list):
+            raise ValueError('JSON must be a list of users or an object with a "users" list')
+        return rows
+    return [
+        {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+        for row in csv.DictReader(io.StringIO(content))
+    ]
+
+def hash_passwords(passwords, workers=1):
+    """make_password for each password, spread over a pool of processes (None for every core) for large batches.
+
+    Workers come from a forkserver, so a pool started next to request
+    threads never forks a process that holds their locks.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(passwords))
+    if workers <= 1 or len(passwords) < settings.USER_IMPORT_PARALLEL_MIN_ROWS:
+        return [make_password(password) for password in passwords]
+    
+    # Workers start without configured settings
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('forkserver'), initializer=django.setup
+    ) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(len(passwords) // (workers * 4), 1)))
+
+def validate_user_rows(rows):
+    """Validated data of every row, and errors keyed by row index.
+
+    Row rules come from the registration serializer; usernames and emails
+    are checked against each other and against existing users in one query.
+    """
+    valid = {}
+    errors = {}
+    for index, row in enumerate(rows):
+        serializer = UserImportRowSerializer(data=row)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            errors[index] = serializer.errors
+    
+    usernames = Counter(data['username'] for data in valid.values())
+    emails = Counter(data['email'].lower() for data in valid.values() if data.get('email'))
+    taken_usernames = set()
+    taken_emails = set()
+    if valid:
+        for username, email in User.objects.annotate(email_lower=Lower('email')).filter(
+            Q(username__in=usernames) | Q(email_lower__in=emails)
+        ).values_list('username', 'email_lower'):
+            taken_usernames.add(username)
+            taken_emails.add(email)
+    
+    for index, data in list(valid.items()):
+        row_errors = {}
+        email = data.get('email', '').lower()
+        if data['username'] in taken_usernames:
+            row_errors['username'] = ["A user with that username already exists."]
+        elif usernames[data['username']] > 1:
+            row_errors['username'] = ["Username appears more than once in the import."]
+        if email and email in taken_emails:
+            row_errors['email'] = ["A user with that email already exists."]
+        elif email and emails[email] > 1:
+            row_errors['email'] = ["Email appears more than once in the import."]
+        if row_errors:
+            errors[index] = row_errors
+            del valid[index]
+    
+    return list(valid.values()), errors
+
+def import_users(rows, batch_size=500, hash_workers=1):
+    """Create users from import rows, all or nothing.
+
+    Passwords are hashed by hash_passwords with hash_workers processes.
+    Returns (users, errors); nothing is written when any row has errors.
+    """
+    valid, errors = validate_user_rows(rows)
+    if errors:
+        return [], errors
+    
+    hashes = hash_passwords([data['password'] for data in valid], hash_workers)
+    users = []
+    for data, password in zip(valid, hashes):
+        fields = {name: value for name, value in data.items() if name not in ('password', 'password_confirm')}
+        # Same normalization as create_user
+        fields['username'] = User.normalize_username(fields['username'])
+        fields['email'] = User.objects.normalize_email(fields.get('email', ''))
+        users.append(User(password=password, **fields))
+    
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+    # bulk_create skips post_save, so signal the change here
+    bump_enrollment_version()
+    return users, {}
+
+# Rows wait here between the request and the import worker, passwords are never stored
+_pending_rows = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+def import_executor():
+    """Process-wide worker thread running user imports one at a time, started on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='attendance-import')
+        return _executor
+
+def submit_user_import(user, rows):
+    """Create an import job for already validated rows and queue it, returns the job"""
+    job = UserImportJob.objects.create(requested_by=user, row_count=len(rows))
+    _pending_rows[str(job.pk)] = rows
+    transaction.on_commit(lambda: import_executor().submit(_run_in_worker, job.pk))
+    return job
+
+def run_user_import(job_id):
+    """Import a pending job's rows, hashing with USER_IMPORT_HASH_WORKERS processes, returns the job"""
+    rows = _pending_rows.pop(str(job_id), None)
+    # Claimed with a conditional update, a job is only ever run once
+    if not UserImportJob.objects.filter(pk=job_id, status='pending').update(status='running'):
+        return UserImportJob.objects.get(pk=job_id)
+    
+    job = UserImportJob.objects.get(pk=job_id)
+    try:
+        if rows is None:
+            raise ValueError('The rows were lost with the process that received them, please upload them again')
+        users, errors = import_users(rows, hash_workers=settings.USER_IMPORT_HASH_WORKERS)
+        job.created_count = len(users)
+        # Keys become strings in JSON
+        job.errors = {str(index): row_errors for index, row_errors in errors.items()}
+        job.status = 'failed' if errors else 'done'
+    except IntegrityError:
+        # A user with one of the usernames was registered while the import ran
+        job.status = 'failed'
+        job.error = 'Users changed while importing, please retry'
+    except Exception as error:
+        job.status = 'failed'
+        job.error = str(error) or error.__class__.__name__
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'created_count', 'errors', 'error', 'finished_at'])
+    return job
+
+def _run_in_worker(job_id):
+    try:
+        run_user_import(job_id)
+    finally:
+        # The worker thread keeps its own connection, it must not outlive the job
+        connection.close()
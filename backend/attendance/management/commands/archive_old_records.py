@@ -0,0 +1,31 @@
+# attendance/management/commands/archive_old_records.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from attendance.archive import archive_horizon, archive_attendance_records, archive_security_logs
+
+class Command(BaseCommand):
+    help = 'Move attendance records and security logs past the retention horizon into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--attendance-days', type=int, default=settings.ATTENDANCE_ARCHIVE_AFTER_DAYS,
+            help='Archive attendance records older than this many days'
+        )
+        parser.add_argument(
+            '--security-log-days', type=int, default=settings.SECURITY_LOG_ARCHIVE_AFTER_DAYS,
+            help='Archive security logs older than this many days'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        
+        before = archive_horizon(options['attendance_days'])
+        moved = archive_attendance_records(before, batch_size)
+        self.stdout.write(f'Archived {moved} attendance records dated before {before}')
+        
+        before = archive_horizon(options['security_log_days'])
+        moved = archive_security_logs(before, batch_size)
+        self.stdout.write(f'Archived {moved} security logs written before {before}')
+        
+        self.stdout.write(self.style.SUCCESS('Archiving complete'))
@@ -0,0 +1,16 @@
+# attendance/management/commands/auto_close_attendance.py
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from attendance.closing import auto_close_records
+
+class Command(BaseCommand):
+    help = 'Mark out attendance records left open, at the shift end of their role'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Day to close (YYYY-MM-DD), default yesterday')
+
+    def handle(self, *args, **options):
+        day = options['date'] or timezone.localdate() - timedelta(days=1)
+        closed = auto_close_records(day)
+        self.stdout.write(self.style.SUCCESS(f'Closed {closed} open attendance records of {day}'))
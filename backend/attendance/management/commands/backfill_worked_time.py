@@ -0,0 +1,48 @@
+# attendance/management/commands/backfill_worked_time.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from attendance.models import AttendanceRecord, RoleShiftTiming
+
+class Command(BaseCommand):
+    help = 'Backfill worked and overtime seconds on attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Records updated per statement batch')
+        parser.add_argument('--all', action='store_true', help='Recompute records that already have worked time')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        shift_timings = RoleShiftTiming.get_shift_timings()
+        
+        queryset = AttendanceRecord.objects.filter(
+            check_in_time__isnull=False,
+            check_out_time__isnull=False
+        )
+        if not options['all']:
+            queryset = queryset.filter(worked_seconds__isnull=True)
+        queryset = queryset.select_related('user').only(
+            'id', 'date', 'check_in_time', 'check_out_time', 'user__role'
+        ).order_by('id')
+        
+        # Walk the primary key so each batch is an index range scan
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            
+            # bulk_update skips auto_now, stamp updated_at so the change feed and caches see the new values
+            now = timezone.now()
+            for record in batch:
+                record.apply_worked_time(shift_timings.get(record.user.role))
+                record.updated_at = now
+            AttendanceRecord.objects.bulk_update(batch, ['worked_seconds', 'overtime_seconds', 'updated_at'])
+            
+            last_id = batch[-1].id
+            updated += len(batch)
+            self.stdout.write(f'Updated {updated} records')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Backfilled worked time for {updated} records')
+        )
@@ -0,0 +1,34 @@
+# attendance/management/commands/detect_anomalies.py
+from collections import Counter
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from attendance.anomalies import AnomalyScan, record_anomalies
+
+class Command(BaseCommand):
+    help = 'Scan attendance records for shared devices/IPs, impossible travel and reused coordinates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-date', type=date.fromisoformat, help='First day scanned (YYYY-MM-DD), default 30 days ago')
+        parser.add_argument('--to-date', type=date.fromisoformat, help='Last day scanned (YYYY-MM-DD), default yesterday')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Days of records read at a time')
+        parser.add_argument('--dry-run', action='store_true', help='Report findings without writing security logs')
+
+    def handle(self, *args, **options):
+        to_date = options['to_date'] or timezone.localdate() - timedelta(days=1)
+        from_date = options['from_date'] or to_date - timedelta(days=29)
+        
+        findings = AnomalyScan(from_date, to_date, options['chunk_days']).run()
+        for kind, count in sorted(Counter(finding['kind'] for finding in findings).items()):
+            self.stdout.write(f'{kind}: {count}')
+        
+        if options['dry_run']:
+            for finding in findings:
+                self.stdout.write(f"user {finding['user_id']}: {finding['description']}")
+            self.stdout.write(self.style.SUCCESS(f'Found {len(findings)} anomalies from {from_date} to {to_date} (dry run)'))
+            return
+        
+        written = record_anomalies(findings)
+        self.stdout.write(
+            self.style.SUCCESS(f'Found {len(findings)} anomalies from {from_date} to {to_date}, logged {written} new')
+        )
@@ -0,0 +1,33 @@
+# attendance/management/commands/dispatch_webhooks.py
+import time
+from django.core.management.base import BaseCommand
+from attendance.webhooks import ConnectionPool, dispatch_webhooks, webhook_setting
+
+class Command(BaseCommand):
+    help = 'Deliver queued attendance events to the webhook endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit instead of polling')
+        parser.add_argument('--batch-size', type=int, default=webhook_setting('BATCH_SIZE'), help='Events read per pass')
+        parser.add_argument('--workers', type=int, default=webhook_setting('MAX_WORKERS'), help='Endpoints delivered to at once')
+
+    def handle(self, *args, **options):
+        pool = ConnectionPool(timeout=webhook_setting('TIMEOUT_SECONDS'))
+        total = 0
+        try:
+            while True:
+                read, delivered = dispatch_webhooks(pool, options['batch_size'], options['workers'])
+                total += delivered
+                if delivered:
+                    self.stdout.write(f'Delivered {delivered} events')
+                if read:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(webhook_setting('POLL_SECONDS'))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.close()
+        
+        self.stdout.write(self.style.SUCCESS(f'Delivered {total} events'))
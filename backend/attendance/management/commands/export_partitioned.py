@@ -0,0 +1,35 @@
+# attendance/management/commands/export_partitioned.py
+from datetime import date
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from attendance.models import User
+from attendance.partitions import write_partitioned_zip
+
+class Command(BaseCommand):
+    help = 'Write a ZIP of attendance exports, one file per role and month, rendered in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the ZIP file written')
+        parser.add_argument('--from-date', type=date.fromisoformat, required=True, help='First day exported (YYYY-MM-DD)')
+        parser.add_argument('--to-date', type=date.fromisoformat, required=True, help='Last day exported (YYYY-MM-DD)')
+        parser.add_argument('--role', action='append', choices=[role for role, _ in User.ROLE_CHOICES],
+                            help='Role exported, repeatable, default every role')
+        parser.add_argument('--file-type', choices=['csv', 'ndjson', 'parquet'], default='csv')
+        parser.add_argument('--workers', type=int, help='Rendering processes, default PARTITIONED_EXPORT_WORKERS')
+
+    def handle(self, *args, **options):
+        if options['from_date'] > options['to_date']:
+            raise CommandError('--from-date must not be after --to-date')
+        
+        try:
+            with open(options['output'], 'wb') as output:
+                manifest = write_partitioned_zip(
+                    output, options['from_date'], options['to_date'], options['file_type'],
+                    roles=options['role'], workers=options['workers'] or settings.PARTITIONED_EXPORT_WORKERS
+                )
+        except ImportError:
+            raise CommandError('Parquet export requires the pyarrow package')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {manifest['total_rows']} records in {len(manifest['partitions'])} files to {options['output']}"
+        ))
@@ -4,7 +4,9 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import date, timedelta, datetime, time
 import random
+from attendance.devices import device_fingerprint_id
 from attendance.models import AttendanceRecord
+from attendance.workdays import get_calendar
 
 User = get_user_model()
 
@@ -50,14 +52,15 @@ class Command(BaseCommand):
         
         # Generate attendance records
         users = User.objects.filter(role__in=['student', 'intern', 'employee'])
+        device_id = device_fingerprint_id({'user_agent': 'Test Device Info'})
         start_date = date.today() - timedelta(days=days)
         
         for single_date in (start_date + timedelta(n) for n in range(days)):
-            # Skip weekends
-            if single_date.weekday() >= 5:
-                continue
-            
             for user in users:
+                # Skip weekends and holidays of the user's calendar
+                if not get_calendar(user.role).is_working_day(single_date):
+                    continue
+                
                 # Check if user is in active period
                 if not user.is_enrollment_active(single_date):
                     continue
@@ -106,12 +109,12 @@ class Command(BaseCommand):
                             'check_in_latitude': office_lat + lat_variation,
                             'check_in_longitude': office_lon + lon_variation,
                             'check_in_ip': f'192.168.1.{random.randint(1, 254)}',
-                            'check_in_device_info': 'Test Device Info',
+                            'check_in_device_id': device_id,
                             'check_out_time': check_out_time,
                             'check_out_latitude': office_lat + lat_variation,
                             'check_out_longitude': office_lon + lon_variation,
                             'check_out_ip': f'192.168.1.{random.randint(1, 254)}',
-                            'check_out_device_info': 'Test Device Info',
+                            'check_out_device_id': device_id,
                         }
                     )
                     
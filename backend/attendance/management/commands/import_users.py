@@ -0,0 +1,37 @@
+# attendance/management/commands/import_users.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from attendance.imports import read_user_rows, import_users, validate_user_rows
+
+class Command(BaseCommand):
+    help = 'Create users from a CSV or JSON file, all rows or none'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSON file of users')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users inserted per statement')
+        parser.add_argument('--workers', type=int, help='Password hashing processes, default USER_IMPORT_HASH_WORKERS')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the file')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as f:
+                rows = read_user_rows(f.read(), options['path'])
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Could not read {options['path']}: {error}")
+        
+        if options['dry_run']:
+            _, errors = validate_user_rows(rows)
+        else:
+            users, errors = import_users(
+                rows, options['batch_size'], options['workers'] or settings.USER_IMPORT_HASH_WORKERS
+            )
+        
+        for index in sorted(errors):
+            self.stderr.write(f'Row {index + 1}: {errors[index]}')
+        if errors:
+            raise CommandError(f'{len(errors)} of {len(rows)} rows are invalid, no users were created')
+        
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'All {len(rows)} rows are valid'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Created {len(users)} users'))
@@ -0,0 +1,28 @@
+# attendance/management/commands/rebuild_attendance_history.py
+from django.core.management.base import BaseCommand
+from attendance.history import rebuild_attendance_months
+from attendance.models import User
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly attendance bitmaps from attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only rebuild this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = User.objects.all()
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+        user_ids = list(users.order_by('id').values_list('id', flat=True))
+        
+        months = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            months += rebuild_attendance_months(batch)
+            self.stdout.write(f'Rebuilt {start + len(batch)} of {len(user_ids)} users')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {months} monthly bitmaps for {len(user_ids)} users')
+        )
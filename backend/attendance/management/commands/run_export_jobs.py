@@ -0,0 +1,11 @@
+# attendance/management/commands/run_export_jobs.py
+from django.core.management.base import BaseCommand
+from attendance.export_jobs import run_pending_export_jobs
+
+class Command(BaseCommand):
+    help = 'Fail timed out export jobs and build the pending ones left behind by a stopped process'
+
+    def handle(self, *args, **options):
+        jobs = run_pending_export_jobs()
+        failed = sum(job.status == 'failed' for job in jobs)
+        self.stdout.write(self.style.SUCCESS(f'Ran {len(jobs)} pending export jobs, {failed} failed'))
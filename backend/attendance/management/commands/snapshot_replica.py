@@ -0,0 +1,23 @@
+# attendance/management/commands/snapshot_replica.py
+import time
+from django.core.management.base import BaseCommand, CommandError
+from attendance.replicas import snapshot_replica
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to the local read replica (REPLICA_MODE=snapshot)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, help='Seconds between snapshots, repeat until interrupted')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                path = snapshot_replica()
+                self.stdout.write(f'Snapshot written to {path}')
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,20 @@
+# attendance/management/commands/sweep_enrollments.py
+from datetime import date
+from django.core.management.base import BaseCommand
+from attendance.enrollment import sweep_enrollments
+
+class Command(BaseCommand):
+    help = 'Deactivate expired enrollment periods and activate the ones that have started'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Day to sweep for (YYYY-MM-DD), default today')
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='Activate inactive windows starting from this day on (YYYY-MM-DD), default the day before --date'
+        )
+
+    def handle(self, *args, **options):
+        deactivated, activated = sweep_enrollments(options['date'], options['since'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deactivated {deactivated} expired and activated {activated} started enrollment periods'
+        ))
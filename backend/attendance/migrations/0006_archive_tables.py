@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:54
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0005_attendancemonth'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttendanceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=datetime.date.today)),
+                ('check_in_time', models.DateTimeField(blank=True, null=True)),
+                ('check_in_latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('check_in_longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True)),
+                ('check_in_ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('check_in_device_info', models.TextField(blank=True, null=True)),
+                ('check_out_time', models.DateTimeField(blank=True, null=True)),
+                ('check_out_latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('check_out_longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True)),
+                ('check_out_ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('check_out_device_info', models.TextField(blank=True, null=True)),
+                ('is_late', models.BooleanField(default=False)),
+                ('notes', models.TextField(blank=True)),
+                ('expected_start_time', models.TimeField(blank=True, null=True)),
+                ('worked_seconds', models.PositiveIntegerField(blank=True, null=True)),
+                ('overtime_seconds', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance_records', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date', '-created_at'],
+                'indexes': [models.Index(fields=['date'], name='archived_attendance_date_idx'), models.Index(fields=['user', 'date'], name='archived_attendance_user_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSecurityLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('log_type', models.CharField(choices=[('failed_geo', 'Failed Geo-fence Validation'), ('duplicate_attempt', 'Duplicate Attendance Attempt'), ('invalid_period', 'Invalid Enrollment Period'), ('suspicious_activity', 'Suspicious Activity')], max_length=20)),
+                ('description', models.TextField()),
+                ('ip_address', models.GenericIPAddressField()),
+                ('device_info', models.TextField()),
+                ('latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True)),
+                ('timestamp', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_security_logs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['timestamp'], name='archived_log_timestamp_idx')],
+            },
+        ),
+    ]
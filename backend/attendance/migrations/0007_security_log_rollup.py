@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_last_seen(apps, schema_editor):
+    # Existing rows are single events, last seen when they were written
+    for model_name in ('SecurityLog', 'ArchivedSecurityLog'):
+        model = apps.get_model('attendance', model_name)
+        model.objects.update(last_seen=models.F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_archive_tables'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedsecuritylog',
+            name='archived_log_timestamp_idx',
+        ),
+        migrations.AddField(
+            model_name='archivedsecuritylog',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='archivedsecuritylog',
+            name='last_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='securitylog',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='securitylog',
+            name='last_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_seen, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='archivedsecuritylog',
+            index=models.Index(fields=['last_seen'], name='archived_log_last_seen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='securitylog',
+            index=models.Index(fields=['user', 'log_type', 'last_seen'], name='security_log_rollup_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_security_log_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('user_agent', models.TextField(blank=True)),
+                ('accept_language', models.CharField(blank=True, max_length=255)),
+                ('accept_encoding', models.CharField(blank=True, max_length=255)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedattendancerecord',
+            name='check_in_device',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_check_ins', to='attendance.devicefingerprint'),
+        ),
+        migrations.AddField(
+            model_name='archivedattendancerecord',
+            name='check_out_device',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_check_outs', to='attendance.devicefingerprint'),
+        ),
+        migrations.AddField(
+            model_name='archivedsecuritylog',
+            name='device',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_set', to='attendance.devicefingerprint'),
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='check_in_device',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_check_ins', to='attendance.devicefingerprint'),
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='check_out_device',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_check_outs', to='attendance.devicefingerprint'),
+        ),
+        migrations.AddField(
+            model_name='securitylog',
+            name='device',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_set', to='attendance.devicefingerprint'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+import ast
+import hashlib
+
+from django.db import migrations
+
+FINGERPRINT_FIELDS = ('user_agent', 'accept_language', 'accept_encoding')
+
+# (model, text field, foreign key) pairs to convert
+DEVICE_COLUMNS = [
+    ('AttendanceRecord', 'check_in_device_info', 'check_in_device'),
+    ('AttendanceRecord', 'check_out_device_info', 'check_out_device'),
+    ('ArchivedAttendanceRecord', 'check_in_device_info', 'check_in_device'),
+    ('ArchivedAttendanceRecord', 'check_out_device_info', 'check_out_device'),
+    ('SecurityLog', 'device_info', 'device'),
+    ('ArchivedSecurityLog', 'device_info', 'device'),
+]
+
+
+def parse_device_info(text):
+    # Stored values are the repr of get_device_info(); anything else is kept as the user agent
+    try:
+        info = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        info = None
+    if not isinstance(info, dict):
+        info = {'user_agent': text}
+    return {field: ' '.join(str(info.get(field) or '').split()) for field in FINGERPRINT_FIELDS}
+
+
+def convert_device_info(apps, schema_editor):
+    DeviceFingerprint = apps.get_model('attendance', 'DeviceFingerprint')
+    devices = {}
+    for model_name, text_field, fk_field in DEVICE_COLUMNS:
+        model = apps.get_model('attendance', model_name)
+        texts = (
+            model.objects.exclude(**{f'{text_field}__isnull': True})
+            .values_list(text_field, flat=True).distinct().order_by()
+        )
+        for text in list(texts):
+            values = parse_device_info(text)
+            key = hashlib.sha256('\x1f'.join(values[field] for field in FINGERPRINT_FIELDS).encode()).hexdigest()
+            if key not in devices:
+                devices[key], _ = DeviceFingerprint.objects.get_or_create(fingerprint=key, defaults=values)
+            model.objects.filter(**{text_field: text}).update(**{fk_field: devices[key]})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_devicefingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_device_info, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0009_convert_device_info'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='archivedattendancerecord',
+            name='check_in_device_info',
+        ),
+        migrations.RemoveField(
+            model_name='archivedattendancerecord',
+            name='check_out_device_info',
+        ),
+        migrations.RemoveField(
+            model_name='archivedsecuritylog',
+            name='device_info',
+        ),
+        migrations.RemoveField(
+            model_name='attendancerecord',
+            name='check_in_device_info',
+        ),
+        migrations.RemoveField(
+            model_name='attendancerecord',
+            name='check_out_device_info',
+        ),
+        migrations.RemoveField(
+            model_name='securitylog',
+            name='device_info',
+        ),
+    ]
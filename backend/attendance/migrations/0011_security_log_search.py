@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:03
+
+import ipaddress
+
+from django.db import migrations, models, transaction
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'attendance_securitylog_fts'
+
+# External-content FTS5 index over attendance_securitylog.description, kept in sync by triggers
+FTS_CREATE = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"description, content='attendance_securitylog', content_rowid='id')",
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON attendance_securitylog BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON attendance_securitylog BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF description ON attendance_securitylog BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+FTS_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def pack_ip_address(ip):
+    # Older rows may hold text that is no address at all, they are left unpacked
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    if address.version == 4:
+        address = ipaddress.IPv6Address(f'::ffff:{address}')
+    return address.packed
+
+
+def backfill_ip_packed(apps, schema_editor):
+    for model_name in ('SecurityLog', 'ArchivedSecurityLog'):
+        model = apps.get_model('attendance', model_name)
+        for ip_address in list(model.objects.values_list('ip_address', flat=True).distinct().order_by()):
+            model.objects.filter(ip_address=ip_address).update(ip_packed=pack_ip_address(ip_address))
+
+
+def create_fts(apps, schema_editor):
+    # SQLite only, and only when the build has FTS5; search falls back to LIKE otherwise
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for statement in FTS_CREATE:
+                schema_editor.execute(statement)
+    except OperationalError:
+        pass
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in FTS_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0010_remove_device_info_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedsecuritylog',
+            name='ip_packed',
+            field=models.BinaryField(blank=True, max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='securitylog',
+            name='ip_packed',
+            field=models.BinaryField(blank=True, max_length=16, null=True),
+        ),
+        migrations.RunPython(backfill_ip_packed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='securitylog',
+            index=models.Index(fields=['log_type', 'last_seen'], name='security_log_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='securitylog',
+            index=models.Index(fields=['ip_packed', 'last_seen'], name='security_log_ip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='securitylog',
+            index=models.Index(fields=['device', 'last_seen'], name='security_log_device_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='securitylog',
+            index=models.Index(fields=['last_seen'], name='security_log_last_seen_idx'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
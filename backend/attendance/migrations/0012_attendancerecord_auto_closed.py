@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0011_security_log_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedattendancerecord',
+            name='auto_closed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='auto_closed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
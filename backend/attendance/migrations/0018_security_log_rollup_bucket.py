@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0017_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedsecuritylog',
+            name='rollup_bucket',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='securitylog',
+            name='rollup_bucket',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='securitylog',
+            constraint=models.UniqueConstraint(fields=('user', 'log_type', 'ip_address', 'device', 'rollup_bucket'), name='security_log_rollup_uniq'),
+        ),
+    ]
@@ -1,9 +1,12 @@
 # attendance/models.py (ADD THIS NEW MODEL)
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from datetime import date, time, datetime
 import json
+import uuid
+from .utils import pack_ip_address
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -37,6 +40,9 @@ class User(AbstractUser):
         
         return self.start_date <= check_date <= self.end_date and self.is_active_period
 
+# Roles that follow a shift timing
+SHIFT_ROLES = ['student', 'intern', 'employee']
+
 # NEW MODEL: Role-based shift timings
 class RoleShiftTiming(models.Model):
     ROLE_CHOICES = [
@@ -70,9 +76,64 @@ class RoleShiftTiming(models.Model):
             }
         )
         return timing
+    
+    @classmethod
+    def get_shift_timings(cls, roles=None):
+        """Get shift timings keyed by role in one query, creating defaults for missing roles"""
+        roles = SHIFT_ROLES if roles is None else [role for role in roles if role in SHIFT_ROLES]
+        timings = {timing.role: timing for timing in cls.objects.filter(role__in=roles)}
+        for role in set(roles) - set(timings):
+            timings[role] = cls.get_shift_timing(role)
+        return timings
 
-class AttendanceRecord(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_records')
+# NEW MODEL: Working-day calendars (per role, or a default for every role)
+class WorkCalendar(models.Model):
+    name = models.CharField(max_length=100)
+    role = models.CharField(
+        max_length=20, choices=RoleShiftTiming.ROLE_CHOICES, unique=True, null=True, blank=True
+    )  # Empty role is the default calendar
+    weekend_days = models.CharField(max_length=20, default='5,6')  # Comma-separated, Monday=0
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['role']
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_role_display() or 'Default'})"
+    
+    def get_weekend_days(self):
+        return [int(day) for day in self.weekend_days.split(',') if day.strip()]
+
+class Holiday(models.Model):
+    calendar = models.ForeignKey(WorkCalendar, on_delete=models.CASCADE, related_name='holidays')
+    date = models.DateField()
+    name = models.CharField(max_length=100, blank=True)
+    
+    class Meta:
+        unique_together = ['calendar', 'date']
+        ordering = ['date']
+    
+    def __str__(self):
+        return f"{self.calendar.name} - {self.date} {self.name}".strip()
+
+# NEW MODEL: Distinct client devices, referenced by records and logs instead of repeating header text
+class DeviceFingerprint(models.Model):
+    fingerprint = models.CharField(max_length=64, unique=True)  # sha256 of the normalized headers
+    user_agent = models.TextField(blank=True)
+    accept_language = models.CharField(max_length=255, blank=True)
+    accept_encoding = models.CharField(max_length=255, blank=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.user_agent or self.fingerprint[:12]
+
+class AttendanceRecordFields(models.Model):
+    """Columns shared by live and archived attendance records.
+    
+    Concrete models declare user and the timestamps last, in the same order,
+    so querysets of both can be combined with union().
+    """
     date = models.DateField(default=date.today)
     
     # Check-in information
@@ -80,52 +141,111 @@ class AttendanceRecord(models.Model):
     check_in_latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
     check_in_longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
     check_in_ip = models.GenericIPAddressField(null=True, blank=True)
-    check_in_device_info = models.TextField(null=True, blank=True)
+    check_in_device = models.ForeignKey(
+        DeviceFingerprint, on_delete=models.PROTECT, null=True, blank=True, related_name='%(class)s_check_ins'
+    )
     
     # Check-out information
     check_out_time = models.DateTimeField(null=True, blank=True)
     check_out_latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
     check_out_longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
     check_out_ip = models.GenericIPAddressField(null=True, blank=True)
-    check_out_device_info = models.TextField(null=True, blank=True)
+    check_out_device = models.ForeignKey(
+        DeviceFingerprint, on_delete=models.PROTECT, null=True, blank=True, related_name='%(class)s_check_outs'
+    )
     
     # Status tracking
     is_late = models.BooleanField(default=False)
     notes = models.TextField(blank=True)  # For late notes
     expected_start_time = models.TimeField(null=True, blank=True)  # Expected start time from shift
+    auto_closed = models.BooleanField(default=False)  # Marked out by auto_close_records at the shift end
+    
+    # Worked time, maintained on save so reports can aggregate in SQL
+    worked_seconds = models.PositiveIntegerField(null=True, blank=True)
+    overtime_seconds = models.IntegerField(null=True, blank=True)  # Negative for undertime, vs shift end time
     
+    class Meta:
+        abstract = True
+
+class AttendanceRecord(AttendanceRecordFields):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_records')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['user', 'date']
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['date'], name='attendance_date_idx'),
+            # Change feed cursor, see attendance/changes.py
+            models.Index(fields=['updated_at', 'id'], name='attendance_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.date}"
     
+    def apply_shift_timing(self, shift_timing):
+        """Set expected start time and late flag from the role's shift timing"""
+        self.expected_start_time = shift_timing.start_time
+        
+        # Calculate grace period end time
+        grace_period_end = datetime.combine(
+            self.date, 
+            shift_timing.start_time
+        ) + timezone.timedelta(minutes=shift_timing.grace_period_minutes)
+        
+        # Check if late (after grace period)
+        check_in_datetime = self.check_in_time
+        if timezone.is_naive(check_in_datetime):
+            check_in_datetime = timezone.make_aware(check_in_datetime)
+        
+        self.is_late = check_in_datetime.time() > grace_period_end.time()
+        self.apply_worked_time(shift_timing)
+    
+    def apply_worked_time(self, shift_timing=None):
+        """Set worked and overtime seconds from check-in/out and the shift end time"""
+        if not (self.check_in_time and self.check_out_time):
+            self.worked_seconds = None
+            self.overtime_seconds = None
+            return
+        
+        self.worked_seconds = max(int((self.check_out_time - self.check_in_time).total_seconds()), 0)
+        
+        if shift_timing is None:
+            self.overtime_seconds = None
+            return
+        
+        check_out_datetime = self.check_out_time
+        if timezone.is_naive(check_out_datetime):
+            check_out_datetime = timezone.make_aware(check_out_datetime)
+        shift_end = timezone.make_aware(datetime.combine(self.date, shift_timing.end_time))
+        self.overtime_seconds = int((check_out_datetime - shift_end).total_seconds())
+    
     def save(self, *args, **kwargs):
         # Check if check-in is late based on role shift timing
-        if self.check_in_time and self.user.role in ['student', 'intern', 'employee']:
-            shift_timing = RoleShiftTiming.get_shift_timing(self.user.role)
-            self.expected_start_time = shift_timing.start_time
-            
-            # Calculate grace period end time
-            grace_period_end = datetime.combine(
-                self.date, 
-                shift_timing.start_time
-            ) + timezone.timedelta(minutes=shift_timing.grace_period_minutes)
-            
-            # Check if late (after grace period)
-            check_in_datetime = self.check_in_time
-            if timezone.is_naive(check_in_datetime):
-                check_in_datetime = timezone.make_aware(check_in_datetime)
-            
-            self.is_late = check_in_datetime.time() > grace_period_end.time()
+        if self.check_in_time and self.user.role in SHIFT_ROLES:
+            self.apply_shift_timing(RoleShiftTiming.get_shift_timing(self.user.role))
+        else:
+            self.apply_worked_time()
         
         super().save(*args, **kwargs)
 
-class SecurityLog(models.Model):
+# NEW MODEL: Compact monthly attendance history, derived from attendance records
+class AttendanceMonth(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_months')
+    month = models.DateField()  # First day of the month
+    present_days = models.IntegerField(default=0)  # Bit n set when checked in on day n + 1
+    late_days = models.IntegerField(default=0)  # Bit n set when that check-in was late
+    
+    class Meta:
+        unique_together = ['user', 'month']
+        ordering = ['user', 'month']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.month.strftime('%Y-%m')}"
+
+class SecurityLogFields(models.Model):
+    """Columns shared by live and archived security logs, see AttendanceRecordFields"""
     LOG_TYPES = [
         ('failed_geo', 'Failed Geo-fence Validation'),
         ('duplicate_attempt', 'Duplicate Attendance Attempt'),
@@ -133,17 +253,173 @@ class SecurityLog(models.Model):
         ('suspicious_activity', 'Suspicious Activity'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='security_logs')
     log_type = models.CharField(max_length=20, choices=LOG_TYPES)
     description = models.TextField()
     ip_address = models.GenericIPAddressField()
-    device_info = models.TextField()
+    device = models.ForeignKey(
+        DeviceFingerprint, on_delete=models.PROTECT, null=True, blank=True, related_name='%(class)s_set'
+    )
     latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
     longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    
+    # Repeats of the same event are rolled up into one row, see attendance/security.py.
+    # timestamp is when the event was first seen.
+    count = models.PositiveIntegerField(default=1)
+    last_seen = models.DateTimeField(default=timezone.now)
+    
+    # ip_address packed for indexed range queries, see utils.pack_ip_address
+    ip_packed = models.BinaryField(max_length=16, null=True, blank=True)
+    
+    # Rollup window the row counts events of, see security.rollup_bucket (empty on rows older than it)
+    rollup_bucket = models.BigIntegerField(null=True, blank=True)
+    
+    class Meta:
+        abstract = True
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.log_type} - {self.timestamp}"
+    
+    def save(self, *args, **kwargs):
+        self.ip_packed = pack_ip_address(self.ip_address)
+        super().save(*args, **kwargs)
+
+class SecurityLog(SecurityLogFields):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='security_logs')
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', 'log_type', 'last_seen'], name='security_log_rollup_idx'),
+            models.Index(fields=['log_type', 'last_seen'], name='security_log_type_idx'),
+            models.Index(fields=['ip_packed', 'last_seen'], name='security_log_ip_idx'),
+            models.Index(fields=['device', 'last_seen'], name='security_log_device_idx'),
+            models.Index(fields=['last_seen'], name='security_log_last_seen_idx'),
+        ]
+        constraints = [
+            # One row per rollup key and window, so concurrent repeats cannot insert a second one
+            models.UniqueConstraint(
+                fields=['user', 'log_type', 'ip_address', 'device', 'rollup_bucket'], name='security_log_rollup_uniq'
+            ),
+        ]
+
+# NEW MODELS: Archive tables for rows past the retention horizon, see attendance/archive.py
+class ArchivedAttendanceRecord(AttendanceRecordFields):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_attendance_records')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['date'], name='archived_attendance_date_idx'),
+            models.Index(fields=['user', 'date'], name='archived_attendance_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.date} (archived)"
+
+class ArchivedSecurityLog(SecurityLogFields):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_security_logs')
+    timestamp = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['last_seen'], name='archived_log_last_seen_idx'),
+        ]
+
+# NEW MODEL: Attendance events waiting for webhook delivery, written with the record change
+class OutboxEvent(models.Model):
+    EVENT_TYPES = [
+        ('attendance.marked_in', 'Marked In'),
+        ('attendance.marked_out', 'Marked Out'),
+        ('attendance.late', 'Late Arrival'),
+    ]
+    
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPES)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.event_type} #{self.id}"
+
+# NEW MODEL: Integrations notified of outbox events by dispatch_webhooks
+class WebhookEndpoint(models.Model):
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=255, blank=True)  # Signs bodies with HMAC-SHA256 when set
+    event_types = models.CharField(max_length=255, blank=True)  # Comma-separated, empty for every event
+    is_active = models.BooleanField(default=True)
+    
+    # Delivery progress, events are delivered to each endpoint in id order
+    last_event_id = models.BigIntegerField(default=0)
+    failures = models.IntegerField(default=0)  # Failed attempts at the event after last_event_id
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.url
+    
+    def get_event_types(self):
+        return [event_type.strip() for event_type in self.event_types.split(',') if event_type.strip()]
+    
+    def wants(self, event_type):
+        event_types = self.get_event_types()
+        return not event_types or event_type in event_types
+    
+    def save(self, *args, **kwargs):
+        # A new endpoint starts with the next event, it is not sent the backlog
+        if self._state.adding and not self.last_event_id:
+            self.last_event_id = OutboxEvent.objects.aggregate(last=models.Max('id'))['last'] or 0
+        super().save(*args, **kwargs)
+
+# NEW MODEL: Attendance exports built in the background, see attendance/export_jobs.py
+class ExportJob(models.Model):
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    file_type = models.CharField(max_length=10)
+    filters = models.JSONField(default=dict)  # Normalized, see export_jobs.normalize_export_filters
+    # Name of the result file in the export cache: hash of the filters, file type and data version
+    cache_key = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    row_count = models.PositiveIntegerField(null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.file_type} export {self.id} ({self.status})"
+
+# NEW MODEL: Bulk user imports run in the background, see attendance/imports.py
+class UserImportJob(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='user_import_jobs')
+    status = models.CharField(max_length=10, choices=ExportJob.STATUSES, default='pending')
+    row_count = models.PositiveIntegerField()
+    created_count = models.PositiveIntegerField(null=True, blank=True)
+    # Row errors keyed by row index, when rows became invalid between the request and the import
+    errors = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.user.username} - {self.log_type} - {self.timestamp}"
\ No newline at end of file
+        return f"User import {self.id} ({self.status})"
@@ -0,0 +1,168 @@
+# attendance/offline.py
+from django.db import transaction
+from django.utils import timezone
+from .devices import device_fingerprint_id
+from .enrollment import is_enrollment_active
+from .history import record_attendance_days
+from .outbox import emit_attendance_events
+from .models import User, AttendanceRecord, RoleShiftTiming, SHIFT_ROLES
+from .security import record_security_events
+from .serializers import (
+    OfflineAttendanceEventSerializer, geofence_failure_log_kwargs, duplicate_attempt_log_kwargs
+)
+from .utils import validate_geofence, get_client_ip, get_device_info
+
+# Columns written when an offline event lands on an existing record
+SYNC_UPDATE_FIELDS = [
+    'check_in_time', 'check_in_latitude', 'check_in_longitude', 'check_in_ip', 'check_in_device',
+    'check_out_time', 'check_out_latitude', 'check_out_longitude', 'check_out_ip', 'check_out_device',
+    'is_late', 'notes', 'expected_start_time', 'worked_seconds', 'overtime_seconds', 'updated_at',
+]
+
+def _result(index, event, status, record=None, error=None, errors=None):
+    result = {'index': index, 'client_id': event.get('client_id', ''), 'status': status}
+    if record is not None:
+        result['record'] = record
+    if error is not None:
+        result['errors'] = {'non_field_errors': [error]}
+    if errors is not None:
+        result['errors'] = errors
+    return result
+
+def sync_offline_events(request, events):
+    """Validate and persist a batch of captured mark-in/out events in one transaction.
+
+    Returns one result per event, in request order. Events for other users
+    are only accepted from admin (kiosk) accounts.
+    """
+    results = [None] * len(events)
+    ip_address = get_client_ip(request)
+    device_id = device_fingerprint_id(get_device_info(request))
+    is_admin = request.user.role == 'admin'
+
+    # Field validation, no database access
+    valid = []
+    for index, event in enumerate(events):
+        serializer = OfflineAttendanceEventSerializer(data=event)
+        if not serializer.is_valid():
+            results[index] = _result(index, event, 'rejected', errors=serializer.errors)
+            continue
+
+        data = serializer.validated_data
+        data['user_id'] = data.get('user', request.user.pk)
+        if data['user_id'] != request.user.pk and not is_admin:
+            results[index] = _result(index, event, 'rejected', error="You can only sync your own attendance")
+            continue
+
+        data['date'] = timezone.localdate(data['timestamp'])
+        valid.append((index, event, data))
+
+    # Records are read and written in one transaction, locked until the batch is
+    # saved, so a concurrent mark-in/out is never overwritten by stale columns
+    with transaction.atomic():
+        # Everything the batch touches, loaded up front
+        users = User.objects.in_bulk({data['user_id'] for _, _, data in valid})
+        shift_timings = RoleShiftTiming.get_shift_timings({user.role for user in users.values()})
+        records = {
+            (record.user_id, record.date): record
+            for record in AttendanceRecord.objects.select_for_update().filter(
+                user_id__in=users.keys(),
+                date__in={data['date'] for _, _, data in valid}
+            )
+        }
+
+        new_records = {}
+        changed_records = {}
+        security_events = []
+        outbox = []
+
+        # Apply in capture order so a mark-out always follows its mark-in
+        for index, event, data in sorted(valid, key=lambda item: item[2]['timestamp']):
+            user = users.get(data['user_id'])
+            if user is None:
+                results[index] = _result(index, event, 'rejected', error="User not found")
+                continue
+
+            if not is_enrollment_active(user, data['date']):
+                results[index] = _result(index, event, 'rejected', error="User was not in an active enrollment period")
+                continue
+
+            if not validate_geofence(data['latitude'], data['longitude']):
+                security_events.append(geofence_failure_log_kwargs(request, user, data))
+                results[index] = _result(
+                    index, event, 'rejected', error="Location was outside office premises"
+                )
+                continue
+
+            key = (user.pk, data['date'])
+            record = records.get(key)
+
+            if data['type'] == 'in':
+                if record is not None and record.check_in_time:
+                    security_events.append(duplicate_attempt_log_kwargs(
+                        request, user, data, f"Duplicate offline check-in for {data['date']}"
+                    ))
+                    results[index] = _result(index, event, 'duplicate', record=record)
+                    continue
+
+                if record is None:
+                    record = AttendanceRecord(user=user, date=data['date'])
+                    records[key] = new_records[key] = record
+
+                record.check_in_time = data['timestamp']
+                record.check_in_latitude = data['latitude']
+                record.check_in_longitude = data['longitude']
+                record.check_in_ip = ip_address
+                record.check_in_device_id = device_id
+                record.notes = data.get('notes', '')
+                if user.role in SHIFT_ROLES:
+                    record.apply_shift_timing(shift_timings[user.role])
+            else:
+                if record is None or not record.check_in_time or data['timestamp'] < record.check_in_time:
+                    results[index] = _result(index, event, 'rejected', error="You must mark in before marking out")
+                    continue
+
+                if record.check_out_time:
+                    security_events.append(duplicate_attempt_log_kwargs(
+                        request, user, data, f"Duplicate offline check-out for {data['date']}"
+                    ))
+                    results[index] = _result(index, event, 'duplicate', record=record)
+                    continue
+
+                record.check_out_time = data['timestamp']
+                record.check_out_latitude = data['latitude']
+                record.check_out_longitude = data['longitude']
+                record.check_out_ip = ip_address
+                record.check_out_device_id = device_id
+                if user.role in SHIFT_ROLES:
+                    record.apply_shift_timing(shift_timings[user.role])
+                else:
+                    record.apply_worked_time()
+
+            if key not in new_records:
+                changed_records[key] = record
+            outbox.append((record, data['type']))
+            results[index] = _result(index, event, 'accepted', record=record)
+
+        AttendanceRecord.objects.bulk_create(new_records.values())
+        if changed_records:
+            # bulk_update skips auto_now, so stamp the change explicitly
+            now = timezone.now()
+            for record in changed_records.values():
+                record.updated_at = now
+            AttendanceRecord.objects.bulk_update(changed_records.values(), SYNC_UPDATE_FIELDS, batch_size=500)
+        record_security_events(security_events)
+        emit_attendance_events(outbox)
+        # Bulk writes skip post_save, so update the monthly bitmaps here
+        record_attendance_days(
+            (record.user_id, record.date, True, record.is_late)
+            for record in [*new_records.values(), *changed_records.values()]
+        )
+
+    for result in results:
+        record = result.pop('record', None)
+        if record is not None:
+            result['record_id'] = record.pk
+            result['is_late'] = record.is_late
+
+    return results
@@ -0,0 +1,31 @@
+# attendance/outbox.py
+from .models import OutboxEvent
+
+def attendance_payload(record):
+    return {
+        'record_id': record.pk,
+        'user_id': record.user_id,
+        'date': record.date,
+        'check_in_time': record.check_in_time,
+        'check_out_time': record.check_out_time,
+        'is_late': record.is_late,
+        'expected_start_time': record.expected_start_time,
+        'worked_seconds': record.worked_seconds,
+    }
+
+def emit_attendance_events(changes):
+    """Queue webhook events for (record, 'in' | 'out') changes with one INSERT.
+
+    Call inside the transaction that writes the records, so an event exists
+    exactly when its change was committed.
+    """
+    events = []
+    for record, kind in changes:
+        payload = attendance_payload(record)
+        if kind == 'in':
+            events.append(OutboxEvent(event_type='attendance.marked_in', payload=payload))
+            if record.is_late:
+                events.append(OutboxEvent(event_type='attendance.late', payload=payload))
+        else:
+            events.append(OutboxEvent(event_type='attendance.marked_out', payload=payload))
+    OutboxEvent.objects.bulk_create(events)
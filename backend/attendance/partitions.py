@@ -0,0 +1,106 @@
+# attendance/partitions.py
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import django
+from django.db import connections
+from django.utils import timezone
+from .models import User
+from .exports import write_export
+from .replicas import current_read_alias, reading_from
+
+# Already compressed, deflating them again only costs time
+STORED_FILE_TYPES = {'parquet'}
+
+def export_partitions(from_date, to_date, roles=None):
+    """(role, first day, last day) of each role and calendar month of a range, clipped to the range"""
+    roles = roles or [role for role, _ in User.ROLE_CHOICES]
+    months = []
+    first = from_date
+    while first <= to_date:
+        next_month = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+        months.append((first, min(next_month - timedelta(days=1), to_date)))
+        first = next_month
+    return [(role, first, last) for role in roles for first, last in months]
+
+def partition_name(partition, file_type):
+    role, first, _ = partition
+    return f"{role}/{first.strftime('%Y-%m')}.{file_type}"
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def render_partition(partition, file_type, directory, read_alias=None):
+    """Write one partition's export to a file in directory, returns its manifest entry and path"""
+    role, first, last = partition
+    handle, path = tempfile.mkstemp(dir=directory, suffix=f'.{file_type}')
+    with os.fdopen(handle, 'wb') as output, reading_from(read_alias):
+        rows = write_export(output, file_type, role=role, from_date=first, to_date=last)
+    return {
+        'path': partition_name(partition, file_type),
+        'role': role,
+        'month': first.strftime('%Y-%m'),
+        'from_date': first.isoformat(),
+        'to_date': last.isoformat(),
+        'rows': rows,
+        'bytes': os.path.getsize(path),
+        'sha256': _sha256(path),
+    }, path
+
+def _render_in_worker(args):
+    return render_partition(*args)
+
+def _init_partition_worker():
+    # Workers that are not forked start without configured settings
+    django.setup()
+
+def write_partitioned_zip(output, from_date, to_date, file_type='csv', roles=None, workers=1):
+    """Write a ZIP of one export file per role and month, rendered in a process pool of workers (None for every core).
+
+    Partitions are added in order as soon as each is rendered, followed by
+    manifest.json with each file's row count, size and SHA-256. output may
+    be unseekable. Returns the manifest. Only commands and background jobs
+    start a pool: forking inside a request thread copies locks other threads hold.
+    """
+    partitions = export_partitions(from_date, to_date, roles)
+    workers = min(workers or os.cpu_count() or 1, len(partitions))
+    compression = zipfile.ZIP_STORED if file_type in STORED_FILE_TYPES else zipfile.ZIP_DEFLATED
+
+    manifest = {
+        'from_date': from_date.isoformat(),
+        'to_date': to_date.isoformat(),
+        'file_type': file_type,
+        'generated_at': timezone.now().isoformat(),
+        'partitions': [],
+    }
+    with tempfile.TemporaryDirectory() as directory, zipfile.ZipFile(output, 'w', compression) as archive:
+        # Workers read from the database this process reads from
+        tasks = [(partition, file_type, directory, current_read_alias()) for partition in partitions]
+        if workers <= 1:
+            results = map(_render_in_worker, tasks)
+            pool = None
+        else:
+            # Forked workers must not share this process's connections, each opens its own
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_partition_worker)
+            results = pool.map(_render_in_worker, tasks)
+        try:
+            for entry, path in results:
+                archive.write(path, entry['path'])
+                os.unlink(path)
+                manifest['partitions'].append(entry)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        manifest['total_rows'] = sum(entry['rows'] for entry in manifest['partitions'])
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    return manifest
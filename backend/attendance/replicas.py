@@ -0,0 +1,172 @@
+# attendance/replicas.py
+import sqlite3
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import FileResponse
+from django.utils.functional import LazyObject
+
+# Reads are only sent to the replica inside reading_from(), everything else uses the primary
+_read_alias = ContextVar('attendance_read_alias', default=None)
+
+def replica_alias():
+    """Alias of the configured read replica, or None"""
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias and alias in settings.DATABASES else None
+
+class ReplicaRouter:
+    """Send reads of admin, report and export views to the read replica, and every write to the primary"""
+
+    def db_for_read(self, model, **hints):
+        # The database cache table is shared state, a replica copy of it is stale
+        if model._meta.app_label == 'django_cache':
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, migrations reach it through the primary
+        return db != replica_alias()
+
+def current_read_alias():
+    return _read_alias.get()
+
+@contextmanager
+def reading_from(alias):
+    """Route reads in the block to a database alias (None leaves them on the primary)"""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+def _pin_key(user_id):
+    return f'replica_pin:{user_id}'
+
+def pin_to_primary(user):
+    """Read a user's requests from the primary for REPLICA_PIN_SECONDS, so they see their own writes"""
+    cache.set(_pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+async def apin_to_primary(user):
+    """Async counterpart of pin_to_primary"""
+    await cache.aset(_pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+def read_alias_for(user):
+    """Alias the reads of a user's request go to: the replica, unless the user wrote recently"""
+    alias = replica_alias()
+    if alias is None or (user.is_authenticated and cache.get(_pin_key(user.pk))):
+        return None
+    return alias
+
+def _iterate_reading_from(iterable, alias):
+    with reading_from(alias):
+        yield from iterable
+
+def replica_reads(view):
+    """Function view decorator (inside @api_view) routing the view's reads to the replica"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = read_alias_for(request.user)
+        if alias is None:
+            return view(request, *args, **kwargs)
+
+        with reading_from(alias):
+            response = view(request, *args, **kwargs)
+        # Streamed rows are read after the view returns
+        if response.streaming and not isinstance(response, FileResponse):
+            response.streaming_content = _iterate_reading_from(response.streaming_content, alias)
+        return response
+    return wrapper
+
+class ReplicaReadMixin:
+    """Route an APIView's reads to the replica, once the request is authenticated"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        alias = read_alias_for(request.user)
+        if alias is not None:
+            self._read_alias_token = _read_alias.set(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_read_alias_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._read_alias_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class ReplicaPinMiddleware:
+    """Pin users to the primary after a successful write request (read-your-writes).
+
+    Views authenticate with JWT and set request.user themselves, so this runs
+    after the response is built. Sync and async capable, it never puts the
+    async mark-in/out views behind a thread hop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _is_write(self, request, response):
+        return request.method not in self.SAFE_METHODS and response.status_code < 400 and replica_alias()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self._is_write(request, response):
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self._is_write(request, response):
+            user = getattr(request, 'user', None)
+            # Still the session user of AuthenticationMiddleware, resolve it without blocking the loop
+            if isinstance(user, LazyObject):
+                user = await request.auser()
+            if user is not None and user.is_authenticated:
+                await apin_to_primary(user)
+        return response
+
+def snapshot_replica():
+    """Copy the primary SQLite database to the replica file, swapped in atomically.
+
+    Open replica connections keep reading the previous snapshot until they
+    reconnect. Returns the replica path.
+    """
+    alias = replica_alias()
+    if alias is None:
+        raise ValueError('No replica database is configured')
+    if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+        raise ValueError('Snapshots are only taken between SQLite databases')
+
+    path = str(settings.DATABASES[alias]['NAME'])
+    temp_path = f'{path}.tmp'
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    target = sqlite3.connect(temp_path)
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
+    os.replace(temp_path, path)
+    return path
@@ -0,0 +1,150 @@
+# attendance/security.py
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from .devices import device_fingerprint_id, adevice_fingerprint_id
+from .models import SecurityLog
+from .utils import pack_ip_address
+
+# Fields that identify a repeat of the same security event, unique together on SecurityLog
+ROLLUP_KEY = ('user_id', 'log_type', 'ip_address', 'device_id', 'rollup_bucket')
+
+def rollup_bucket(when):
+    """Number of the SECURITY_LOG_ROLLUP_SECONDS window a time falls in"""
+    return int(when.timestamp()) // settings.SECURITY_LOG_ROLLUP_SECONDS
+
+def _normalized(fields, device_id, now):
+    """SecurityLog field values with the device_info dict swapped for its DeviceFingerprint id"""
+    fields = dict(fields)
+    if 'user' in fields:
+        fields['user_id'] = fields.pop('user').pk
+    fields.pop('device_info', None)
+    fields['device_id'] = device_id
+    fields['ip_packed'] = pack_ip_address(fields['ip_address'])
+    fields['rollup_bucket'] = rollup_bucket(now)
+    return fields
+
+def _rollup_row(fields):
+    """The row a new event is counted into"""
+    return SecurityLog.objects.filter(**{name: fields[name] for name in ROLLUP_KEY})
+
+def _rollup_updates(fields, now, count=1):
+    # The row keeps the first event's time and the latest event's details
+    return {
+        'count': F('count') + count,
+        'last_seen': now,
+        'description': fields['description'],
+        'latitude': fields.get('latitude'),
+        'longitude': fields.get('longitude'),
+    }
+
+def _count_event(fields, now, count=1):
+    # Counted in place when the row exists. Otherwise inserted, and a concurrent
+    # insert of the same key losing on the unique constraint counts into the winner.
+    if _rollup_row(fields).update(**_rollup_updates(fields, now, count)):
+        return
+    try:
+        with transaction.atomic():
+            SecurityLog.objects.create(last_seen=now, **dict(fields, count=count))
+    except IntegrityError:
+        _rollup_row(fields).update(**_rollup_updates(fields, now, count))
+
+def record_security_event(**fields):
+    """Write a SecurityLog, or count it into the row of the same event in the current rollup window"""
+    now = timezone.now()
+    _count_event(_normalized(fields, device_fingerprint_id(fields['device_info']), now), now)
+
+async def arecord_security_event(**fields):
+    """Async counterpart of record_security_event"""
+    now = timezone.now()
+    fields = _normalized(fields, await adevice_fingerprint_id(fields['device_info']), now)
+    if await _rollup_row(fields).aupdate(**_rollup_updates(fields, now)):
+        return
+    try:
+        await SecurityLog.objects.acreate(last_seen=now, **fields)
+    except IntegrityError:
+        await _rollup_row(fields).aupdate(**_rollup_updates(fields, now))
+
+def record_security_events(events):
+    """Bulk record_security_event, coalescing repeats within the batch first"""
+    now = timezone.now()
+    groups = {}
+    device_ids = {}
+    for fields in events:
+        # Events of a batch usually share one device
+        device_key = tuple(sorted(fields['device_info'].items()))
+        if device_key not in device_ids:
+            device_ids[device_key] = device_fingerprint_id(fields['device_info'])
+        fields = _normalized(fields, device_ids[device_key], now)
+        key = tuple(fields[name] for name in ROLLUP_KEY)
+        fields['count'] = groups[key]['count'] + 1 if key in groups else 1
+        groups[key] = fields
+    if not groups:
+        return
+
+    existing = {
+        tuple(row[:-1]): row[-1]
+        for row in SecurityLog.objects.filter(
+            user_id__in={fields['user_id'] for fields in groups.values()},
+            rollup_bucket=rollup_bucket(now),
+        ).values_list(*ROLLUP_KEY, 'pk')
+    }
+
+    new_groups = []
+    changed_logs = []
+    for key, fields in groups.items():
+        if key not in existing:
+            new_groups.append(fields)
+            continue
+        # Incremented in SQL, so counts of a concurrent writer are kept
+        changed_logs.append(SecurityLog(pk=existing[key], **_rollup_updates(fields, now, fields['count'])))
+
+    if new_groups:
+        try:
+            with transaction.atomic():
+                SecurityLog.objects.bulk_create(SecurityLog(last_seen=now, **fields) for fields in new_groups)
+        except IntegrityError:
+            # Another writer inserted one of the keys meanwhile
+            for fields in new_groups:
+                _count_event(fields, now, fields['count'])
+    SecurityLog.objects.bulk_update(
+        changed_logs, ['count', 'last_seen', 'description', 'latitude', 'longitude'], batch_size=500
+    )
+
+# Full-text search over descriptions, see migration 0011_security_log_search
+FTS_TABLE = 'attendance_securitylog_fts'
+_fts_databases = {}
+
+def _fts_available(connection):
+    """Whether the FTS5 table and its sync triggers exist, checked once per database"""
+    key = (connection.alias, str(connection.settings_dict['NAME']))
+    if key not in _fts_databases:
+        available = False
+        if connection.vendor == 'sqlite':
+            names = [FTS_TABLE, f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au']
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(names))})", names
+                )
+                # A table rebuild by a later schema change drops the triggers, LIKE is used then
+                available = cursor.fetchone()[0] == len(names)
+        _fts_databases[key] = available
+    return _fts_databases[key]
+
+def fts_query(text):
+    """FTS5 query matching every word of text as a prefix, with query syntax escaped"""
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
+def search_security_logs(queryset, text):
+    """Logs whose description contains every word of text, through FTS5 when available"""
+    if not text.split():
+        return queryset
+    if queryset.model is SecurityLog and _fts_available(connections[queryset.db]):
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_query(text)]
+        ))
+    for word in text.split():
+        queryset = queryset.filter(description__icontains=word)
+    return queryset
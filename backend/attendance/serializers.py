@@ -1,10 +1,17 @@
 # attendance/serializers.py (UPDATED)
 # ================================
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.utils import timezone
 from datetime import date, time, datetime
-from .models import User, AttendanceRecord, SecurityLog, RoleShiftTiming
+from .models import (
+    User, AttendanceRecord, SecurityLog, RoleShiftTiming, WorkCalendar, Holiday, DeviceFingerprint, ExportJob,
+    UserImportJob
+)
+from .enrollment import ais_enrollment_active, is_enrollment_active
+from .security import record_security_event, arecord_security_event
 from .utils import validate_geofence, get_client_ip, get_device_info
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -41,6 +48,25 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
+# NEW: One row of a bulk user import
+class UserImportRowSerializer(UserRegistrationSerializer):
+    # Uniqueness is checked for the whole import in one query, not per row
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    password_confirm = serializers.CharField(write_only=True, required=False)
+    
+    def validate(self, data):
+        data.setdefault('password_confirm', data['password'])
+        return super().validate(data)
+
+class UserImportSerializer(serializers.Serializer):
+    users = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+    
+    def validate_users(self, value):
+        max_rows = settings.USER_IMPORT_MAX_ROWS
+        if len(value) > max_rows:
+            raise serializers.ValidationError(f"Cannot import more than {max_rows} users at once")
+        return value
+
 class UserLoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
@@ -63,17 +89,18 @@ class UserLoginSerializer(serializers.Serializer):
         return data
 
 # UPDATED: AttendanceMarkSerializer with notes support
-class AttendanceMarkSerializer(serializers.Serializer):
+class AttendanceLocationSerializer(serializers.Serializer):
     latitude = serializers.DecimalField(max_digits=10, decimal_places=8)
     longitude = serializers.DecimalField(max_digits=11, decimal_places=8)
     notes = serializers.CharField(required=False, allow_blank=True, max_length=500)
-    
+
+class AttendanceMarkSerializer(AttendanceLocationSerializer):
     def validate(self, data):
         request = self.context['request']
         user = request.user
         
         # Check enrollment period
-        if not user.is_enrollment_active():
+        if not is_enrollment_active(user):
             raise serializers.ValidationError(
                 "You are not in an active enrollment period"
             )
@@ -81,23 +108,101 @@ class AttendanceMarkSerializer(serializers.Serializer):
         # Validate geofence
         if not validate_geofence(data['latitude'], data['longitude']):
             # Log security violation
-            SecurityLog.objects.create(
-                user=user,
-                log_type='failed_geo',
-                description=f"Geofence validation failed. Location: {data['latitude']}, {data['longitude']}",
-                ip_address=get_client_ip(request),
-                device_info=get_device_info(request),
-                latitude=data['latitude'],
-                longitude=data['longitude']
-            )
+            record_security_event(**geofence_failure_log_kwargs(request, user, data))
             raise serializers.ValidationError(
                 "You must be within office premises to mark attendance"
             )
         
         return data
 
+async def avalidate_attendance_mark(request, user, data):
+    """Async counterpart of AttendanceMarkSerializer.validate, returns an error message or None"""
+    if not await ais_enrollment_active(user):
+        return "You are not in an active enrollment period"
+    
+    if not validate_geofence(data['latitude'], data['longitude']):
+        await arecord_security_event(**geofence_failure_log_kwargs(request, user, data))
+        return "You must be within office premises to mark attendance"
+    
+    return None
+
+def geofence_failure_log_kwargs(request, user, data):
+    """Build the SecurityLog fields for a failed geofence validation"""
+    return {
+        'user': user,
+        'log_type': 'failed_geo',
+        'description': f"Geofence validation failed. Location: {data['latitude']}, {data['longitude']}",
+        'ip_address': get_client_ip(request),
+        'device_info': get_device_info(request),
+        'latitude': data['latitude'],
+        'longitude': data['longitude'],
+    }
+
+def duplicate_attempt_log_kwargs(request, user, data, description):
+    """Build the SecurityLog fields for a duplicate mark attempt"""
+    return {
+        'user': user,
+        'log_type': 'duplicate_attempt',
+        'description': description,
+        'ip_address': get_client_ip(request),
+        'device_info': get_device_info(request),
+        'latitude': data['latitude'],
+        'longitude': data['longitude'],
+    }
+
+# NEW: Timestamped event captured by an offline or kiosk client
+class OfflineAttendanceEventSerializer(AttendanceLocationSerializer):
+    EVENT_TYPES = [('in', 'Mark in'), ('out', 'Mark out')]
+    
+    client_id = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    user = serializers.IntegerField(required=False)
+    type = serializers.ChoiceField(choices=EVENT_TYPES)
+    timestamp = serializers.DateTimeField()
+    
+    def validate_timestamp(self, value):
+        # Allow a little clock skew between the device and the server
+        if value > timezone.now() + timezone.timedelta(minutes=5):
+            raise serializers.ValidationError("Timestamp cannot be in the future")
+        return value
+
+class OfflineAttendanceSyncSerializer(serializers.Serializer):
+    events = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+    
+    def validate_events(self, value):
+        max_events = settings.OFFLINE_SYNC_MAX_EVENTS
+        if len(value) > max_events:
+            raise serializers.ValidationError(f"Cannot sync more than {max_events} events per request")
+        return value
+
 # UPDATED: AttendanceRecordSerializer with new fields
-class AttendanceRecordSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """ModelSerializer that only outputs the fields named in a fields= argument.
+    
+    field_columns maps a field to the model columns it reads, as 'name' or
+    'relation__name' lookups; other fields read the column of their own name.
+    """
+    field_columns = {}
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+    
+    @classmethod
+    def columns(cls, fields):
+        """Columns of the model, and of each related model, that a set of fields reads"""
+        local = set()
+        related = {}
+        for field in fields:
+            for column in cls.field_columns.get(field, [field]):
+                relation, _, name = column.partition('__')
+                local.add(relation)
+                if name:
+                    related.setdefault(relation, set()).add(name)
+        return local, related
+
+class AttendanceRecordSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
     user_role = serializers.CharField(source='user.role', read_only=True)
     expected_start_time = serializers.TimeField(read_only=True)
@@ -105,8 +210,18 @@ class AttendanceRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = AttendanceRecord
         fields = ['id', 'user', 'user_name', 'user_role', 'date', 'check_in_time', 
-                 'check_out_time', 'is_late', 'notes', 'expected_start_time', 'created_at']
-        read_only_fields = ['user', 'created_at']
+                 'check_out_time', 'is_late', 'auto_closed', 'notes', 'expected_start_time', 'created_at']
+        read_only_fields = ['user', 'auto_closed', 'created_at']
+    
+    field_columns = {
+        'user_name': ['user__first_name', 'user__last_name'],
+        'user_role': ['user__role'],
+    }
+
+# NEW: Attendance rows of the change feed, with the change stamp and worked time
+class AttendanceChangeSerializer(AttendanceRecordSerializer):
+    class Meta(AttendanceRecordSerializer.Meta):
+        fields = AttendanceRecordSerializer.Meta.fields + ['worked_seconds', 'overtime_seconds', 'updated_at']
 
 # NEW: Serializer for updating notes
 class AttendanceNotesUpdateSerializer(serializers.ModelSerializer):
@@ -141,7 +256,42 @@ class RoleShiftTimingSerializer(serializers.ModelSerializer):
         
         return data
 
-class UserSerializer(serializers.ModelSerializer):
+# NEW: Working-day calendar serializers for admin
+class WorkCalendarSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkCalendar
+        fields = ['id', 'name', 'role', 'weekend_days', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+    
+    def validate_weekend_days(self, value):
+        try:
+            days = [int(day) for day in value.split(',') if day.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Weekend days must be comma-separated weekday numbers")
+        if any(day < 0 or day > 6 for day in days):
+            raise serializers.ValidationError("Weekday numbers must be between 0 (Monday) and 6 (Sunday)")
+        return ','.join(str(day) for day in sorted(set(days)))
+    
+    def validate(self, data):
+        if data.get('role') == '':
+            data['role'] = None
+        
+        role = data['role'] if 'role' in data else getattr(self.instance, 'role', None)
+        if role is None:
+            defaults = WorkCalendar.objects.filter(role__isnull=True)
+            if self.instance is not None:
+                defaults = defaults.exclude(pk=self.instance.pk)
+            if defaults.exists():
+                raise serializers.ValidationError("A default calendar already exists")
+        
+        return data
+
+class HolidaySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Holiday
+        fields = ['id', 'calendar', 'date', 'name']
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 
@@ -162,10 +312,113 @@ class UserDateUpdateSerializer(serializers.ModelSerializer):
                 )
         return data
 
-class SecurityLogSerializer(serializers.ModelSerializer):
+# NEW: Bulk enrollment-window update, by user ids or by a filter on role and current window
+class EnrollmentFilterSerializer(serializers.Serializer):
+    role = serializers.ChoiceField(choices=User.ROLE_CHOICES, required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    is_active_period = serializers.BooleanField(required=False)
+    
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("Filter must set at least one of role, start_date, end_date, is_active_period")
+        return data
+
+class BulkEnrollmentUpdateSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = EnrollmentFilterSerializer(required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    is_active_period = serializers.BooleanField(required=False)
+    
+    UPDATE_FIELDS = ['start_date', 'end_date', 'is_active_period']
+    
+    def validate(self, data):
+        if ('user_ids' in data) == ('filter' in data):
+            raise serializers.ValidationError("Give either user_ids or filter")
+        if not any(field in data for field in self.UPDATE_FIELDS):
+            raise serializers.ValidationError("Give at least one of start_date, end_date, is_active_period")
+        if data.get('start_date') and data.get('end_date'):
+            if data['start_date'] >= data['end_date']:
+                raise serializers.ValidationError(
+                    "Start date must be before end date"
+                )
+        return data
+    
+    def get_values(self):
+        return {field: self.validated_data[field] for field in self.UPDATE_FIELDS if field in self.validated_data}
+    
+    def get_users(self):
+        if 'user_ids' in self.validated_data:
+            return User.objects.filter(id__in=self.validated_data['user_ids'])
+        return User.objects.filter(**self.validated_data['filter'])
+
+class ExportJobRequestSerializer(serializers.Serializer):
+    file_type = serializers.ChoiceField(choices=['csv', 'ndjson', 'parquet', 'arrow'], default='csv')
+    user_id = serializers.IntegerField(required=False)
+    role = serializers.ChoiceField(choices=User.ROLE_CHOICES, required=False)
+    from_date = serializers.DateField(required=False)
+    to_date = serializers.DateField(required=False)
+    
+    def validate(self, data):
+        if data.get('from_date') and data.get('to_date') and data['from_date'] > data['to_date']:
+            raise serializers.ValidationError("from_date must not be after to_date")
+        return data
+
+class PartitionedExportSerializer(serializers.Serializer):
+    file_type = serializers.ChoiceField(choices=['csv', 'ndjson', 'parquet'], default='csv')
+    role = serializers.ChoiceField(choices=User.ROLE_CHOICES, required=False)
+    from_date = serializers.DateField()
+    to_date = serializers.DateField()
+    
+    def validate(self, data):
+        if data['from_date'] > data['to_date']:
+            raise serializers.ValidationError("from_date must not be after to_date")
+        if (data['to_date'] - data['from_date']).days >= settings.ATTENDANCE_REPORT_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"Date range cannot exceed {settings.ATTENDANCE_REPORT_MAX_DAYS} days"
+            )
+        return data
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'status', 'file_type', 'filters', 'row_count', 'file_size', 'error', 'created_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+class UserImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserImportJob
+        fields = ['id', 'status', 'row_count', 'created_count', 'errors', 'error', 'created_at', 'finished_at']
+        read_only_fields = fields
+
+class DeviceFingerprintSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeviceFingerprint
+        fields = ['id', 'user_agent', 'accept_language', 'accept_encoding', 'first_seen']
+
+class DeviceFingerprintUsageSerializer(DeviceFingerprintSerializer):
+    check_ins = serializers.IntegerField(read_only=True)
+    last_check_in = serializers.DateTimeField(read_only=True)
+    
+    class Meta(DeviceFingerprintSerializer.Meta):
+        fields = DeviceFingerprintSerializer.Meta.fields + ['check_ins', 'last_check_in']
+
+class SecurityLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    first_seen = serializers.DateTimeField(source='timestamp', read_only=True)
+    device_info = DeviceFingerprintSerializer(source='device', read_only=True)
     
     class Meta:
         model = SecurityLog
         fields = ['id', 'user', 'user_name', 'log_type', 'description', 
-                 'ip_address', 'device_info', 'latitude', 'longitude', 'timestamp']
\ No newline at end of file
+                 'ip_address', 'device_info', 'latitude', 'longitude', 'timestamp',
+                 'count', 'first_seen', 'last_seen']
+    
+    field_columns = {
+        'user_name': ['user__first_name', 'user__last_name'],
+        'first_seen': ['timestamp'],
+        'device_info': [f'device__{field}' for field in DeviceFingerprintSerializer.Meta.fields],
+    }
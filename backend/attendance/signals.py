@@ -0,0 +1,50 @@
+# attendance/signals.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .history import record_attendance_day
+from .devices import device_cache
+from .enrollment import ENROLLMENT_FIELDS, bump_enrollment_version
+from .models import User, AttendanceRecord, DeviceFingerprint, WorkCalendar, Holiday
+from .workdays import invalidate_calendars
+
+@receiver([post_save, post_delete], sender=WorkCalendar)
+@receiver([post_save, post_delete], sender=Holiday)
+def work_calendar_changed(sender, **kwargs):
+    """Recompile working-day bitmaps after a calendar or holiday edit"""
+    invalidate_calendars()
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, update_fields=None, **kwargs):
+    """Mark enrollment-derived state stale after a user edit (but not a last_login stamp)"""
+    if update_fields is None or ENROLLMENT_FIELDS & set(update_fields):
+        bump_enrollment_version()
+
+# Set while deleted records stay counted in the monthly bitmaps, such as when they are archived
+_keep_history = ContextVar('attendance_keep_history', default=False)
+
+@contextmanager
+def keeping_attendance_history():
+    """Delete attendance records in the block without clearing their days from the monthly bitmaps"""
+    token = _keep_history.set(True)
+    try:
+        yield
+    finally:
+        _keep_history.reset(token)
+
+@receiver(post_save, sender=AttendanceRecord)
+def attendance_record_saved(sender, instance, **kwargs):
+    """Keep the record's day in the monthly attendance bitmaps in step"""
+    record_attendance_day(instance.user_id, instance.date, bool(instance.check_in_time), instance.is_late)
+
+@receiver(post_delete, sender=AttendanceRecord)
+def attendance_record_deleted(sender, instance, **kwargs):
+    if _keep_history.get():
+        return
+    record_attendance_day(instance.user_id, instance.date, False)
+
+@receiver(post_delete, sender=DeviceFingerprint)
+def device_fingerprint_deleted(sender, **kwargs):
+    """Forget interned device ids once a fingerprint is gone"""
+    device_cache.clear()
@@ -1,13 +1,55 @@
 # attendance/tests.py
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Max
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.apps import apps as django_apps
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from datetime import date, timedelta
-from .models import AttendanceRecord, SecurityLog
-from .utils import validate_geofence, calculate_distance
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.utils import timezone
+from datetime import date, datetime, time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import importlib
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import zipfile
+from . import views
+from .checks import check_shared_cache
+from .closing import auto_close_records
+from .devices import device_cache, device_fingerprint_id
+from .enrollment import active_users, enrollment_version, is_enrollment_active
+from .export_jobs import ExportCache, run_export_job
+from .idempotency import IdempotencyCache, InFlight, idempotency_cache
+from .imports import run_user_import
+from .replicas import (
+    ReplicaPinMiddleware, ReplicaRouter, current_read_alias, pin_to_primary, read_alias_for, reading_from
+)
+from .security import arecord_security_event, record_security_event, record_security_events
+from .models import (
+    AttendanceRecord, AttendanceMonth, SecurityLog, WorkCalendar, Holiday, DeviceFingerprint,
+    ArchivedAttendanceRecord, ArchivedSecurityLog, RoleShiftTiming, OutboxEvent, WebhookEndpoint,
+    ExportJob
+)
+from .utils import validate_geofence, calculate_distance, pack_ip_address
+from .webhooks import ConnectionPool, dispatch_webhooks, sign
+from .workdays import get_calendar, invalidate_calendars
 
 User = get_user_model()
 
@@ -185,3 +227,1760 @@ class AttendanceAPITestCase(APITestCase):
         url = reverse('admin_attendance')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class AsyncAttendanceViewTestCase(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='student1',
+            email='student1@test.com',
+            password='testpass123',
+            role='student',
+            start_date=date.today() - timedelta(days=5),
+            end_date=date.today() + timedelta(days=25)
+        )
+        self.token = RefreshToken.for_user(self.student).access_token
+        self.factory = RequestFactory()
+        self.office = {
+            'latitude': round(settings.OFFICE_LOCATION['latitude'], 6),
+            'longitude': round(settings.OFFICE_LOCATION['longitude'], 6),
+        }
+    
+    def _post(self, view, data, authenticated=True):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {self.token}'} if authenticated else {}
+        request = self.factory.post('/', data, content_type='application/json', **headers)
+        response = async_to_sync(view)(request)
+        return response.status_code, json.loads(response.content)
+    
+    def test_async_mark_in_and_out(self):
+        """Test async mark in/out keeps the sync response contract"""
+        status_code, data = self._post(views.mark_in_async_view, self.office)
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(data['message'], 'Marked in successfully')
+        self.assertIn('is_late', data)
+        
+        status_code, data = self._post(views.mark_out_async_view, self.office)
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(data['message'], 'Marked out successfully')
+        
+        record = AttendanceRecord.objects.get(user=self.student, date=date.today())
+        self.assertIsNotNone(record.check_out_time)
+    
+    def test_async_duplicate_mark_in_logged(self):
+        """Test async duplicate mark in is rejected and logged"""
+        self._post(views.mark_in_async_view, self.office)
+        status_code, data = self._post(views.mark_in_async_view, self.office)
+        self.assertEqual(status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(data['error'], 'You have already marked in for today')
+        self.assertTrue(
+            SecurityLog.objects.filter(user=self.student, log_type='duplicate_attempt').exists()
+        )
+    
+    def test_async_mark_in_invalid_location(self):
+        """Test async mark in outside the geofence"""
+        status_code, data = self._post(
+            views.mark_in_async_view, {'latitude': 17.5, 'longitude': 78.5}
+        )
+        self.assertEqual(status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', data)
+        self.assertTrue(
+            SecurityLog.objects.filter(user=self.student, log_type='failed_geo').exists()
+        )
+    
+    def test_async_mark_in_requires_authentication(self):
+        """Test async mark in without credentials"""
+        status_code, data = self._post(views.mark_in_async_view, self.office, authenticated=False)
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+
+class IdempotencyTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        idempotency_cache.clear()
+        self.employee = User.objects.create_user(
+            username='employee1',
+            email='employee1@test.com',
+            password='testpass123',
+            role='employee'
+        )
+        token = RefreshToken.for_user(self.employee).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.office = {
+            'latitude': round(settings.OFFICE_LOCATION['latitude'], 6),
+            'longitude': round(settings.OFFICE_LOCATION['longitude'], 6),
+        }
+    
+    def test_replayed_mark_in_returns_original_response(self):
+        """Test a retried mark in replays the first response without new writes"""
+        url = reverse('mark_in')
+        first = self.client.post(url, self.office, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        
+        with self.assertNumQueries(1):  # user lookup during authentication only
+            retry = self.client.post(url, self.office, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse(SecurityLog.objects.filter(log_type='duplicate_attempt').exists())
+    
+    def test_reused_key_with_different_payload_rejected(self):
+        """Test an idempotency key cannot be reused for a different request"""
+        url = reverse('mark_in')
+        self.client.post(url, self.office, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        other = dict(self.office, notes='late bus')
+        response = self.client.post(url, other, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+    
+    def test_key_in_flight_is_not_run_twice(self):
+        """Test a retry arriving while the first request runs is refused, and runs once the key is released"""
+        url = reverse('mark_in')
+        store = IdempotencyCache()
+        key = (self.employee.pk, 'POST', url, 'abc')
+        self.assertIsNone(store.claim(key, 'f'))
+        
+        response = self.client.post(url, self.office, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(AttendanceRecord.objects.exists())
+        
+        store.release(key)
+        response = self.client.post(url, self.office, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertNotEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertNotIsInstance(store.get(key), InFlight)
+    
+    def test_cache_expires_entries(self):
+        """Test idempotency cache entries expire after the TTL"""
+        store = IdempotencyCache(ttl_seconds=0)
+        store.set('a', 'f', {}, 200)
+        self.assertIsNone(store.get('a'))
+    
+    def test_local_tier_evicts_least_recently_used(self):
+        """Test the per-process tier stays within max_entries, dropping the least recently used key"""
+        store = IdempotencyCache(max_entries=2)
+        store.set('a', 'f', {}, 200)
+        store.set('b', 'f', {}, 200)
+        store.get('a')
+        store.set('c', 'f', {}, 200)
+        self.assertEqual(len(store), 2)
+        
+        cache.clear()
+        self.assertIsNotNone(store.get('a'))
+        self.assertIsNone(store.get('b'))
+    
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_flagged(self):
+        """Test the system check warns when the default cache is not shared between processes"""
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['attendance.W001'])
+
+class OfflineSyncTestCase(APITestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='student1',
+            email='student1@test.com',
+            password='testpass123',
+            role='student',
+            start_date=date.today() - timedelta(days=5),
+            end_date=date.today() + timedelta(days=25)
+        )
+        self.employee = User.objects.create_user(
+            username='employee1',
+            email='employee1@test.com',
+            password='testpass123',
+            role='employee'
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='testpass123',
+            role='admin'
+        )
+        self.yesterday = date.today() - timedelta(days=1)
+        self.office = {
+            'latitude': round(settings.OFFICE_LOCATION['latitude'], 6),
+            'longitude': round(settings.OFFICE_LOCATION['longitude'], 6),
+        }
+    
+    def _event(self, user, event_type, hour, minute=0, **extra):
+        timestamp = timezone.make_aware(datetime.combine(self.yesterday, time(hour, minute)))
+        return dict(self.office, user=user.pk, type=event_type, timestamp=timestamp.isoformat(), **extra)
+    
+    def _sync(self, as_user, events):
+        token = RefreshToken.for_user(as_user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.client.post(reverse('offline_sync'), {'events': events}, format='json')
+    
+    def test_kiosk_syncs_many_users(self):
+        """Test an admin kiosk syncs events for several users in one request"""
+        events = [
+            self._event(self.student, 'out', 18),
+            self._event(self.student, 'in', 9),
+            self._event(self.employee, 'in', 9, 5),
+        ]
+        response = self._sync(self.admin, events)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['accepted'], 3)
+        
+        record = AttendanceRecord.objects.get(user=self.student, date=self.yesterday)
+        self.assertIsNotNone(record.check_out_time)
+        self.assertEqual(record.check_in_time.date(), self.yesterday)
+        self.assertIsNotNone(record.expected_start_time)
+        self.assertEqual(AttendanceRecord.objects.filter(date=self.yesterday).count(), 2)
+        
+        # Bulk-written records still reach the monthly bitmaps
+        month = AttendanceMonth.objects.get(user=self.student, month=self.yesterday.replace(day=1))
+        self.assertTrue(month.present_days & (1 << (self.yesterday.day - 1)))
+    
+    def test_sync_reports_per_event_results(self):
+        """Test duplicates and invalid events are reported without failing the batch"""
+        events = [
+            self._event(self.student, 'in', 9),
+            self._event(self.student, 'in', 9, 10),
+            dict(self._event(self.student, 'out', 18), latitude=17.5, longitude=78.5),
+            {'type': 'in'},
+        ]
+        response = self._sync(self.student, events)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['accepted', 'duplicate', 'rejected', 'rejected'])
+        self.assertEqual(SecurityLog.objects.filter(user=self.student).count(), 2)
+    
+    def test_non_admin_cannot_sync_other_users(self):
+        """Test regular users can only sync their own events"""
+        response = self._sync(self.student, [self._event(self.employee, 'in', 9)])
+        self.assertEqual(response.data['results'][0]['status'], 'rejected')
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+class AbsenceReportTestCase(APITestCase):
+    def setUp(self):
+        invalidate_calendars()
+        # A Monday to Sunday week
+        self.monday = date.today() - timedelta(days=date.today().weekday() + 7)
+        self.student = User.objects.create_user(
+            username='student1',
+            password='testpass123',
+            role='student',
+            start_date=self.monday + timedelta(days=2),
+            end_date=self.monday + timedelta(days=60)
+        )
+        self.employee = User.objects.create_user(
+            username='employee1',
+            password='testpass123',
+            role='employee'
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            role='admin'
+        )
+        AttendanceRecord.objects.create(
+            user=self.employee, date=self.monday,
+            check_in_time=timezone.make_aware(datetime.combine(self.monday, time(9, 0)))
+        )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    def _params(self, **extra):
+        params = {
+            'from_date': self.monday.isoformat(),
+            'to_date': (self.monday + timedelta(days=6)).isoformat(),
+        }
+        params.update(extra)
+        return params
+    
+    def test_absences_skip_weekends_and_inactive_enrollment(self):
+        """Test absences cover enrolled working days without a record"""
+        response = self.client.get(reverse('absence_report'), self._params())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['working_days'], 5)
+        
+        pairs = {(row['username'], row['date']) for row in response.data['results']}
+        employee_days = {('employee1', self.monday + timedelta(days=i)) for i in range(1, 5)}
+        student_days = {('student1', self.monday + timedelta(days=i)) for i in range(2, 5)}
+        self.assertEqual(pairs, employee_days | student_days)
+    
+    def test_absences_respect_holidays_and_weekend_config(self):
+        """Test holidays and custom weekends are excluded"""
+        wednesday = self.monday + timedelta(days=2)
+        response = self.client.get(reverse('absence_report'), self._params(
+            weekend_days='6', holidays=wednesday.isoformat(), role='student'
+        ))
+        dates = [row['date'] for row in response.data['results']]
+        self.assertNotIn(wednesday, dates)
+        self.assertIn(self.monday + timedelta(days=5), dates)
+        self.assertEqual(len(dates), 3)
+    
+    def test_absence_export(self):
+        """Test absence CSV export"""
+        response = self.client.get(reverse('export_absences'), self._params())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(lines[0], 'Name,Username,Role,Date')
+        self.assertEqual(len(lines), 8)
+
+class WorkCalendarTestCase(TestCase):
+    def setUp(self):
+        invalidate_calendars()
+        self.calendar = WorkCalendar.objects.create(name='Default', weekend_days='5,6')
+        Holiday.objects.create(calendar=self.calendar, date=date(2025, 1, 1), name='New Year')
+    
+    def test_is_working_day(self):
+        """Test weekends and holidays are not working days"""
+        calendar = get_calendar('student')
+        self.assertFalse(calendar.is_working_day(date(2025, 1, 1)))  # Holiday
+        self.assertTrue(calendar.is_working_day(date(2025, 1, 2)))
+        self.assertFalse(calendar.is_working_day(date(2025, 1, 4)))  # Saturday
+    
+    def test_count_working_days_across_years(self):
+        """Test working day counts match a day-by-day scan"""
+        calendar = get_calendar()
+        start, end = date(2024, 12, 20), date(2025, 1, 10)
+        expected = sum(
+            1 for n in range((end - start).days + 1)
+            if calendar.is_working_day(start + timedelta(days=n))
+        )
+        self.assertEqual(calendar.count_working_days(start, end), expected)
+        self.assertEqual(len(calendar.working_days(start, end)), expected)
+    
+    def test_role_calendar_and_invalidation(self):
+        """Test role calendars override the default and edits invalidate the cache"""
+        self.assertTrue(get_calendar('intern').is_working_day(date(2025, 1, 3)))
+        WorkCalendar.objects.create(name='Interns', role='intern', weekend_days='4,5,6')
+        self.assertFalse(get_calendar('intern').is_working_day(date(2025, 1, 3)))  # Friday
+        self.assertTrue(get_calendar('student').is_working_day(date(2025, 1, 3)))
+
+class MonthlyMatrixTestCase(APITestCase):
+    def setUp(self):
+        invalidate_calendars()
+        self.employee = User.objects.create_user(
+            username='employee1',
+            first_name='Emp',
+            password='testpass123',
+            role='employee'
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            role='admin'
+        )
+        # January 2025 starts on a Wednesday
+        AttendanceRecord.objects.create(
+            user=self.employee, date=date(2025, 1, 1),
+            check_in_time=timezone.make_aware(datetime(2025, 1, 1, 9, 0)),
+            check_out_time=timezone.make_aware(datetime(2025, 1, 1, 17, 30)),
+        )
+        AttendanceRecord.objects.filter(user=self.employee).update(is_late=False)
+        AttendanceRecord.objects.create(
+            user=self.employee, date=date(2025, 1, 2),
+            check_in_time=timezone.make_aware(datetime(2025, 1, 2, 9, 0)),
+        )
+        AttendanceRecord.objects.filter(date=date(2025, 1, 2)).update(is_late=True)
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    def test_monthly_matrix_cells_and_totals(self):
+        """Test the monthly grid cells and per-user totals"""
+        response = self.client.get(reverse('monthly_matrix'), {'year': 2025, 'month': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['days']), 31)
+        
+        row = response.data['users'][0]
+        self.assertEqual(row['cells'][:7], 'PLAHHAA')
+        self.assertEqual(row['working_days'], 23)
+        self.assertEqual(row['present'], 2)
+        self.assertEqual(row['late'], 1)
+        self.assertEqual(row['absent'], 21)
+        self.assertEqual(row['hours'], 8.5)
+    
+    def test_monthly_matrix_exports(self):
+        """Test the monthly grid CSV and XLSX downloads"""
+        url = reverse('export_monthly_matrix')
+        response = self.client.get(url, {'year': 2025, 'month': 1})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('Emp,employee1,Employee,P,L,A,H,H'))
+        
+        response = self.client.get(url, {'year': 2025, 'month': 1, 'file_type': 'xlsx'})
+        self.assertIn(response.status_code, (status.HTTP_200_OK, status.HTTP_501_NOT_IMPLEMENTED))
+
+class WorkedTimeTestCase(APITestCase):
+    def setUp(self):
+        self.employee = User.objects.create_user(
+            username='employee1',
+            password='testpass123',
+            role='employee'
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            role='admin'
+        )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    def _record(self, day, check_out_hour):
+        return AttendanceRecord.objects.create(
+            user=self.employee, date=day,
+            check_in_time=timezone.make_aware(datetime.combine(day, time(9, 0))),
+            check_out_time=timezone.make_aware(datetime.combine(day, time(check_out_hour, 0))),
+        )
+    
+    def test_worked_time_maintained_on_save(self):
+        """Test worked and overtime seconds are stored on save"""
+        record = self._record(date(2025, 1, 6), 20)
+        self.assertEqual(record.worked_seconds, 11 * 3600)
+        self.assertEqual(record.overtime_seconds, 2 * 3600)  # Default shift ends at 18:00
+    
+    def test_backfill_command(self):
+        """Test the backfill command fills missing worked time and stamps the records as changed"""
+        record = self._record(date(2025, 1, 6), 17)
+        AttendanceRecord.objects.update(worked_seconds=None, overtime_seconds=None)
+        started = timezone.now()
+        call_command('backfill_worked_time', stdout=io.StringIO())
+        record.refresh_from_db()
+        self.assertEqual(record.worked_seconds, 8 * 3600)
+        self.assertEqual(record.overtime_seconds, -3600)
+        self.assertGreaterEqual(record.updated_at, started)
+    
+    def test_worked_hours_analytics(self):
+        """Test worked hours aggregation by user and month"""
+        self._record(date(2025, 1, 6), 20)
+        self._record(date(2025, 1, 7), 17)
+        self._record(date(2025, 2, 3), 18)
+        response = self.client.get(reverse('worked_hours_analytics'), {
+            'group_by': 'user,period', 'period': 'month', 'percentiles': 'true'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        january = response.data['results'][0]
+        self.assertEqual(january['records'], 2)
+        self.assertEqual(january['total_hours'], 19.0)
+        self.assertEqual(january['overtime_hours'], 2.0)
+        self.assertEqual(january['undertime_hours'], 1.0)
+        self.assertEqual(january['p50_hours'], 9.5)
+        self.assertEqual(len(response.data['results']), 2)
+
+class LatenessAnalyticsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(
+            username='student1',
+            password='testpass123',
+            role='student',
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 12, 31)
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            role='admin'
+        )
+        # Default shift starts at 09:00
+        for day, minute in ((6, 0), (7, 10), (8, 30), (13, 50)):
+            check_in = timezone.make_aware(datetime(2025, 1, day, 9, minute))
+            AttendanceRecord.objects.create(
+                user=self.student, date=date(2025, 1, day), check_in_time=check_in
+            )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    def test_lateness_distribution(self):
+        """Test lateness percentiles, histogram and weekday breakdown"""
+        response = self.client.get(reverse('lateness_analytics'), {'bin_minutes': 30})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = response.data['roles']['student']
+        self.assertEqual(stats['records'], 4)
+        self.assertEqual(stats['p50_minutes'], 20.0)
+        self.assertEqual(sum(stats['histogram']['counts']), 4)
+        monday = stats['by_weekday'][0]
+        self.assertEqual(monday['weekday'], 'Monday')
+        self.assertEqual(monday['records'], 2)
+    
+    def test_lateness_cache_refreshes_on_new_records(self):
+        """Test cached lateness results are recomputed after new records"""
+        url = reverse('lateness_analytics')
+        self.client.get(url)
+        with self.assertNumQueries(4):  # Authentication, the archive check, the version stamp and the shared cache
+            self.client.get(url)
+        
+        AttendanceRecord.objects.create(
+            user=self.student, date=date(2025, 1, 14),
+            check_in_time=timezone.make_aware(datetime(2025, 1, 14, 9, 5))
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data['roles']['student']['records'], 5)
+
+class AttendanceHistoryTestCase(APITestCase):
+    def setUp(self):
+        invalidate_calendars()
+        self.student = User.objects.create_user(
+            username='student1',
+            password='testpass123',
+            role='student',
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 12, 31)
+        )
+        # January 2025 starts on a Wednesday; the 8th is late, the 9th is missed
+        for day, hour in ((6, 9), (7, 9), (8, 11), (10, 9), (13, 9)):
+            AttendanceRecord.objects.create(
+                user=self.student, date=date(2025, 1, day),
+                check_in_time=timezone.make_aware(datetime(2025, 1, day, hour, 0))
+            )
+        token = RefreshToken.for_user(self.student).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.range = {'from_date': '2025-01-01', 'to_date': '2025-01-13'}
+    
+    def test_bitmaps_maintained_on_save_and_delete(self):
+        """Test monthly bitmaps follow record saves and deletes"""
+        month = AttendanceMonth.objects.get(user=self.student, month=date(2025, 1, 1))
+        self.assertEqual(month.present_days, (1 << 5) | (1 << 6) | (1 << 7) | (1 << 9) | (1 << 12))
+        self.assertEqual(month.late_days, 1 << 7)
+        
+        AttendanceRecord.objects.get(user=self.student, date=date(2025, 1, 8)).delete()
+        month.refresh_from_db()
+        self.assertEqual(month.late_days, 0)
+        self.assertFalse(month.present_days & (1 << 7))
+    
+    def test_rebuild_matches_incremental_bitmaps(self):
+        """Test the rebuild command reproduces the incrementally maintained bitmaps"""
+        expected = list(AttendanceMonth.objects.values_list('user_id', 'month', 'present_days', 'late_days'))
+        AttendanceMonth.objects.all().delete()
+        call_command('rebuild_attendance_history', stdout=io.StringIO())
+        self.assertEqual(
+            list(AttendanceMonth.objects.values_list('user_id', 'month', 'present_days', 'late_days')),
+            expected
+        )
+    
+    def test_percentage_and_streaks(self):
+        """Test attendance percentage and streaks over working days"""
+        response = self.client.get(reverse('attendance_percentage'), self.range)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['working_days'], 9)
+        self.assertEqual(response.data['present_days'], 5)
+        self.assertEqual(response.data['late_days'], 1)
+        self.assertEqual(response.data['attendance_percentage'], 55.6)
+        
+        response = self.client.get(reverse('attendance_streak'), self.range)
+        self.assertEqual(response.data['current_streak'], 2)  # 10th and 13th, the weekend doesn't break it
+        self.assertEqual(response.data['longest_streak'], 3)
+    
+    def test_heatmap(self):
+        """Test heatmap cells per month"""
+        response = self.client.get(reverse('attendance_heatmap'), self.range)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['months'], [
+            {'month': '2025-01', 'cells': 'AAAHHPPLAPHHP' + '-' * 18},
+        ])
+    
+    def test_other_users_history_requires_admin(self):
+        """Test non-admin users cannot read another user's history"""
+        other = User.objects.create_user(username='student2', password='testpass123', role='student')
+        response = self.client.get(reverse('attendance_percentage'), {'user_id': other.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class ArchiveTestCase(APITestCase):
+    def setUp(self):
+        self.employee = User.objects.create_user(
+            username='employee1',
+            password='testpass123',
+            role='employee',
+            first_name='Emp',
+            last_name='One'
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            role='admin'
+        )
+        self.old_day = date.today() - timedelta(days=800)
+        self.recent_day = date.today() - timedelta(days=3)
+        for day in (self.old_day, self.recent_day):
+            AttendanceRecord.objects.create(
+                user=self.employee, date=day,
+                check_in_time=timezone.make_aware(datetime.combine(day, time(9, 0)))
+            )
+        old_log = SecurityLog.objects.create(
+            user=self.employee, log_type='failed_geo', description='Old failure',
+            ip_address='127.0.0.1'
+        )
+        SecurityLog.objects.filter(pk=old_log.pk).update(
+            timestamp=timezone.now() - timedelta(days=200), last_seen=timezone.now() - timedelta(days=200)
+        )
+        SecurityLog.objects.create(
+            user=self.employee, log_type='failed_geo', description='Recent failure',
+            ip_address='127.0.0.1'
+        )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    def _archive(self):
+        call_command('archive_old_records', stdout=io.StringIO())
+    
+    def test_archive_moves_old_rows(self):
+        """Test rows past the horizon move to the archive tables, keeping ids and history bitmaps"""
+        old_record = AttendanceRecord.objects.get(date=self.old_day)
+        months_before = list(AttendanceMonth.objects.values_list('month', 'present_days'))
+        self._archive()
+        
+        self.assertEqual(list(AttendanceRecord.objects.values_list('date', flat=True)), [self.recent_day])
+        archived = ArchivedAttendanceRecord.objects.get()
+        self.assertEqual((archived.id, archived.date), (old_record.id, self.old_day))
+        self.assertEqual(archived.created_at, old_record.created_at)
+        self.assertEqual(list(SecurityLog.objects.values_list('description', flat=True)), ['Recent failure'])
+        self.assertEqual(ArchivedSecurityLog.objects.get().description, 'Old failure')
+        self.assertEqual(list(AttendanceMonth.objects.values_list('month', 'present_days')), months_before)
+    
+    def test_admin_list_includes_archive_when_range_reaches_back(self):
+        """Test the admin attendance list reads the archive only for ranges reaching back to it"""
+        self._archive()
+        url = reverse('admin_attendance')
+        
+        response = self.client.get(url, {'from_date': str(self.recent_day)})
+        self.assertEqual([row['date'] for row in response.data['results']], [str(self.recent_day)])
+        
+        # An open range reaches back to everything
+        self.assertEqual(self.client.get(url).data['count'], 2)
+        
+        response = self.client.get(url, {'from_date': str(self.old_day)})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [row['date'] for row in response.data['results']], [str(self.recent_day), str(self.old_day)]
+        )
+        self.assertEqual(response.data['results'][1]['user_name'], 'Emp One')
+    
+    def test_export_and_security_logs_include_archive(self):
+        """Test the export and security log list merge archived rows for old ranges"""
+        self._archive()
+        from_date = str(self.old_day)
+        
+        response = self.client.get(reverse('export_attendance'), {'from_date': from_date})
+        lines = response.content.decode().strip().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn(str(self.old_day), lines[1])
+        
+        response = self.client.get(reverse('security_logs'), {'from_date': from_date})
+        self.assertEqual(
+            [row['description'] for row in response.data['results']], ['Recent failure', 'Old failure']
+        )
+
+    def test_reports_read_archive_and_analytics_reject_it(self):
+        """Test the monthly matrix counts archived days, and analytics refuse ranges reaching the archive"""
+        self._archive()
+        response = self.client.get(reverse('monthly_matrix'), {
+            'year': self.old_day.year, 'month': self.old_day.month, 'user_id': self.employee.pk,
+        })
+        self.assertEqual(response.data['users'][0]['present'], 1)
+        
+        for name in ('worked_hours_analytics', 'lateness_analytics'):
+            response = self.client.get(reverse(name), {'from_date': str(self.old_day)})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(f'after {self.old_day}', response.data['error'])
+            self.assertEqual(self.client.get(reverse(name)).status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.client.get(reverse(name), {'from_date': str(self.old_day + timedelta(days=1))})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+class SecurityLogRollupTestCase(APITestCase):
+    def setUp(self):
+        self.employee = User.objects.create_user(
+            username='employee1',
+            password='testpass123',
+            role='employee'
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            role='admin'
+        )
+        self.office = {
+            'latitude': round(settings.OFFICE_LOCATION['latitude'], 6),
+            'longitude': round(settings.OFFICE_LOCATION['longitude'], 6),
+        }
+    
+    def _event(self, **overrides):
+        return dict({
+            'user': self.employee, 'log_type': 'failed_geo', 'description': 'Outside the fence',
+            'ip_address': '10.0.0.1', 'device_info': {'user_agent': 'test'},
+        }, **overrides)
+    
+    def test_repeated_duplicate_attempts_roll_up(self):
+        """Test a client retrying a duplicate mark in updates one log row"""
+        token = RefreshToken.for_user(self.employee).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        for _ in range(4):
+            self.client.post(reverse('mark_in'), self.office, format='json')
+        
+        log = SecurityLog.objects.get(user=self.employee, log_type='duplicate_attempt')
+        self.assertEqual(log.count, 3)
+        self.assertGreaterEqual(log.last_seen, log.timestamp)
+    
+    def test_rollup_key_and_window(self):
+        """Test only the same user, type, IP and device within the window are coalesced"""
+        record_security_event(**self._event())
+        record_security_event(**self._event(description='Still outside'))
+        record_security_event(**self._event(ip_address='10.0.0.2'))
+        self.assertEqual(
+            sorted(SecurityLog.objects.values_list('ip_address', 'count')), [('10.0.0.1', 2), ('10.0.0.2', 1)]
+        )
+        self.assertEqual(SecurityLog.objects.get(ip_address='10.0.0.1').description, 'Still outside')
+        
+        # As if the rows were written in the previous window
+        SecurityLog.objects.update(rollup_bucket=F('rollup_bucket') - 1)
+        record_security_event(**self._event())
+        self.assertEqual(SecurityLog.objects.filter(ip_address='10.0.0.1').count(), 2)
+    
+    def test_rollup_rows_unique_per_window(self):
+        """Test the database refuses a second row for the same event and window"""
+        record_security_event(**self._event())
+        log = SecurityLog.objects.get()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SecurityLog.objects.create(
+                user=self.employee, log_type=log.log_type, description='Raced', ip_address=log.ip_address,
+                device=log.device, rollup_bucket=log.rollup_bucket
+            )
+        
+        async_to_sync(arecord_security_event)(**self._event())
+        self.assertEqual(SecurityLog.objects.get().count, 2)
+    
+    def test_bulk_events_coalesce(self):
+        """Test batched events are coalesced within the batch and into recent rows"""
+        record_security_event(**self._event())
+        record_security_events([self._event(), self._event(), self._event(log_type='duplicate_attempt')])
+        self.assertEqual(
+            sorted(SecurityLog.objects.values_list('log_type', 'count')),
+            [('duplicate_attempt', 1), ('failed_geo', 3)]
+        )
+    
+    def test_security_log_view_shows_rollups(self):
+        """Test the security log list shows counts and first/last seen times"""
+        record_security_event(**self._event())
+        record_security_event(**self._event())
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        
+        response = self.client.get(reverse('security_logs'), {'log_type': 'failed_geo'})
+        self.assertEqual(response.data['count'], 1)
+        row = response.data['results'][0]
+        self.assertEqual(row['count'], 2)
+        self.assertIn('first_seen', row)
+        self.assertIn('last_seen', row)
+
+class DeviceFingerprintTestCase(APITestCase):
+    def setUp(self):
+        device_cache.clear()
+        self.employee = User.objects.create_user(
+            username='employee1',
+            password='testpass123',
+            role='employee'
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            role='admin'
+        )
+        self.info = {'user_agent': 'Mozilla/5.0  Test', 'accept_language': 'en', 'accept_encoding': 'gzip'}
+    
+    def test_fingerprints_are_deduplicated(self):
+        """Test equal headers map to one fingerprint, whitespace differences included"""
+        first = device_fingerprint_id(self.info)
+        second = device_fingerprint_id(dict(self.info, user_agent='Mozilla/5.0 Test'))
+        other = device_fingerprint_id(dict(self.info, accept_language='fr'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(DeviceFingerprint.objects.count(), 2)
+    
+    def test_cache_holds_committed_fingerprints_only(self):
+        """Test fingerprint ids are interned once their transaction commits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            device_id = device_fingerprint_id(self.info)
+        self.assertEqual(len(device_cache), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(device_fingerprint_id(self.info), device_id)
+    
+    def test_records_reference_devices(self):
+        """Test mark in stores a device reference and the device list counts check-ins"""
+        token = RefreshToken.for_user(self.employee).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        office = {
+            'latitude': round(settings.OFFICE_LOCATION['latitude'], 6),
+            'longitude': round(settings.OFFICE_LOCATION['longitude'], 6),
+        }
+        self.client.post(reverse('mark_in'), office, format='json', HTTP_USER_AGENT='Kiosk/1.0')
+        record = AttendanceRecord.objects.get(user=self.employee)
+        self.assertEqual(record.check_in_device.user_agent, 'Kiosk/1.0')
+        
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse('admin_devices'), {'user_id': self.employee.id})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['user_agent'], 'Kiosk/1.0')
+        self.assertEqual(response.data['results'][0]['check_ins'], 1)
+    
+    def test_legacy_device_text_parsing(self):
+        """Test the migration parses stored dict reprs and keeps other text as the user agent"""
+        migration = importlib.import_module('attendance.migrations.0009_convert_device_info')
+        self.assertEqual(
+            migration.parse_device_info(str(self.info)),
+            {'user_agent': 'Mozilla/5.0 Test', 'accept_language': 'en', 'accept_encoding': 'gzip'}
+        )
+        self.assertEqual(
+            migration.parse_device_info('Test Device Info'),
+            {'user_agent': 'Test Device Info', 'accept_language': '', 'accept_encoding': ''}
+        )
+
+class SecurityLogSearchTestCase(APITestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='student1',
+            password='testpass123',
+            role='student'
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            role='admin'
+        )
+        self.device = device_fingerprint_id({'user_agent': 'Phone/2.0'})
+        for ip, log_type, description in (
+            ('10.0.0.5', 'failed_geo', 'Geofence validation failed near gate'),
+            ('10.0.0.200', 'duplicate_attempt', 'Duplicate check-in attempt'),
+            ('10.0.1.7', 'failed_geo', 'Geofence validation failed at parking'),
+            ('2001:db8::1', 'suspicious_activity', 'Shared device detected'),
+        ):
+            SecurityLog.objects.create(
+                user=self.student, log_type=log_type, description=description,
+                ip_address=ip, device_id=self.device if ip == '10.0.1.7' else None
+            )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    def _descriptions(self, **params):
+        response = self.client.get(reverse('security_logs'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(row['description'] for row in response.data['results'])
+    
+    def test_ip_network_filter(self):
+        """Test filtering by a CIDR network or a single address"""
+        self.assertEqual(self._descriptions(ip='10.0.0.0/24'), [
+            'Duplicate check-in attempt', 'Geofence validation failed near gate'
+        ])
+        self.assertEqual(self._descriptions(ip='2001:db8::/32'), ['Shared device detected'])
+        self.assertEqual(self._descriptions(ip='10.0.1.7'), ['Geofence validation failed at parking'])
+        response = self.client.get(reverse('security_logs'), {'ip': 'not-an-ip'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_malformed_forwarded_for_is_logged(self):
+        """Test a failed mark-in with a malformed X-Forwarded-For falls back to the peer address and is logged"""
+        User.objects.filter(pk=self.student.pk).update(
+            start_date=date.today() - timedelta(days=30), end_date=date.today() + timedelta(days=30),
+            is_active_period=True
+        )
+        active_users.refresh()
+        token = RefreshToken.for_user(self.student).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        for header, ip in (('unknown', '127.0.0.1'), ('10.9.8.7:5678, 10.0.0.1', '10.9.8.7')):
+            response = self.client.post(
+                reverse('mark_in'), {'latitude': 17.5, 'longitude': 78.5}, format='json',
+                HTTP_X_FORWARDED_FOR=header
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            log = SecurityLog.objects.get(user=self.student, log_type='failed_geo', ip_address=ip)
+            self.assertEqual(log.ip_packed, pack_ip_address(ip))
+        self.assertIsNone(pack_ip_address('unknown'))
+    
+    def test_text_search_and_filters(self):
+        """Test description search combined with type, device and time filters"""
+        self.assertEqual(self._descriptions(q='geofence fail'), [
+            'Geofence validation failed at parking', 'Geofence validation failed near gate'
+        ])
+        self.assertEqual(self._descriptions(q='parking', log_type='failed_geo'), [
+            'Geofence validation failed at parking'
+        ])
+        self.assertEqual(self._descriptions(device=self.device), ['Geofence validation failed at parking'])
+        since = (timezone.now() + timedelta(hours=1)).isoformat()
+        self.assertEqual(self._descriptions(since=since), [])
+    
+    def test_search_index_follows_updates(self):
+        """Test the full-text index is kept in sync with description changes and deletes"""
+        SecurityLog.objects.filter(description__startswith='Shared').update(description='Spoofed location')
+        self.assertEqual(self._descriptions(q='spoofed'), ['Spoofed location'])
+        self.assertEqual(self._descriptions(q='shared'), [])
+        SecurityLog.objects.filter(description='Spoofed location').delete()
+        self.assertEqual(self._descriptions(q='spoofed'), [])
+    
+    def test_ip_backfill_skips_malformed_addresses(self):
+        """Test the ip_packed backfill migration leaves rows without a valid address unpacked"""
+        migration = importlib.import_module('attendance.migrations.0011_security_log_search')
+        valid = SecurityLog.objects.create(user=self.student, log_type='failed_geo', ip_address='10.0.0.1')
+        malformed = SecurityLog.objects.create(user=self.student, log_type='failed_geo', ip_address='10.0.0.2')
+        SecurityLog.objects.filter(pk=malformed.pk).update(ip_address='unknown')
+        SecurityLog.objects.update(ip_packed=None)
+        
+        migration.backfill_ip_packed(django_apps, None)
+        self.assertEqual(bytes(SecurityLog.objects.get(pk=valid.pk).ip_packed), pack_ip_address('10.0.0.1'))
+        self.assertIsNone(SecurityLog.objects.get(pk=malformed.pk).ip_packed)
+
+
+class AnomalyDetectionTestCase(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'student{i}', password='testpass123', role='student')
+            for i in range(4)
+        ]
+        self.day = date.today() - timedelta(days=2)
+        self.shared_device = device_fingerprint_id({'user_agent': 'Kiosk/1.0'})
+    
+    def _record(self, user, day, minute, device=None, ip='10.0.0.1', location=(12.9716, 77.5946), check_out=None):
+        check_in_time = timezone.make_aware(datetime.combine(day, time(9, minute)))
+        return AttendanceRecord.objects.create(
+            user=user, date=day, check_in_time=check_in_time,
+            check_in_latitude=location[0], check_in_longitude=location[1],
+            check_in_ip=ip, check_in_device_id=device,
+            check_out_time=check_out and check_in_time + check_out[0],
+            check_out_latitude=check_out and check_out[1][0],
+            check_out_longitude=check_out and check_out[1][1],
+        )
+    
+    def _detect(self, *args):
+        out = io.StringIO()
+        call_command(
+            'detect_anomalies', '--from-date', str(self.day - timedelta(days=5)), '--to-date', str(self.day),
+            *args, stdout=out
+        )
+        return out.getvalue()
+    
+    def test_shared_device_and_impossible_travel(self):
+        """Test one device checking in several users within minutes and too-fast travel are logged"""
+        for i, user in enumerate(self.users[:3]):
+            self._record(user, self.day, i * 3, device=self.shared_device, location=(12.97 + i * 0.001, 77.59))
+        self._record(
+            self.users[3], self.day, 0, location=(12.9716, 77.5946),
+            check_out=(timedelta(minutes=10), (13.0827, 80.2707))
+        )
+        self._detect()
+        
+        logs = SecurityLog.objects.filter(log_type='suspicious_activity')
+        shared = logs.filter(device_id=self.shared_device)
+        self.assertEqual(sorted(shared.values_list('user__username', flat=True)), ['student0', 'student1', 'student2'])
+        self.assertIn('checked in 3 users', shared.first().description)
+        travel = logs.get(user=self.users[3])
+        self.assertIn('km from the check-in location', travel.description)
+    
+    def test_reused_coordinates_logged_once(self):
+        """Test identical coordinates on several days are flagged, and a rerun does not duplicate logs"""
+        for offset in range(3):
+            self._record(self.users[0], self.day - timedelta(days=offset), 0, location=(12.97161234, 77.59461234))
+        for offset, location in enumerate([(12.9716, 77.5946), (12.97165, 77.59467), (12.97171, 77.59452)]):
+            self._record(self.users[1], self.day - timedelta(days=offset), 30, location=location)
+        
+        self.assertIn('reused_coordinates: 1', self._detect('--dry-run'))
+        self.assertFalse(SecurityLog.objects.exists())
+        self._detect()
+        self._detect()
+        # Another day at the same spot is the same finding
+        self._record(self.users[0], self.day - timedelta(days=3), 0, location=(12.97161234, 77.59461234))
+        self._detect()
+        log = SecurityLog.objects.get()
+        self.assertEqual(log.user, self.users[0])
+        self.assertIn('12.971612, 77.594612 on 3 or more days', log.description)
+
+
+class AutoCloseAttendanceTestCase(APITestCase):
+    def setUp(self):
+        self.day = date.today() - timedelta(days=1)
+        RoleShiftTiming.objects.create(role='student', start_time=time(9, 0), end_time=time(17, 0))
+        RoleShiftTiming.objects.create(role='employee', start_time=time(9, 0), end_time=time(18, 0))
+        RoleShiftTiming.objects.create(role='intern', start_time=time(9, 0), end_time=time(18, 0))
+        self.student = User.objects.create_user(username='student1', password='testpass123', role='student')
+        self.employee = User.objects.create_user(username='employee1', password='testpass123', role='employee')
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        self.student_record = self._record(self.student, time(9, 0))
+        self.late_record = self._record(self.employee, time(19, 30))
+        self.admin_record = self._record(self.admin, time(10, 0))
+        self.closed_record = self._record(
+            User.objects.create_user(username='student2', password='testpass123', role='student'),
+            time(9, 0), check_out=time(16, 0)
+        )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    def _at(self, at):
+        return timezone.make_aware(datetime.combine(self.day, at))
+    
+    def _record(self, user, check_in, check_out=None):
+        return AttendanceRecord.objects.create(
+            user=user, date=self.day, check_in_time=self._at(check_in),
+            check_out_time=check_out and self._at(check_out)
+        )
+    
+    def test_open_records_closed_at_shift_end(self):
+        """Test open records are marked out at their role's shift end in one update"""
+        # Shift timings, then in one transaction: lock the open rows, the UPDATE, read back, one outbox INSERT
+        with self.assertNumQueries(7):
+            call_command('auto_close_attendance', '--date', str(self.day), stdout=io.StringIO())
+        
+        record = AttendanceRecord.objects.get(pk=self.student_record.pk)
+        self.assertTrue(record.auto_closed)
+        self.assertEqual(record.check_out_time, self._at(time(17, 0)))
+        self.assertEqual(record.worked_seconds, 8 * 3600)
+        self.assertEqual(record.overtime_seconds, 0)
+        
+        # A check-in after the shift end is closed at the check-in
+        record = AttendanceRecord.objects.get(pk=self.late_record.pk)
+        self.assertEqual(record.check_out_time, self._at(time(19, 30)))
+        # Checked in after the shift end: nothing worked, so no overtime either
+        self.assertEqual((record.worked_seconds, record.overtime_seconds), (0, 0))
+        
+        record = AttendanceRecord.objects.get(pk=self.admin_record.pk)
+        self.assertEqual(record.check_out_time, self._at(time(18, 0)))
+        self.assertIsNone(record.overtime_seconds)
+        
+        record = AttendanceRecord.objects.get(pk=self.closed_record.pk)
+        self.assertFalse(record.auto_closed)
+        self.assertEqual(record.check_out_time, self._at(time(16, 0)))
+    
+    def test_closed_records_emit_marked_out_events(self):
+        """Test every auto-closed record queues a marked_out event carrying its closing values"""
+        auto_close_records(self.day)
+        
+        events = {
+            event.payload['record_id']: event
+            for event in OutboxEvent.objects.filter(event_type='attendance.marked_out')
+        }
+        self.assertEqual(set(events), {self.student_record.pk, self.late_record.pk, self.admin_record.pk})
+        self.assertEqual(events[self.student_record.pk].payload['worked_seconds'], 8 * 3600)
+        
+        # Nothing left open, nothing emitted
+        self.assertEqual(auto_close_records(self.day), 0)
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+    
+    def test_admin_trigger(self):
+        """Test the admin endpoint closes a day's records and rejects future dates"""
+        url = reverse('auto_close_attendance')
+        response = self.client.post(url, {'date': str(self.day)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['closed'], 3)
+        
+        response = self.client.post(url, {'date': str(date.today() + timedelta(days=1))}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserImportTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='testpass123',
+            role='admin',
+            email='admin@example.com'
+        )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('import_users')
+    
+    def test_invalid_rows_reject_whole_import(self):
+        """Test row rules and uniqueness are checked up front and nothing is created on errors"""
+        rows = [
+            {'username': 'intern1', 'password': 'secret123', 'role': 'intern',
+             'start_date': '2025-01-01', 'end_date': '2025-06-30'},
+            {'username': 'student1', 'password': 'secret123', 'role': 'student'},
+            {'username': 'admin', 'password': 'secret123', 'role': 'employee'},
+            {'username': 'emp1', 'password': 'secret123', 'role': 'employee', 'email': 'ADMIN@example.com'},
+            {'username': 'intern1', 'password': 'secret123', 'role': 'employee'},
+        ]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1, 2, 3, 4])
+        self.assertIn('username', response.data['errors'][2]['errors'])
+        self.assertIn('email', response.data['errors'][3]['errors'])
+        self.assertEqual(User.objects.count(), 1)
+    
+    @override_settings(USER_IMPORT_PARALLEL_MIN_ROWS=1, USER_IMPORT_HASH_WORKERS=2)
+    def test_csv_upload_creates_users(self):
+        """Test a CSV upload is queued and the job creates every user, hashed in worker processes"""
+        content = (
+            'username,email,first_name,password,role,start_date,end_date\n'
+            'student1,s1@example.com,Sam,secret123,student,2025-01-01,2025-06-30\n'
+            'student2,,Sue,secret456,student,2025-01-01,2025-06-30\n'
+            'emp1,e1@example.com,Eve,secret789,employee,,\n'
+        )
+        upload = SimpleUploadedFile('users.csv', content.encode(), content_type='text/csv')
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual((response.data['status'], response.data['row_count']), ('pending', 3))
+        self.assertFalse(User.objects.filter(username='student1').exists())
+        
+        run_user_import(response.data['id'])
+        response = self.client.get(reverse('import_job_detail', args=[response.data['id']]))
+        self.assertEqual((response.data['status'], response.data['created_count']), ('done', 3))
+        student = User.objects.get(username='student1')
+        self.assertTrue(student.check_password('secret123'))
+        self.assertEqual(student.start_date, date(2025, 1, 1))
+        self.assertIsNone(User.objects.get(username='emp1').start_date)
+        self.assertTrue(User.objects.get(username='student2').check_password('secret456'))
+    
+    @override_settings(USER_IMPORT_PARALLEL_MIN_ROWS=1)
+    def test_command_hashes_in_worker_processes(self):
+        """Test the command spreads password hashing over worker processes"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.json')
+            with open(path, 'w') as f:
+                json.dump([
+                    {'username': f'employee{i}', 'password': f'secret12{i}', 'role': 'employee'} for i in range(3)
+                ], f)
+            call_command('import_users', path, '--workers', '2', stdout=io.StringIO())
+        self.assertTrue(User.objects.get(username='employee2').check_password('secret122'))
+    
+    def test_import_refreshes_active_users(self):
+        """Test imported users with an active window are in the active-user set straight away"""
+        today = date.today()
+        self.assertIn(self.admin.pk, active_users)
+        rows = [{'username': 'student1', 'password': 'secret123', 'role': 'student',
+                 'start_date': (today - timedelta(days=1)).isoformat(),
+                 'end_date': (today + timedelta(days=30)).isoformat()}]
+        response = self.client.post(self.url, rows, format='json')
+        run_user_import(response.data['id'])
+        self.assertIn(User.objects.get(username='student1').pk, active_users)
+
+
+class BulkEnrollmentUpdateTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        self.interns = [
+            User.objects.create_user(
+                username=f'intern{i}', password='testpass123', role='intern',
+                start_date=date(2025, 1, 1), end_date=date(2025, 6, 30)
+            )
+            for i in range(3)
+        ]
+        User.objects.filter(pk=self.interns[2].pk).update(end_date=date(2025, 9, 30))
+        self.student = User.objects.create_user(
+            username='student1', password='testpass123', role='student',
+            start_date=date(2025, 1, 1), end_date=date(2025, 6, 30)
+        )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('bulk_enrollment_update')
+    
+    def test_filter_update_counts_changed_rows(self):
+        """Test a filtered update writes only rows that differ and reports matched and changed counts"""
+        version = enrollment_version()
+        response = self.client.post(self.url, {
+            'filter': {'role': 'intern'}, 'end_date': '2025-09-30'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'matched': 3, 'changed': 2})
+        self.assertEqual(
+            set(User.objects.filter(role='intern').values_list('end_date', flat=True)), {date(2025, 9, 30)}
+        )
+        self.assertEqual(User.objects.get(pk=self.student.pk).end_date, date(2025, 6, 30))
+        self.assertGreater(enrollment_version(), version)
+    
+    def test_validation(self):
+        """Test selectors and windows are validated before anything is written"""
+        response = self.client.post(self.url, {'end_date': '2025-09-30'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.post(self.url, {
+            'user_ids': [self.interns[0].pk, self.student.pk], 'end_date': '2024-12-31'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('2 selected users', response.data['error'])
+        
+        response = self.client.post(self.url, {
+            'user_ids': [self.interns[0].pk], 'is_active_period': False
+        }, format='json')
+        self.assertEqual(response.data, {'matched': 1, 'changed': 1})
+        self.assertFalse(User.objects.get(pk=self.interns[0].pk).is_active_period)
+
+
+class EnrollmentSweepTestCase(TestCase):
+    def setUp(self):
+        today = date.today()
+        self.expired = User.objects.create_user(
+            username='expired', password='testpass123', role='intern',
+            start_date=today - timedelta(days=90), end_date=today - timedelta(days=1)
+        )
+        self.starting = User.objects.create_user(
+            username='starting', password='testpass123', role='student',
+            start_date=today, end_date=today + timedelta(days=90), is_active_period=False
+        )
+        self.suspended = User.objects.create_user(
+            username='suspended', password='testpass123', role='student',
+            start_date=today - timedelta(days=30), end_date=today + timedelta(days=60), is_active_period=False
+        )
+        self.employee = User.objects.create_user(username='employee1', password='testpass123', role='employee')
+    
+    def test_sweep_flips_ended_and_started_windows(self):
+        """Test expired windows are deactivated and windows starting today activated, suspensions kept"""
+        call_command('sweep_enrollments', stdout=io.StringIO())
+        
+        self.assertFalse(User.objects.get(pk=self.expired.pk).is_active_period)
+        self.assertTrue(User.objects.get(pk=self.starting.pk).is_active_period)
+        self.assertFalse(User.objects.get(pk=self.suspended.pk).is_active_period)
+    
+    def test_active_user_set_follows_changes(self):
+        """Test the active-user set matches is_enrollment_active and refreshes after bulk changes"""
+        for user in User.objects.all():
+            self.assertEqual(user.pk in active_users, user.is_enrollment_active())
+        
+        call_command('sweep_enrollments', stdout=io.StringIO())
+        self.assertIn(self.starting.pk, active_users)
+        
+        with self.assertNumQueries(2):  # The enrollment version from the shared cache, no user query
+            self.assertIn(self.employee.pk, active_users)
+            self.assertNotIn(self.suspended.pk, active_users)
+    
+    def test_mark_in_rechecks_user_missed_by_the_set(self):
+        """Test a suspension the set has not seen yet still blocks mark in"""
+        student = User.objects.create_user(
+            username='student1', password='testpass123', role='student',
+            start_date=date.today() - timedelta(days=30), end_date=date.today() + timedelta(days=60)
+        )
+        self.assertIn(student.pk, active_users)
+        
+        # As if written by a process whose version bump was lost, the set stays as it is
+        User.objects.filter(pk=student.pk).update(is_active_period=False)
+        self.assertIn(student.pk, active_users)
+        self.assertFalse(is_enrollment_active(User.objects.get(pk=student.pk)))
+        
+        token = RefreshToken.for_user(student).access_token
+        response = self.client.post(reverse('mark_in'), json.dumps({
+            'latitude': round(settings.OFFICE_LOCATION['latitude'], 6),
+            'longitude': round(settings.OFFICE_LOCATION['longitude'], 6),
+        }), content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('active enrollment period', response.content.decode())
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+
+@override_settings(CHANGE_FEED_LAG_SECONDS=0)
+class ChangeFeedTestCase(APITestCase):
+    def setUp(self):
+        self.employee = User.objects.create_user(username='employee1', password='testpass123', role='employee')
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        self.records = [
+            AttendanceRecord.objects.create(
+                user=self.employee, date=date.today() - timedelta(days=offset),
+                check_in_time=timezone.now() - timedelta(days=offset)
+            )
+            for offset in range(3)
+        ]
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('change_feed')
+    
+    def _page(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_pages_follow_cursor_and_pick_up_updates(self):
+        """Test the feed pages in change order and later updates show up after the cursor"""
+        first = self._page(limit=2)
+        self.assertEqual([row['id'] for row in first['results']], [record.id for record in self.records[:2]])
+        self.assertTrue(first['has_more'])
+        
+        second = self._page(limit=2, cursor=first['next_cursor'])
+        self.assertEqual([row['id'] for row in second['results']], [self.records[2].id])
+        self.assertFalse(second['has_more'])
+        
+        empty = self._page(cursor=second['next_cursor'])
+        self.assertEqual(empty['results'], [])
+        self.assertEqual(empty['next_cursor'], second['next_cursor'])
+        
+        record = self.records[0]
+        record.notes = 'Updated'
+        record.save()
+        changed = self._page(cursor=second['next_cursor'])
+        self.assertEqual([row['id'] for row in changed['results']], [record.id])
+        self.assertEqual(changed['results'][0]['notes'], 'Updated')
+    
+    def test_security_log_feed_and_bad_cursor(self):
+        """Test the security log feed, and that cursors are checked against their resource"""
+        SecurityLog.objects.create(
+            user=self.employee, log_type='failed_geo', description='Outside', ip_address='127.0.0.1'
+        )
+        page = self._page(resource='security_logs')
+        self.assertEqual([row['description'] for row in page['results']], ['Outside'])
+        
+        response = self.client.get(self.url, {'resource': 'attendance', 'cursor': page['next_cursor']})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StubWebhookReceiver:
+    """Local HTTP server recording webhook requests, answering with queued statuses then 200"""
+    
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+        receiver = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                receiver.requests.append((self.path, dict(self.headers), json.loads(body), body))
+                self.send_response(receiver.statuses.pop(0) if receiver.statuses else 200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@override_settings(WEBHOOKS=dict(settings.WEBHOOKS, COMMIT_LAG_SECONDS=0))
+class WebhookOutboxTestCase(APITestCase):
+    def setUp(self):
+        RoleShiftTiming.objects.create(role='student', start_time=time(0, 0), grace_period_minutes=0)
+        self.student = User.objects.create_user(
+            username='student1',
+            password='testpass123',
+            role='student',
+            start_date=date.today() - timedelta(days=5),
+            end_date=date.today() + timedelta(days=25)
+        )
+        token = RefreshToken.for_user(self.student).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.office = {
+            'latitude': round(settings.OFFICE_LOCATION['latitude'], 6),
+            'longitude': round(settings.OFFICE_LOCATION['longitude'], 6),
+        }
+        self.receiver = StubWebhookReceiver()
+        self.addCleanup(self.receiver.close)
+        self.pool = ConnectionPool(timeout=5)
+        self.addCleanup(self.pool.close)
+    
+    def _mark_in(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('mark_in'), self.office, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in queries if 'INSERT INTO "attendance_outboxevent"' in query['sql']]
+    
+    def test_mark_in_events_delivered_in_order(self):
+        """Test a late mark-in queues its events in one insert and each endpoint gets its own, in order"""
+        signed = WebhookEndpoint.objects.create(url=f'{self.receiver.url}/all', secret='s3cret')
+        WebhookEndpoint.objects.create(url=f'{self.receiver.url}/late', event_types='attendance.late')
+        
+        self.assertEqual(len(self._mark_in()), 1)
+        self.assertEqual(
+            list(OutboxEvent.objects.values_list('event_type', flat=True)),
+            ['attendance.marked_in', 'attendance.late']
+        )
+        last_event_id = OutboxEvent.objects.aggregate(Max('id'))['id__max']
+        
+        self.assertEqual(dispatch_webhooks(self.pool), (2, 3))
+        by_path = {}
+        for path, headers, payload, body in self.receiver.requests:
+            by_path.setdefault(path, []).append(payload['type'])
+            if path == '/all':
+                self.assertEqual(headers['X-Webhook-Signature'], sign('s3cret', body))
+        self.assertEqual(by_path, {'/all': ['attendance.marked_in', 'attendance.late'], '/late': ['attendance.late']})
+        self.assertEqual(self.receiver.requests[0][2]['data']['user_id'], self.student.id)
+        
+        signed.refresh_from_db()
+        self.assertEqual(signed.last_event_id, last_event_id)
+        self.assertFalse(OutboxEvent.objects.exists())
+    
+    def test_failed_delivery_backs_off_and_retries(self):
+        """Test a failed delivery holds the endpoint back until its backoff expires, then resumes"""
+        endpoint = WebhookEndpoint.objects.create(url=f'{self.receiver.url}/hook', event_types='attendance.marked_in')
+        self.receiver.statuses = [500]
+        self._mark_in()
+        
+        self.assertEqual(dispatch_webhooks(self.pool), (2, 0))
+        endpoint.refresh_from_db()
+        self.assertEqual(endpoint.failures, 1)
+        self.assertEqual(endpoint.last_error, 'HTTP 500')
+        self.assertIsNotNone(endpoint.next_attempt_at)
+        self.assertEqual(dispatch_webhooks(self.pool), (0, 0))
+        
+        WebhookEndpoint.objects.filter(pk=endpoint.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(dispatch_webhooks(self.pool), (2, 1))
+        endpoint.refresh_from_db()
+        self.assertEqual((endpoint.failures, endpoint.next_attempt_at), (0, None))
+        self.assertEqual([request[2]['type'] for request in self.receiver.requests], ['attendance.marked_in'] * 2)
+
+
+PYARROW_INSTALLED = importlib.util.find_spec('pyarrow') is not None
+
+class ExportFormatTestCase(APITestCase):
+    def setUp(self):
+        self.employee = User.objects.create_user(username='employee1', password='testpass123', role='employee')
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        self.day = date.today() - timedelta(days=1)
+        self.record = AttendanceRecord.objects.create(
+            user=self.employee, date=self.day,
+            check_in_time=timezone.make_aware(datetime.combine(self.day, time(9, 30))),
+            check_out_time=timezone.make_aware(datetime.combine(self.day, time(17, 0))),
+        )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('export_attendance')
+    
+    def test_ndjson_export_is_typed(self):
+        """Test NDJSON rows carry ids, booleans, numbers and timestamps with their offset"""
+        response = self.client.get(self.url, {'file_type': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual((row['record_id'], row['user_id'], row['role']), (self.record.id, self.employee.id, 'employee'))
+        self.record.refresh_from_db()
+        self.assertIs(row['is_late'], self.record.is_late)
+        self.assertEqual(row['worked_seconds'], self.record.worked_seconds)
+        self.assertEqual(datetime.fromisoformat(row['check_in_time']), self.record.check_in_time)
+        
+        response = self.client.get(self.url, {'file_type': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @unittest.skipUnless(PYARROW_INSTALLED, 'pyarrow is not installed')
+    def test_parquet_export(self):
+        """Test the Parquet export reads back with typed columns"""
+        import pyarrow.parquet as pq
+        response = self.client.get(self.url, {'file_type': 'parquet'})
+        table = pq.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.column('record_id').to_pylist(), [self.record.id])
+        self.assertEqual(table.column('date').to_pylist(), [self.day])
+    
+    @unittest.skipIf(PYARROW_INSTALLED, 'pyarrow is installed')
+    def test_columnar_export_needs_pyarrow(self):
+        """Test Parquet and Arrow exports report the missing dependency"""
+        for file_type in ('parquet', 'arrow'):
+            response = self.client.get(self.url, {'file_type': file_type})
+            self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+
+class ExportJobTestCase(APITestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        settings_override = override_settings(EXPORT_JOBS={
+            'WORKERS': 1, 'CACHE_DIR': self.cache_dir.name, 'CACHE_MAX_BYTES': 1024 * 1024,
+            'TIMEOUT_SECONDS': 600,
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        self.employee = User.objects.create_user(username='employee1', password='testpass123', role='employee')
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        self.day = date.today() - timedelta(days=1)
+        self.record = AttendanceRecord.objects.create(
+            user=self.employee, date=self.day,
+            check_in_time=timezone.make_aware(datetime.combine(self.day, time(9, 0))),
+        )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('export_jobs')
+        self.request = {'file_type': 'ndjson', 'role': 'employee', 'from_date': self.day.isoformat()}
+    
+    def test_job_builds_and_serves_file(self):
+        """Test a submitted job is built by a worker, then polled and downloaded"""
+        response = self.client.post(self.url, self.request, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data['id']
+        self.assertEqual(response.data['status'], 'pending')
+        
+        download_url = reverse('export_job_download', args=[job_id])
+        self.assertEqual(self.client.get(download_url).status_code, status.HTTP_409_CONFLICT)
+        
+        run_export_job(job_id)
+        response = self.client.get(reverse('export_job_detail', args=[job_id]))
+        self.assertEqual((response.data['status'], response.data['row_count']), ('done', 1))
+        
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['record_id'] for row in rows], [self.record.id])
+    
+    def test_identical_request_served_from_cache_until_data_changes(self):
+        """Test equal filters reuse the cached file, and a record change builds a new one"""
+        first = self.client.post(self.url, self.request, format='json').data
+        # Queued again while pending: the same job answers
+        self.assertEqual(self.client.post(self.url, self.request, format='json').data['id'], first['id'])
+        run_export_job(first['id'])
+        
+        response = self.client.post(self.url, dict(reversed(self.request.items())), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['status'], response.data['row_count']), ('done', 1))
+        self.assertEqual(ExportJob.objects.get(pk=response.data['id']).cache_key,
+                         ExportJob.objects.get(pk=first['id']).cache_key)
+        
+        self.record.notes = 'Traffic'
+        self.record.save()
+        response = self.client.post(self.url, self.request, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotEqual(response.data['id'], first['id'])
+    
+    def test_timed_out_job_is_failed_and_queued_again(self):
+        """Test a job whose worker is gone is not handed back, and pending jobs run from the command"""
+        lost = self.client.post(self.url, self.request, format='json').data
+        ExportJob.objects.filter(pk=lost['id']).update(
+            status='running', created_at=timezone.now() - timedelta(seconds=601)
+        )
+        
+        response = self.client.post(self.url, self.request, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotEqual(response.data['id'], lost['id'])
+        lost_job = ExportJob.objects.get(pk=lost['id'])
+        self.assertEqual(lost_job.status, 'failed')
+        self.assertIn('timed out', lost_job.error)
+        
+        call_command('run_export_jobs', stdout=io.StringIO())
+        self.assertEqual(ExportJob.objects.get(pk=response.data['id']).status, 'done')
+    
+    def test_cache_evicts_least_recently_used(self):
+        """Test the cache drops the least recently read files past its size bound"""
+        export_cache = ExportCache(self.cache_dir.name, max_bytes=25)
+        for index, key in enumerate(['a', 'b']):
+            export_cache.put(key, 'csv', lambda output: output.write(b'x' * 10))
+            os.utime(export_cache.path(key, 'csv'), (index, index))
+        
+        self.assertIsNotNone(export_cache.get('a', 'csv'))  # Now the most recent
+        export_cache.put('c', 'csv', lambda output: output.write(b'x' * 10))
+        self.assertEqual(
+            sorted(path.name for path in export_cache.directory.iterdir()), ['a.csv', 'c.csv']
+        )
+        
+        # A file evicted after its job finished is gone for download
+        response = self.client.post(self.url, self.request, format='json')
+        run_export_job(response.data['id'])
+        for path in export_cache.directory.iterdir():
+            path.unlink()
+        response = self.client.get(reverse('export_job_download', args=[response.data['id']]))
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+
+@override_settings(PARTITIONED_EXPORT_WORKERS=1)
+class PartitionedExportTestCase(APITestCase):
+    def setUp(self):
+        self.employee = User.objects.create_user(username='employee1', password='testpass123', role='employee')
+        self.student = User.objects.create_user(username='student1', password='testpass123', role='student')
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        for user, day in ((self.employee, date(2024, 1, 31)), (self.employee, date(2024, 2, 1)), (self.student, date(2024, 2, 2))):
+            AttendanceRecord.objects.create(
+                user=user, date=day, check_in_time=timezone.make_aware(datetime.combine(day, time(9, 0)))
+            )
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('export_partitioned')
+    
+    def test_zip_has_role_month_files_and_manifest(self):
+        """Test one file per role and month, with row counts and checksums in the manifest"""
+        response = self.client.get(self.url, {
+            'from_date': '2024-01-15', 'to_date': '2024-02-10', 'role': 'employee',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['employee/2024-01.csv', 'employee/2024-02.csv', 'manifest.json'])
+        
+        manifest = json.loads(archive.read('manifest.json'))
+        self.assertEqual(manifest['total_rows'], 2)
+        for entry in manifest['partitions']:
+            content = archive.read(entry['path'])
+            self.assertEqual(entry['rows'], 1)
+            self.assertEqual(entry['sha256'], hashlib.sha256(content).hexdigest())
+        self.assertEqual(manifest['partitions'][0]['from_date'], '2024-01-15')
+        self.assertIn('2024-01-31', archive.read('employee/2024-01.csv').decode())
+    
+    def test_command_writes_every_role(self):
+        """Test the command partitions every role and validates the range"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'audit.zip')
+            call_command('export_partitioned', path, '--from-date', '2024-02-01', '--to-date', '2024-02-29',
+                         '--file-type', 'ndjson', stdout=io.StringIO())
+            manifest = json.loads(zipfile.ZipFile(path).read('manifest.json'))
+        rows = {entry['path']: entry['rows'] for entry in manifest['partitions']}
+        self.assertEqual(rows['employee/2024-02.ndjson'], 1)
+        self.assertEqual(rows['student/2024-02.ndjson'], 1)
+        self.assertEqual(len(rows), len(User.ROLE_CHOICES))
+        
+        response = self.client.get(self.url, {'from_date': '2024-02-01', 'to_date': '2024-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_command_workers_read_file_database(self):
+        """Test the command's worker processes render partitions from a file-backed database"""
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, 'db.sqlite3')
+            with open(os.path.join(directory, 'file_db_settings.py'), 'w') as f:
+                f.write(
+                    'from myproject.settings import *\n'
+                    f"DATABASES = {{'default': {{'ENGINE': 'django.db.backends.sqlite3', 'NAME': {database!r}}}}}\n"
+                )
+            env = dict(os.environ, DJANGO_SETTINGS_MODULE='file_db_settings', PYTHONPATH=os.pathsep.join(
+                filter(None, [directory, os.environ.get('PYTHONPATH')])
+            ))
+            
+            def manage(*args):
+                subprocess.run([sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env,
+                               check=True, capture_output=True)
+            
+            manage('migrate', '--verbosity', '0')
+            manage('shell', '-c', (
+                "from datetime import date, datetime, time\n"
+                "from django.utils import timezone\n"
+                "from attendance.models import User, AttendanceRecord\n"
+                "user = User.objects.create_user(username='employee1', password='testpass123', role='employee')\n"
+                "for day in (date(2024, 1, 31), date(2024, 2, 1)):\n"
+                "    AttendanceRecord.objects.create(\n"
+                "        user=user, date=day, check_in_time=timezone.make_aware(datetime.combine(day, time(9, 0)))\n"
+                "    )\n"
+            ))
+            path = os.path.join(directory, 'audit.zip')
+            manage('export_partitioned', path, '--from-date', '2024-01-01', '--to-date', '2024-02-29',
+                   '--role', 'employee', '--workers', '2')
+            archive = zipfile.ZipFile(path)
+            manifest = json.loads(archive.read('manifest.json'))
+            self.assertEqual([entry['rows'] for entry in manifest['partitions']], [1, 1])
+            self.assertIn('2024-02-01', archive.read('employee/2024-02.csv').decode())
+
+
+
+class RecordingReplicaRouter(ReplicaRouter):
+    """ReplicaRouter noting the routed alias of every read"""
+    reads = []
+    
+    def db_for_read(self, model, **hints):
+        self.reads.append(current_read_alias())
+        return super().db_for_read(model, **hints)
+
+# The primary doubles as the replica, reads routed to it are told apart by the recording router
+@override_settings(REPLICA_DATABASE='default', DATABASE_ROUTERS=['attendance.tests.RecordingReplicaRouter'])
+class ReplicaRoutingTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.employee = User.objects.create_user(username='employee1', password='testpass123', role='employee')
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        AttendanceRecord.objects.create(
+            user=self.employee, date=date.today() - timedelta(days=1),
+            check_in_time=timezone.now() - timedelta(days=1)
+        )
+        RecordingReplicaRouter.reads.clear()
+    
+    def _routed(self, user, method, url, data=None):
+        """Whether a request read from the replica (authentication always reads from the primary)"""
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        RecordingReplicaRouter.reads.clear()
+        response = getattr(self.client, method)(url, data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+        return 'default' in RecordingReplicaRouter.reads
+    
+    def test_admin_reads_use_replica_until_own_write(self):
+        """Test admin, report and export reads go to the replica, and a write pins the admin to the primary"""
+        self.assertTrue(self._routed(self.admin, 'get', reverse('admin_attendance')))
+        self.assertTrue(self._routed(self.admin, 'get', reverse('admin_users')))
+        # Streamed rows are read after the view has returned
+        self.assertTrue(self._routed(self.admin, 'get', reverse('export_attendance') + '?file_type=ndjson'))
+        # Check-ins and the user's own views stay on the primary
+        self.assertFalse(self._routed(self.employee, 'get', reverse('my_attendance')))
+        
+        self._routed(self.admin, 'post', reverse('bulk_enrollment_update'), {
+            'user_ids': [self.employee.id], 'is_active_period': True,
+        })
+        self.assertFalse(self._routed(self.admin, 'get', reverse('admin_attendance')))
+        # Other admins are not pinned
+        other_admin = User.objects.create_user(username='admin2', password='testpass123', role='admin')
+        self.assertTrue(self._routed(other_admin, 'get', reverse('security_logs')))
+    
+    def test_pin_middleware_runs_natively_async(self):
+        """Test the pin middleware stays a coroutine in an async stack and pins after an async write"""
+        async def write_view(request):
+            request.user = self.employee
+            return HttpResponse(status=201)
+        
+        middleware = ReplicaPinMiddleware(write_view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual(read_alias_for(self.employee), 'default')
+        async_to_sync(middleware)(RequestFactory().post('/'))
+        self.assertIsNone(read_alias_for(self.employee))
+        
+        # Sync stacks are served without adaptation too
+        self.assertFalse(iscoroutinefunction(ReplicaPinMiddleware(lambda request: HttpResponse())))
+    
+    def test_pins_are_shared_between_processes(self):
+        """Test pins are kept in the shared cache table, which is never read from the replica"""
+        pin_to_primary(self.admin)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {settings.CACHES['default']['LOCATION']} WHERE cache_key LIKE %s",
+                ['%replica_pin:%'],
+            )
+            self.assertEqual(cursor.fetchone()[0], 1)
+        
+        self.assertIsNone(read_alias_for(self.admin))
+        with reading_from('replica'):
+            self.assertEqual(ReplicaRouter().db_for_read(cache.cache_model_class), 'default')
+    
+    def test_router_sends_writes_to_primary(self):
+        """Test writes always go to the primary and the replica is never migrated"""
+        router = ReplicaRouter()
+        with reading_from('replica'):
+            self.assertEqual(router.db_for_read(AttendanceRecord), 'replica')
+            self.assertEqual(router.db_for_write(AttendanceRecord), 'default')
+        self.assertEqual(router.db_for_read(AttendanceRecord), 'default')
+        self.assertFalse(router.allow_migrate('default', 'attendance'))
+        with override_settings(REPLICA_DATABASE=None):
+            self.assertTrue(router.allow_migrate('default', 'attendance'))
+
+
+class SparseFieldsetTestCase(APITestCase):
+    def setUp(self):
+        self.employee = User.objects.create_user(
+            username='employee1', password='testpass123', role='employee', first_name='Emp', last_name='One'
+        )
+        self.admin = User.objects.create_user(username='admin', password='testpass123', role='admin')
+        self.record = AttendanceRecord.objects.create(
+            user=self.employee, date=date.today() - timedelta(days=1),
+            check_in_time=timezone.now() - timedelta(days=1),
+            check_in_latitude=12.5, check_in_longitude=77.5
+        )
+        record_security_event(
+            user=self.employee, log_type='failed_geo', description='Outside office',
+            ip_address='10.0.0.1', device_info={'user_agent': 'Kiosk'}
+        )
+    
+    def _get(self, user, url, params=None):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        # The first query loads the authenticated user
+        return response, ' '.join(query['sql'] for query in queries.captured_queries[1:])
+    
+    def test_fields_trim_output_and_columns(self):
+        """Test fields= limits the serialized keys and the columns selected, skipping unused relations"""
+        response, sql = self._get(self.employee, reverse('my_attendance'), {'fields': 'date,is_late'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'date': self.record.date.isoformat(), 'is_late': self.record.is_late}])
+        self.assertNotIn('check_in_time', sql)
+        self.assertNotIn('first_name', sql)
+        
+        response, sql = self._get(self.admin, reverse('security_logs'), {'fields': 'log_type,last_seen,device_info'})
+        self.assertEqual(set(response.data['results'][0]), {'log_type', 'last_seen', 'device_info'})
+        self.assertEqual(response.data['results'][0]['device_info']['user_agent'], 'Kiosk')
+        self.assertNotIn('ip_packed', sql)
+        self.assertNotIn('"attendance_user"."first_name"', sql)
+        
+        response, _ = self._get(self.admin, reverse('admin_users'), {'fields': 'username,bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_default_output_skips_unused_columns(self):
+        """Test every field is output by default while unread columns are never selected"""
+        response, sql = self._get(self.admin, reverse('admin_attendance'))
+        row = response.data['results'][0]
+        self.assertEqual((row['user_name'], row['user_role']), ('Emp One', 'employee'))
+        self.assertIn('check_in_time', row)
+        self.assertNotIn('check_in_latitude', sql)
+        self.assertNotIn('worked_seconds', sql)
+        self.assertNotIn('password', sql)
+        
+        response, sql = self._get(self.admin, reverse('admin_users'))
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotIn('password', sql)
@@ -1,27 +1,62 @@
 # attendance/urls.py (UPDATED)
 # ================================
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Native async attendance views for ASGI deployments, sync DRF views otherwise
+if getattr(settings, 'ASYNC_ATTENDANCE_VIEWS', False):
+    mark_in = views.mark_in_async_view
+    mark_out = views.mark_out_async_view
+else:
+    mark_in = views.mark_in_view
+    mark_out = views.mark_out_view
+
 urlpatterns = [
     # Authentication
     path('register/', views.UserRegistrationView.as_view(), name='register'),
     path('login/', views.login_view, name='login'),
     
     # Attendance
-    path('attendance/mark-in/', views.mark_in_view, name='mark_in'),
-    path('attendance/mark-out/', views.mark_out_view, name='mark_out'),
+    path('attendance/mark-in/', mark_in, name='mark_in'),
+    path('attendance/mark-out/', mark_out, name='mark_out'),
+    path('attendance/sync/', views.offline_sync_view, name='offline_sync'),
     path('attendance/my/', views.MyAttendanceView.as_view(), name='my_attendance'),
+    path('attendance/history/percentage/', views.attendance_percentage_view, name='attendance_percentage'),
+    path('attendance/history/streak/', views.attendance_streak_view, name='attendance_streak'),
+    path('attendance/history/heatmap/', views.attendance_heatmap_view, name='attendance_heatmap'),
     path('attendance/<int:attendance_id>/notes/', views.update_attendance_notes, name='update_notes'),
     
     # Admin endpoints
     path('admin/attendance/', views.AdminAttendanceView.as_view(), name='admin_attendance'),
+    path('admin/attendance/auto-close/', views.auto_close_attendance_view, name='auto_close_attendance'),
     path('admin/users/', views.AdminUserListView.as_view(), name='admin_users'),
+    path('admin/users/import/', views.import_users_view, name='import_users'),
+    path('admin/users/import/<uuid:job_id>/', views.import_job_detail_view, name='import_job_detail'),
+    path('admin/users/enrollment/', views.bulk_enrollment_update_view, name='bulk_enrollment_update'),
     path('admin/user/<int:pk>/dates/', views.AdminUserUpdateView.as_view(), name='admin_user_update'),
     path('admin/export/', views.export_attendance_view, name='export_attendance'),
+    path('admin/export/partitioned/', views.export_partitioned_view, name='export_partitioned'),
+    path('admin/exports/', views.export_jobs_view, name='export_jobs'),
+    path('admin/exports/<uuid:job_id>/', views.export_job_detail_view, name='export_job_detail'),
+    path('admin/exports/<uuid:job_id>/download/', views.export_job_download_view, name='export_job_download'),
+    path('admin/absences/', views.absence_report_view, name='absence_report'),
+    path('admin/absences/export/', views.export_absence_view, name='export_absences'),
+    path('admin/reports/monthly/', views.monthly_matrix_view, name='monthly_matrix'),
+    path('admin/reports/monthly/export/', views.export_monthly_matrix_view, name='export_monthly_matrix'),
+    path('admin/analytics/hours/', views.worked_hours_analytics_view, name='worked_hours_analytics'),
+    path('admin/analytics/lateness/', views.lateness_analytics_view, name='lateness_analytics'),
     path('admin/security-logs/', views.SecurityLogView.as_view(), name='security_logs'),
+    path('admin/devices/', views.AdminDeviceListView.as_view(), name='admin_devices'),
+    path('admin/changes/', views.change_feed_view, name='change_feed'),
     
     # NEW: Admin shift timing management
     path('admin/shift-timings/', views.AdminShiftTimingListView.as_view(), name='admin_shift_timings'),
     path('admin/shift-timings/<int:pk>/', views.AdminShiftTimingDetailView.as_view(), name='admin_shift_timing_detail'),
+    
+    # NEW: Admin working-day calendars
+    path('admin/calendars/', views.AdminWorkCalendarListView.as_view(), name='admin_calendars'),
+    path('admin/calendars/<int:pk>/', views.AdminWorkCalendarDetailView.as_view(), name='admin_calendar_detail'),
+    path('admin/holidays/', views.AdminHolidayListView.as_view(), name='admin_holidays'),
+    path('admin/holidays/<int:pk>/', views.AdminHolidayDetailView.as_view(), name='admin_holiday_detail'),
 ]
\ No newline at end of file
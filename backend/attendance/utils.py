@@ -2,18 +2,48 @@
 import math
 import csv
 import io
-from django.http import HttpResponse
+import ipaddress
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
 from django.conf import settings
 from datetime import datetime, date, time
 
+def _parse_ip(value):
+    """Valid IP address in a header value, allowing an IPv4 port suffix and [IPv6]:port, or None"""
+    value = (value or '').strip()
+    if value.startswith('['):
+        value = value[1:].partition(']')[0]
+    elif value.count(':') == 1:
+        value = value.partition(':')[0]
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return None
+
 def get_client_ip(request):
     """Get client IP address from request"""
+    # X-Forwarded-For is client controlled, entries that are not addresses fall back to the peer
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    ip = _parse_ip(x_forwarded_for.split(',')[0]) if x_forwarded_for else None
+    return ip or request.META.get('REMOTE_ADDR')
+
+def pack_ip_address(ip):
+    """IP address as 16 big-endian bytes, IPv4 mapped into IPv6, so ranges sort and compare as integers.
+    
+    None when ip is not a valid address.
+    """
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    if address.version == 4:
+        address = ipaddress.IPv6Address(f'::ffff:{address}')
+    return address.packed
+
+def ip_network_bounds(network):
+    """First and last packed addresses of an address or CIDR network such as 10.0.0.0/24"""
+    network = ipaddress.ip_network(network, strict=False)
+    return pack_ip_address(network.network_address), pack_ip_address(network.broadcast_address)
 
 def get_device_info(request):
     """Get device information from request"""
@@ -56,27 +86,30 @@ def validate_geofence(latitude, longitude):
     distance = calculate_distance(latitude, longitude, office_lat, office_lon)
     return distance <= float(allowed_radius)  # Ensure this comparison works
 
+ATTENDANCE_CSV_HEADER = ['Name', 'Role', 'Date', 'Check In', 'Check Out', 'Late', 'Notes']
+
+def attendance_csv_row(record):
+    return [
+        record.user.get_full_name(),
+        record.user.get_role_display(),
+        record.date.strftime('%Y-%m-%d'),
+        record.check_in_time.strftime('%H:%M:%S') if record.check_in_time else '',
+        record.check_out_time.strftime('%H:%M:%S') if record.check_out_time else '',
+        'Yes' if record.is_late else 'No',
+        record.notes
+    ]
+
 def generate_attendance_csv(attendance_records):
     """Generate CSV file from attendance records"""
     output = io.StringIO()
     writer = csv.writer(output)
     
     # Write header
-    writer.writerow([
-        'Name', 'Role', 'Date', 'Check In', 'Check Out', 'Late', 'Notes'
-    ])
+    writer.writerow(ATTENDANCE_CSV_HEADER)
     
     # Write data
     for record in attendance_records:
-        writer.writerow([
-            record.user.get_full_name(),
-            record.user.get_role_display(),
-            record.date.strftime('%Y-%m-%d'),
-            record.check_in_time.strftime('%H:%M:%S') if record.check_in_time else '',
-            record.check_out_time.strftime('%H:%M:%S') if record.check_out_time else '',
-            'Yes' if record.is_late else 'No',
-            record.notes
-        ])
+        writer.writerow(attendance_csv_row(record))
     
     output.seek(0)
     return output.getvalue()
@@ -86,3 +119,68 @@ def create_csv_response(csv_content, filename):
     response = HttpResponse(csv_content, content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
+
+class Echo:
+    """File-like object whose write returns the value, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+def generate_attendance_csv_rows(attendance_records):
+    """Yield CSV lines for attendance records, as generate_attendance_csv"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(ATTENDANCE_CSV_HEADER)
+    
+    for record in attendance_records:
+        yield writer.writerow(attendance_csv_row(record))
+
+def generate_absence_csv_rows(absence_report):
+    """Yield CSV lines for an absence report"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(['Name', 'Username', 'Role', 'Date'])
+    
+    for row in absence_report:
+        yield writer.writerow([
+            row['user_name'],
+            row['username'],
+            row['user_role'].title(),
+            row['date'].strftime('%Y-%m-%d'),
+        ])
+
+def generate_table_csv_rows(header, rows):
+    """Yield CSV lines for a header and an iterable of rows"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+def create_xlsx_response(header, rows, filename, sheet_title='Report'):
+    """Create HTTP response with an XLSX workbook, requires openpyxl"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    
+    output = io.BytesIO()
+    workbook.save(output)
+    response = HttpResponse(
+        output.getvalue(),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def create_streaming_csv_response(rows, filename):
+    """Create streaming HTTP response from an iterable of CSV lines"""
+    response = StreamingHttpResponse(rows, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def create_json_response(data, status_code=200, headers=None):
+    """Create JSON response rendered with DRF's encoder, for views outside the DRF request cycle"""
+    response = JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False, headers=headers)
+    # Keep the payload around like a DRF Response so it can be cached and replayed
+    response.data = data
+    return response
@@ -1,21 +1,67 @@
 # attendance/views.py (UPDATED)
 # ================================
-from rest_framework import generics, status, permissions
+from rest_framework import generics, status, permissions, exceptions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Q
-from datetime import date, datetime, time
-from .models import User, AttendanceRecord, SecurityLog, RoleShiftTiming
+from django.utils.dateparse import parse_datetime
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Prefetch, Q, prefetch_related_objects
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from functools import wraps
+import json
+import tempfile
+from .models import (
+    User, AttendanceRecord, RoleShiftTiming, WorkCalendar, Holiday, DeviceFingerprint, ExportJob,
+    UserImportJob
+)
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, AttendanceMarkSerializer,
+    AttendanceLocationSerializer, avalidate_attendance_mark, duplicate_attempt_log_kwargs,
     AttendanceRecordSerializer, UserSerializer, UserDateUpdateSerializer,
-    SecurityLogSerializer, AttendanceNotesUpdateSerializer, RoleShiftTimingSerializer
+    SecurityLogSerializer, AttendanceNotesUpdateSerializer, RoleShiftTimingSerializer,
+    OfflineAttendanceSyncSerializer, WorkCalendarSerializer, HolidaySerializer,
+    DeviceFingerprintUsageSerializer, UserImportSerializer, BulkEnrollmentUpdateSerializer,
+    AttendanceChangeSerializer, ExportJobRequestSerializer, ExportJobSerializer,
+    PartitionedExportSerializer, UserImportJobSerializer
 )
 from .permissions import IsAdminUser, IsOwnerOrAdmin
-from .utils import get_client_ip, get_device_info, generate_attendance_csv, create_csv_response
+from .authentication import AsyncJWTAuthentication
+from .idempotency import idempotent, aidempotent
+from .devices import device_fingerprint_id, adevice_fingerprint_id
+from .offline import sync_offline_events
+from .outbox import emit_attendance_events
+from .imports import read_user_rows, validate_user_rows, submit_user_import
+from .enrollment import enrollment_conflicts, update_enrollment_windows
+from .security import record_security_event, arecord_security_event, search_security_logs
+from .reports import (
+    AbsenceReport, MonthlyAttendanceMatrix, WORKED_TIME_GROUPS, WORKED_TIME_PERIODS,
+    worked_time_summary, lateness_distribution, attendance_data_version
+)
+from .archive import (
+    attendance_queryset, security_log_queryset, merged_attendance_records, archived_attendance_through
+)
+from .exports import EXPORT_CONTENT_TYPES, attendance_export_filter, export_rows, generate_ndjson_lines, write_columnar
+from .export_jobs import normalize_export_filters, submit_export_job, export_cache
+from .history import AttendanceHistory
+from .partitions import write_partitioned_zip
+from .replicas import ReplicaReadMixin, replica_reads
+from .closing import auto_close_records
+from .changes import CHANGE_FEEDS, InvalidCursor, encode_cursor, decode_cursor, changes_after
+from .workdays import CompiledCalendar
+from .utils import (
+    get_client_ip, get_device_info, generate_attendance_csv, create_csv_response,
+    create_json_response, create_streaming_csv_response, generate_absence_csv_rows,
+    generate_table_csv_rows, create_xlsx_response, ip_network_bounds
+)
 
 class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -44,8 +90,71 @@ def login_view(request):
         })
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _check_in_fields(request, validated_data, device_id):
+    """Build the check-in fields of an AttendanceRecord from a validated mark request"""
+    return {
+        'check_in_time': timezone.now(),
+        'check_in_latitude': validated_data['latitude'],
+        'check_in_longitude': validated_data['longitude'],
+        'check_in_ip': get_client_ip(request),
+        'check_in_device_id': device_id,
+        'notes': validated_data.get('notes', ''),
+    }
+
+def _check_out_fields(request, validated_data, device_id):
+    """Build the check-out fields of an AttendanceRecord from a validated mark request"""
+    return {
+        'check_out_time': timezone.now(),
+        'check_out_latitude': validated_data['latitude'],
+        'check_out_longitude': validated_data['longitude'],
+        'check_out_ip': get_client_ip(request),
+        'check_out_device_id': device_id,
+    }
+
+def _save_check_in(user, day, fields):
+    """Create or fill in a day's record with check-in fields, queueing its webhook events in the same transaction.
+    
+    Returns (record, checked_in), checked_in is False when the record already had a check-in.
+    """
+    with transaction.atomic():
+        record, created = AttendanceRecord.objects.get_or_create(user=user, date=day, defaults=fields)
+        if not created:
+            if record.check_in_time:
+                return record, False
+            for field, value in fields.items():
+                setattr(record, field, value)
+            record.user = user
+            record.save()
+        emit_attendance_events([(record, 'in')])
+    return record, True
+
+def _save_check_out(record, user, fields):
+    """Write check-out fields to a record, queueing its webhook event in the same transaction"""
+    with transaction.atomic():
+        for field, value in fields.items():
+            setattr(record, field, value)
+        record.user = user
+        record.save()
+        emit_attendance_events([(record, 'out')])
+
+def _mark_in_response_data(record):
+    """Build the mark-in success payload"""
+    response_data = {
+        'message': 'Marked in successfully',
+        'time': record.check_in_time,
+        'is_late': record.is_late,
+        'notes_enabled': record.is_late,  # Enable notes only if late
+    }
+    
+    # Add expected start time if role has shift timing
+    if record.expected_start_time:
+        response_data['expected_start_time'] = record.expected_start_time
+    
+    return response_data
+
 # UPDATED: mark_in_view with shift timing validation
 @api_view(['POST'])
+@idempotent
 def mark_in_view(request):
     serializer = AttendanceMarkSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
@@ -53,62 +162,28 @@ def mark_in_view(request):
         today = date.today()
         
         # Check if already marked in today
-        record, created = AttendanceRecord.objects.get_or_create(
-            user=user,
-            date=today,
-            defaults={
-                'check_in_time': timezone.now(),
-                'check_in_latitude': serializer.validated_data['latitude'],
-                'check_in_longitude': serializer.validated_data['longitude'],
-                'check_in_ip': get_client_ip(request),
-                'check_in_device_info': str(get_device_info(request)),
-                'notes': serializer.validated_data.get('notes', ''),
-            }
+        device_id = device_fingerprint_id(get_device_info(request))
+        record, checked_in = _save_check_in(
+            user, today, _check_in_fields(request, serializer.validated_data, device_id)
         )
         
-        if not created and record.check_in_time:
+        if not checked_in:
             # Log duplicate attempt
-            SecurityLog.objects.create(
-                user=user,
-                log_type='duplicate_attempt',
-                description=f"Duplicate check-in attempt for {today}",
-                ip_address=get_client_ip(request),
-                device_info=str(get_device_info(request)),
-                latitude=serializer.validated_data['latitude'],
-                longitude=serializer.validated_data['longitude']
-            )
+            record_security_event(**duplicate_attempt_log_kwargs(
+                request, user, serializer.validated_data,
+                f"Duplicate check-in attempt for {today}"
+            ))
             return Response(
                 {'error': 'You have already marked in for today'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if not created:
-            # Update existing record with check-in data
-            record.check_in_time = timezone.now()
-            record.check_in_latitude = serializer.validated_data['latitude']
-            record.check_in_longitude = serializer.validated_data['longitude']
-            record.check_in_ip = get_client_ip(request)
-            record.check_in_device_info = str(get_device_info(request))
-            record.notes = serializer.validated_data.get('notes', '')
-            record.save()
-        
-        # Get shift timing and prepare response
-        response_data = {
-            'message': 'Marked in successfully',
-            'time': record.check_in_time,
-            'is_late': record.is_late,
-            'notes_enabled': record.is_late,  # Enable notes only if late
-        }
-        
-        # Add expected start time if role has shift timing
-        if record.expected_start_time:
-            response_data['expected_start_time'] = record.expected_start_time
-        
-        return Response(response_data)
+        return Response(_mark_in_response_data(record))
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
+@idempotent
 def mark_out_view(request):
     serializer = AttendanceMarkSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
@@ -131,27 +206,18 @@ def mark_out_view(request):
         
         if record.check_out_time:
             # Log duplicate attempt
-            SecurityLog.objects.create(
-                user=user,
-                log_type='duplicate_attempt',
-                description=f"Duplicate check-out attempt for {today}",
-                ip_address=get_client_ip(request),
-                device_info=str(get_device_info(request)),
-                latitude=serializer.validated_data['latitude'],
-                longitude=serializer.validated_data['longitude']
-            )
+            record_security_event(**duplicate_attempt_log_kwargs(
+                request, user, serializer.validated_data,
+                f"Duplicate check-out attempt for {today}"
+            ))
             return Response(
                 {'error': 'You have already marked out for today'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         # Update record with check-out data
-        record.check_out_time = timezone.now()
-        record.check_out_latitude = serializer.validated_data['latitude']
-        record.check_out_longitude = serializer.validated_data['longitude']
-        record.check_out_ip = get_client_ip(request)
-        record.check_out_device_info = str(get_device_info(request))
-        record.save()
+        device_id = device_fingerprint_id(get_device_info(request))
+        _save_check_out(record, user, _check_out_fields(request, serializer.validated_data, device_id))
         
         return Response({
             'message': 'Marked out successfully',
@@ -160,8 +226,164 @@ def mark_out_view(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# NEW: Native async mark-in/mark-out for ASGI deployments
+# Same response contract as mark_in_view/mark_out_view, but authentication,
+# validation and persistence go through the async ORM instead of holding a
+# worker thread for the whole request.
+async def _aauthenticate(request):
+    """Authenticate an async request, returns (user, error_response)"""
+    authenticator = AsyncJWTAuthentication()
+    try:
+        result = await authenticator.aauthenticate(request)
+    except exceptions.APIException as exc:
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        return None, create_json_response(
+            detail, exc.status_code,
+            headers={'WWW-Authenticate': authenticator.authenticate_header(request)}
+        )
+    
+    if result is None:
+        return None, create_json_response(
+            {'detail': exceptions.NotAuthenticated.default_detail},
+            status.HTTP_401_UNAUTHORIZED,
+            headers={'WWW-Authenticate': authenticator.authenticate_header(request)}
+        )
+    return result[0], None
+
+def async_api_view(view_func):
+    """Method check and JWT authentication for native async POST views, calls view_func(request, user)"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return create_json_response(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status.HTTP_405_METHOD_NOT_ALLOWED
+            )
+        
+        user, error_response = await _aauthenticate(request)
+        if error_response is not None:
+            return error_response
+        
+        # As DRF does, so middleware sees the authenticated user
+        request.user = user
+        return await view_func(request, user, *args, **kwargs)
+    
+    # JWT-authenticated like the DRF views, so no CSRF token is expected
+    wrapper.csrf_exempt = True
+    return wrapper
+
+async def _avalidate_mark_request(request, user):
+    """Validate an async mark request, returns (validated_data, error_response)"""
+    try:
+        payload = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+    except ValueError:
+        return None, create_json_response(
+            {'detail': 'JSON parse error'}, status.HTTP_400_BAD_REQUEST
+        )
+    
+    serializer = AttendanceLocationSerializer(data=payload)
+    if not serializer.is_valid():
+        return None, create_json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    
+    error = await avalidate_attendance_mark(request, user, serializer.validated_data)
+    if error:
+        return None, create_json_response(
+            {'non_field_errors': [error]}, status.HTTP_400_BAD_REQUEST
+        )
+    
+    return serializer.validated_data, None
+
+@async_api_view
+@aidempotent
+async def mark_in_async_view(request, user):
+    validated_data, error_response = await _avalidate_mark_request(request, user)
+    if error_response is not None:
+        return error_response
+    
+    today = date.today()
+    # Repeats are answered by the async ORM, without opening a transaction
+    checked_in = False
+    if not await AttendanceRecord.objects.filter(user=user, date=today, check_in_time__isnull=False).aexists():
+        device_id = await adevice_fingerprint_id(get_device_info(request))
+        # The record and its outbox events commit together, transactions are sync-only so this is the one hop
+        record, checked_in = await sync_to_async(_save_check_in)(
+            user, today, _check_in_fields(request, validated_data, device_id)
+        )
+    
+    if not checked_in:
+        await arecord_security_event(**duplicate_attempt_log_kwargs(
+            request, user, validated_data,
+            f"Duplicate check-in attempt for {today}"
+        ))
+        return create_json_response(
+            {'error': 'You have already marked in for today'},
+            status.HTTP_400_BAD_REQUEST
+        )
+    
+    return create_json_response(_mark_in_response_data(record))
+
+@async_api_view
+@aidempotent
+async def mark_out_async_view(request, user):
+    validated_data, error_response = await _avalidate_mark_request(request, user)
+    if error_response is not None:
+        return error_response
+    
+    today = date.today()
+    record = await AttendanceRecord.objects.filter(user=user, date=today).afirst()
+    if record is None or not record.check_in_time:
+        return create_json_response(
+            {'error': 'You must mark in before marking out'},
+            status.HTTP_400_BAD_REQUEST
+        )
+    
+    if record.check_out_time:
+        await arecord_security_event(**duplicate_attempt_log_kwargs(
+            request, user, validated_data,
+            f"Duplicate check-out attempt for {today}"
+        ))
+        return create_json_response(
+            {'error': 'You have already marked out for today'},
+            status.HTTP_400_BAD_REQUEST
+        )
+    
+    device_id = await adevice_fingerprint_id(get_device_info(request))
+    # The record and its outbox event commit together, in the one hop to a thread
+    await sync_to_async(_save_check_out)(record, user, _check_out_fields(request, validated_data, device_id))
+    
+    return create_json_response({
+        'message': 'Marked out successfully',
+        'time': record.check_out_time
+    })
+
+# NEW: Batch sync for offline and kiosk clients
+@api_view(['POST'])
+@idempotent
+def offline_sync_view(request):
+    serializer = OfflineAttendanceSyncSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        results = sync_offline_events(request, serializer.validated_data['events'])
+    except IntegrityError:
+        # Another check-in for the same user and day landed while the batch was processed
+        return Response(
+            {'error': 'Attendance changed while syncing, please retry'},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    summary = Counter(result['status'] for result in results)
+    return Response({
+        'accepted': summary['accepted'],
+        'duplicate': summary['duplicate'],
+        'rejected': summary['rejected'],
+        'results': results,
+    })
+
 # NEW: Update attendance notes endpoint
 @api_view(['PATCH'])
+@idempotent
 def update_attendance_notes(request, attendance_id):
     try:
         attendance = AttendanceRecord.objects.get(id=attendance_id)
@@ -199,49 +421,105 @@ def update_attendance_notes(request, attendance_id):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class MyAttendanceView(generics.ListAPIView):
+def _parse_date_param(params, name):
+    try:
+        return datetime.strptime(params[name], '%Y-%m-%d').date() if params.get(name) else None
+    except ValueError:
+        return None
+
+class PrefetchUserMixin:
+    """Load the related objects of a paginated page in bulk, for querysets that cannot use select_related"""
+    prefetch_fields = ['user']
+    
+    def get_prefetch_fields(self):
+        return self.prefetch_fields
+    
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            prefetch_related_objects(page, *self.get_prefetch_fields())
+        return page
+
+class SparseFieldsMixin:
+    """Trim a list view's output and the columns it loads to a comma-separated fields= parameter.
+    
+    Without the parameter every serializer field is output, but columns no
+    field reads are still never loaded. Related objects are only prefetched
+    when a requested field reads them, with just the columns it needs.
+    Combine with PrefetchUserMixin.
+    """
+    # Columns loaded whatever the fields, such as those a union of live and archived rows is ordered by
+    required_columns = []
+    
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            available = list(self.get_serializer_class()().fields)
+            requested = [name.strip() for name in self.request.query_params.get('fields', '').split(',') if name.strip()]
+            unknown = [name for name in requested if name not in available]
+            if unknown:
+                raise exceptions.ValidationError({
+                    'fields': f"Unknown fields {', '.join(unknown)}, choose from {', '.join(available)}"
+                })
+            self._fieldset = requested or available
+        return self._fieldset
+    
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_fieldset())
+        return super().get_serializer(*args, **kwargs)
+    
+    def only_fieldset_columns(self, queryset):
+        local, _ = self.get_serializer_class().columns(self.get_fieldset())
+        return queryset.only(*local, *self.required_columns)
+    
+    def get_prefetch_fields(self):
+        _, related = self.get_serializer_class().columns(self.get_fieldset())
+        model = self.get_serializer_class().Meta.model
+        return [
+            Prefetch(relation, queryset=model._meta.get_field(relation).related_model.objects.only(*columns))
+            for relation, columns in related.items()
+        ]
+
+class MyAttendanceView(SparseFieldsMixin, PrefetchUserMixin, generics.ListAPIView):
     serializer_class = AttendanceRecordSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return AttendanceRecord.objects.filter(user=self.request.user)
+        return self.only_fieldset_columns(AttendanceRecord.objects.filter(user=self.request.user))
 
-class AdminAttendanceView(generics.ListAPIView):
+class AdminAttendanceView(ReplicaReadMixin, SparseFieldsMixin, PrefetchUserMixin, generics.ListAPIView):
     serializer_class = AttendanceRecordSerializer
     permission_classes = [IsAdminUser]
+    required_columns = ['date', 'created_at']
     
-    def get_queryset(self):
-        queryset = AttendanceRecord.objects.all()
-        
+    def filter_records(self, queryset):
         # Filter by role
         role = self.request.query_params.get('role')
         if role:
             queryset = queryset.filter(user__role=role)
         
         # Filter by date range
-        from_date = self.request.query_params.get('from_date')
-        to_date = self.request.query_params.get('to_date')
+        from_date = _parse_date_param(self.request.query_params, 'from_date')
+        to_date = _parse_date_param(self.request.query_params, 'to_date')
         
         if from_date:
-            try:
-                from_date = datetime.strptime(from_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__gte=from_date)
-            except ValueError:
-                pass
+            queryset = queryset.filter(date__gte=from_date)
         
         if to_date:
-            try:
-                to_date = datetime.strptime(to_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__lte=to_date)
-            except ValueError:
-                pass
+            queryset = queryset.filter(date__lte=to_date)
         
         # Filter latecomers
         late_only = self.request.query_params.get('late_only')
         if late_only and late_only.lower() == 'true':
             queryset = queryset.filter(is_late=True)
         
-        return queryset.select_related('user')
+        return queryset
+    
+    def get_queryset(self):
+        # Archived records are included once from_date reaches back to them
+        from_date = _parse_date_param(self.request.query_params, 'from_date')
+        return attendance_queryset(
+            lambda queryset: self.only_fieldset_columns(self.filter_records(queryset)), from_date
+        ).order_by('-date', '-created_at')
 
 # NEW: Admin shift timing management
 class AdminShiftTimingListView(generics.ListCreateAPIView):
@@ -254,12 +532,39 @@ class AdminShiftTimingDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAdminUser]
     queryset = RoleShiftTiming.objects.all()
 
-class AdminUserListView(generics.ListAPIView):
+# NEW: Admin working-day calendar management
+class AdminWorkCalendarListView(generics.ListCreateAPIView):
+    serializer_class = WorkCalendarSerializer
+    permission_classes = [IsAdminUser]
+    queryset = WorkCalendar.objects.all()
+
+class AdminWorkCalendarDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = WorkCalendarSerializer
+    permission_classes = [IsAdminUser]
+    queryset = WorkCalendar.objects.all()
+
+class AdminHolidayListView(generics.ListCreateAPIView):
+    serializer_class = HolidaySerializer
+    permission_classes = [IsAdminUser]
+    
+    def get_queryset(self):
+        queryset = Holiday.objects.all()
+        calendar_id = self.request.query_params.get('calendar')
+        if calendar_id:
+            queryset = queryset.filter(calendar_id=calendar_id)
+        return queryset
+
+class AdminHolidayDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = HolidaySerializer
+    permission_classes = [IsAdminUser]
+    queryset = Holiday.objects.all()
+
+class AdminUserListView(ReplicaReadMixin, SparseFieldsMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
     
     def get_queryset(self):
-        return User.objects.all().order_by('username')
+        return self.only_fieldset_columns(User.objects.all()).order_by('username')
 
 class AdminUserUpdateView(generics.UpdateAPIView):
     serializer_class = UserDateUpdateSerializer
@@ -268,50 +573,661 @@ class AdminUserUpdateView(generics.UpdateAPIView):
     def get_queryset(self):
         return User.objects.all()
 
+# NEW: Enrollment windows of many users in one request
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_enrollment_update_view(request):
+    serializer = BulkEnrollmentUpdateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    users = serializer.get_users()
+    values = serializer.get_values()
+    conflicts = enrollment_conflicts(users, values).count()
+    if conflicts:
+        return Response(
+            {'error': f'Start date must be before end date, {conflicts} selected users would break this'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    matched, changed = update_enrollment_windows(users, values)
+    return Response({'matched': matched, 'changed': changed})
+
+# NEW: Bulk user import from a CSV/JSON upload or a JSON body
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def import_users_view(request):
+    upload = request.FILES.get('file')
+    if upload is not None:
+        try:
+            rows = read_user_rows(upload.read(), upload.name)
+        except ValueError as error:
+            return Response(
+                {'error': f'Could not read {upload.name}: {error}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    else:
+        rows = request.data.get('users') if isinstance(request.data, dict) else request.data
+    
+    serializer = UserImportSerializer(data={'users': rows})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Rows are checked here so errors come back at once, the import itself runs in the background
+    rows = serializer.validated_data['users']
+    _, errors = validate_user_rows(rows)
+    if errors:
+        return Response({
+            'created': 0,
+            'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    job = submit_user_import(request.user, rows)
+    return Response(UserImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
+def import_job_detail_view(request, job_id):
+    try:
+        job = UserImportJob.objects.get(pk=job_id)
+    except UserImportJob.DoesNotExist:
+        return Response({'error': 'Import job not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response(UserImportJobSerializer(job).data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
 def export_attendance_view(request):
     # Get filter parameters
     user_id = request.query_params.get('user_id')
     role = request.query_params.get('role')
-    from_date = request.query_params.get('from_date')
-    to_date = request.query_params.get('to_date')
+    from_date = _parse_date_param(request.query_params, 'from_date')
+    to_date = _parse_date_param(request.query_params, 'to_date')
     
-    # Build queryset
-    queryset = AttendanceRecord.objects.all()
+    filter_records = attendance_export_filter(user_id, role, from_date, to_date)
     
-    if user_id:
-        queryset = queryset.filter(user_id=user_id)
+    # Typed formats for analytics pipelines; 'format' itself is taken by DRF's renderer override
+    file_type = request.query_params.get('file_type', 'csv')
+    filename = f"attendance_report_{date.today().strftime('%Y%m%d')}"
     
-    if role:
-        queryset = queryset.filter(user__role=role)
+    if file_type == 'ndjson':
+        response = StreamingHttpResponse(
+            generate_ndjson_lines(export_rows(filter_records, from_date)),
+            content_type=EXPORT_CONTENT_TYPES['ndjson']
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}.ndjson"'
+        return response
     
-    if from_date:
+    if file_type in ('parquet', 'arrow'):
+        # Spooled to disk past a few MB, the formats need their footer written before sending
+        output = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
         try:
-            from_date = datetime.strptime(from_date, '%Y-%m-%d').date()
-            queryset = queryset.filter(date__gte=from_date)
+            write_columnar(export_rows(filter_records, from_date), output, file_type)
+        except ImportError:
+            output.close()
+            return Response(
+                {'error': f'{file_type.title()} export requires the pyarrow package'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        output.seek(0)
+        return FileResponse(
+            output, as_attachment=True, filename=f"{filename}.{file_type}",
+            content_type=EXPORT_CONTENT_TYPES[file_type]
+        )
+    
+    if file_type != 'csv':
+        return Response(
+            {'error': 'file_type must be csv, ndjson, parquet or arrow'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Generate CSV, with archived records when from_date reaches back to them
+    records = merged_attendance_records(filter_records, from_date)
+    csv_content = generate_attendance_csv(records)
+    
+    return create_csv_response(csv_content, f"{filename}.csv")
+
+# NEW: One file per role and month, rendered in parallel and zipped with a manifest
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def export_partitioned_view(request):
+    serializer = PartitionedExportSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    
+    output = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    try:
+        # Rendered in this process, only the export_partitioned command forks workers
+        write_partitioned_zip(
+            output, data['from_date'], data['to_date'], data['file_type'],
+            roles=[data['role']] if data.get('role') else None
+        )
+    except ImportError:
+        output.close()
+        return Response(
+            {'error': 'Parquet export requires the pyarrow package'},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+    output.seek(0)
+    
+    filename = f"attendance_{data['from_date'].strftime('%Y%m%d')}_{data['to_date'].strftime('%Y%m%d')}.zip"
+    return FileResponse(output, as_attachment=True, filename=filename, content_type='application/zip')
+
+# NEW: Background export jobs, files cached by filters and data version
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def export_jobs_view(request):
+    serializer = ExportJobRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    
+    data = dict(serializer.validated_data)
+    file_type = data.pop('file_type')
+    job = submit_export_job(request.user, normalize_export_filters(data), file_type)
+    
+    return Response(
+        ExportJobSerializer(job).data,
+        status=status.HTTP_200_OK if job.status == 'done' else status.HTTP_202_ACCEPTED
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_job_detail_view(request, job_id):
+    try:
+        job = ExportJob.objects.get(pk=job_id)
+    except ExportJob.DoesNotExist:
+        return Response({'error': 'Export job not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response(ExportJobSerializer(job).data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_job_download_view(request, job_id):
+    try:
+        job = ExportJob.objects.get(pk=job_id)
+    except ExportJob.DoesNotExist:
+        return Response({'error': 'Export job not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.status != 'done':
+        return Response(
+            {'error': f'Export job is {job.status}', 'job': ExportJobSerializer(job).data},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    path = export_cache().get(job.cache_key, job.file_type)
+    if path is None:
+        return Response(
+            {'error': 'Export file was evicted from the cache, submit the export again'},
+            status=status.HTTP_410_GONE
+        )
+    
+    filename = f"attendance_report_{job.created_at.strftime('%Y%m%d')}.{job.file_type}"
+    return FileResponse(
+        open(path, 'rb'), as_attachment=True, filename=filename,
+        content_type=EXPORT_CONTENT_TYPES.get(job.file_type, 'text/csv')
+    )
+
+class SecurityLogView(ReplicaReadMixin, SparseFieldsMixin, PrefetchUserMixin, generics.ListAPIView):
+    serializer_class = SecurityLogSerializer
+    permission_classes = [IsAdminUser]
+    required_columns = ['last_seen']
+    
+    def _datetime_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise exceptions.ValidationError({name: 'Must be an ISO 8601 datetime'})
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+    
+    def filter_logs(self, queryset):
+        params = self.request.query_params
+        since = self._datetime_param('since')
+        until = self._datetime_param('until')
+        
+        # Whole days are turned into datetime bounds so the last_seen index applies
+        from_date = _parse_date_param(params, 'from_date')
+        if from_date and not since:
+            since = timezone.make_aware(datetime.combine(from_date, time.min))
+        to_date = _parse_date_param(params, 'to_date')
+        if to_date and not until:
+            until = timezone.make_aware(datetime.combine(to_date, time.max))
+        
+        # Rolled-up rows span first to last seen, match any overlap with the range
+        if since:
+            queryset = queryset.filter(last_seen__gte=since)
+        
+        if until:
+            queryset = queryset.filter(timestamp__lte=until)
+        
+        if params.get('log_type'):
+            queryset = queryset.filter(log_type=params['log_type'])
+        
+        if params.get('user_id'):
+            queryset = queryset.filter(user_id=params['user_id'])
+        
+        if params.get('device'):
+            queryset = queryset.filter(device_id=params['device'])
+        
+        # A single address or a CIDR network such as 10.0.0.0/24
+        if params.get('ip'):
+            try:
+                first, last = ip_network_bounds(params['ip'])
+            except ValueError:
+                raise exceptions.ValidationError({'ip': 'Must be an IP address or CIDR network'})
+            queryset = queryset.filter(ip_packed__gte=first, ip_packed__lte=last)
+        
+        if params.get('q'):
+            queryset = search_security_logs(queryset, params['q'])
+        
+        return queryset
+    
+    def get_queryset(self):
+        from_date = _parse_date_param(self.request.query_params, 'from_date')
+        return security_log_queryset(
+            lambda queryset: self.only_fieldset_columns(self.filter_logs(queryset)), from_date
+        ).order_by('-last_seen')
+
+# NEW: Incremental change feed for downstream syncs
+CHANGE_FEED_SERIALIZERS = {
+    'attendance': AttendanceChangeSerializer,
+    'security_logs': SecurityLogSerializer,
+}
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def change_feed_view(request):
+    params = request.query_params
+    resource = params.get('resource', 'attendance')
+    if resource not in CHANGE_FEEDS:
+        return Response(
+            {'error': f"resource must be one of {', '.join(CHANGE_FEEDS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        limit = int(params.get('limit', settings.CHANGE_FEED_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= settings.CHANGE_FEED_MAX_PAGE_SIZE:
+        return Response(
+            {'error': f'limit must be between 1 and {settings.CHANGE_FEED_MAX_PAGE_SIZE}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    position = None
+    if params.get('cursor'):
+        try:
+            position = decode_cursor(resource, params['cursor'])
+        except InvalidCursor as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    rows, position, has_more = changes_after(resource, position, limit)
+    return Response({
+        'resource': resource,
+        'results': CHANGE_FEED_SERIALIZERS[resource](rows, many=True).data,
+        'next_cursor': encode_cursor(resource, *position) if position else None,
+        'has_more': has_more,
+    })
+
+# NEW: Device fingerprints with their attendance usage
+class AdminDeviceListView(ReplicaReadMixin, generics.ListAPIView):
+    serializer_class = DeviceFingerprintUsageSerializer
+    permission_classes = [IsAdminUser]
+    
+    def get_queryset(self):
+        queryset = DeviceFingerprint.objects.all()
+        user_id = self.request.query_params.get('user_id')
+        if user_id:
+            queryset = queryset.filter(attendancerecord_check_ins__user_id=user_id)
+        return queryset.annotate(
+            check_ins=Count('attendancerecord_check_ins'),
+            last_check_in=Max('attendancerecord_check_ins__check_in_time'),
+        ).order_by('-check_ins', 'id')
+
+# NEW: Close records left open at the end of a day
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def auto_close_attendance_view(request):
+    value = request.data.get('date')
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').date() if value else timezone.localdate() - timedelta(days=1)
+    except (TypeError, ValueError):
+        return Response(
+            {'error': 'date must be YYYY-MM-DD'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if day > timezone.localdate():
+        return Response(
+            {'error': 'Cannot close records of a future date'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({'date': day, 'closed': auto_close_records(day)})
+
+# NEW: Absence report
+def _absence_report_from_request(request):
+    """Build an AbsenceReport from query parameters, returns (report, error_response)"""
+    params = request.query_params
+    today = date.today()
+    
+    try:
+        from_date = datetime.strptime(params['from_date'], '%Y-%m-%d').date() if params.get('from_date') else today.replace(day=1)
+        to_date = datetime.strptime(params['to_date'], '%Y-%m-%d').date() if params.get('to_date') else today
+        # Ad-hoc weekend/holiday rules replace the role calendars for this report
+        calendar = None
+        if 'weekend_days' in params or params.get('holidays'):
+            weekend_days = settings.ATTENDANCE_WEEKEND_DAYS
+            if 'weekend_days' in params:
+                weekend_days = [int(day) for day in params['weekend_days'].split(',') if day.strip()]
+            holidays = [
+                datetime.strptime(day.strip(), '%Y-%m-%d').date()
+                for day in params.get('holidays', '').split(',') if day.strip()
+            ]
+            calendar = CompiledCalendar(weekend_days, holidays)
+    except ValueError:
+        return None, Response(
+            {'error': 'Dates must be YYYY-MM-DD and weekend_days comma-separated weekday numbers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if from_date > to_date:
+        return None, Response(
+            {'error': 'from_date must not be after to_date'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if (to_date - from_date).days >= settings.ATTENDANCE_REPORT_MAX_DAYS:
+        return None, Response(
+            {'error': f'Date range cannot exceed {settings.ATTENDANCE_REPORT_MAX_DAYS} days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    report = AbsenceReport(
+        from_date, to_date,
+        role=params.get('role'),
+        user_id=params.get('user_id'),
+        calendar=calendar,
+    )
+    return report, None
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def absence_report_view(request):
+    report, error_response = _absence_report_from_request(request)
+    if error_response is not None:
+        return error_response
+    
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(report, request)
+    response = paginator.get_paginated_response(page)
+    response.data['from_date'] = report.from_date
+    response.data['to_date'] = report.to_date
+    response.data['working_days'] = len(report.days)
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def export_absence_view(request):
+    report, error_response = _absence_report_from_request(request)
+    if error_response is not None:
+        return error_response
+    
+    filename = f"absence_report_{report.from_date.strftime('%Y%m%d')}_{report.to_date.strftime('%Y%m%d')}.csv"
+    return create_streaming_csv_response(generate_absence_csv_rows(report), filename)
+
+# NEW: Monthly attendance matrix report
+def _monthly_matrix_from_request(request):
+    """Build a MonthlyAttendanceMatrix from query parameters, returns (matrix, error_response)"""
+    today = date.today()
+    try:
+        year = int(request.query_params.get('year', today.year))
+        month = int(request.query_params.get('month', today.month))
+        date(year, month, 1)
+    except ValueError:
+        return None, Response(
+            {'error': 'year and month must be a valid year and month number'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    matrix = MonthlyAttendanceMatrix(
+        year, month,
+        role=request.query_params.get('role'),
+        user_id=request.query_params.get('user_id'),
+    )
+    return matrix, None
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def monthly_matrix_view(request):
+    matrix, error_response = _monthly_matrix_from_request(request)
+    if error_response is not None:
+        return error_response
+    
+    return Response({
+        'year': matrix.year,
+        'month': matrix.month,
+        'days': [day.item() for day in matrix.days],
+        'legend': MonthlyAttendanceMatrix.LEGEND,
+        'users': list(matrix.rows()),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def export_monthly_matrix_view(request):
+    matrix, error_response = _monthly_matrix_from_request(request)
+    if error_response is not None:
+        return error_response
+    
+    file_type = request.query_params.get('file_type', 'csv')
+    filename = f"attendance_matrix_{matrix.year}{matrix.month:02d}"
+    
+    if file_type == 'xlsx':
+        try:
+            return create_xlsx_response(
+                matrix.header(), matrix.table_rows(), f"{filename}.xlsx",
+                sheet_title=f"{matrix.year}-{matrix.month:02d}"
+            )
+        except ImportError:
+            return Response(
+                {'error': 'XLSX export requires the openpyxl package'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+    
+    if file_type != 'csv':
+        return Response(
+            {'error': 'file_type must be csv or xlsx'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return create_streaming_csv_response(
+        generate_table_csv_rows(matrix.header(), matrix.table_rows()), f"{filename}.csv"
+    )
+
+# NEW: Worked-hours and overtime analytics
+def filter_attendance_queryset(queryset, params):
+    """Apply the user_id, role and from_date/to_date filters shared by admin reports"""
+    if params.get('user_id'):
+        queryset = queryset.filter(user_id=params['user_id'])
+    
+    if params.get('role'):
+        queryset = queryset.filter(user__role=params['role'])
+    
+    if params.get('from_date'):
+        try:
+            queryset = queryset.filter(date__gte=datetime.strptime(params['from_date'], '%Y-%m-%d').date())
         except ValueError:
             pass
     
-    if to_date:
+    if params.get('to_date'):
         try:
-            to_date = datetime.strptime(to_date, '%Y-%m-%d').date()
-            queryset = queryset.filter(date__lte=to_date)
+            queryset = queryset.filter(date__lte=datetime.strptime(params['to_date'], '%Y-%m-%d').date())
         except ValueError:
             pass
     
-    # Generate CSV
-    records = queryset.select_related('user').order_by('date', 'user__username')
-    csv_content = generate_attendance_csv(records)
+    return queryset
+
+def _archived_range_error(params):
+    """Error response when report filters reach archived records, which the analytics do not read"""
+    last_archived = archived_attendance_through(
+        lambda queryset: filter_attendance_queryset(queryset, params), _parse_date_param(params, 'from_date')
+    )
+    if last_archived is None:
+        return None
+    return Response(
+        {'error': f'Records up to {last_archived} are archived, set from_date after {last_archived}'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def worked_hours_analytics_view(request):
+    group_by = [group for group in request.query_params.get('group_by', 'user').split(',') if group]
+    period = request.query_params.get('period', 'month')
+    
+    if not group_by or any(group not in WORKED_TIME_GROUPS for group in group_by):
+        return Response(
+            {'error': f"group_by must be a comma-separated list of {', '.join(WORKED_TIME_GROUPS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if period not in WORKED_TIME_PERIODS:
+        return Response(
+            {'error': f"period must be one of {', '.join(WORKED_TIME_PERIODS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    percentiles = ()
+    if request.query_params.get('percentiles', '').lower() == 'true':
+        percentiles = (50, 90, 99)
     
-    # Create filename
-    filename = f"attendance_report_{date.today().strftime('%Y%m%d')}.csv"
+    error_response = _archived_range_error(request.query_params)
+    if error_response is not None:
+        return error_response
     
-    return create_csv_response(csv_content, filename)
+    queryset = filter_attendance_queryset(AttendanceRecord.objects.all(), request.query_params)
+    return Response({
+        'group_by': group_by,
+        'period': period if 'period' in group_by else None,
+        'results': worked_time_summary(queryset, group_by, period, percentiles),
+    })
 
-class SecurityLogView(generics.ListAPIView):
-    serializer_class = SecurityLogSerializer
-    permission_classes = [IsAdminUser]
+# NEW: Lateness distribution analytics
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def lateness_analytics_view(request):
+    try:
+        bin_minutes = int(request.query_params.get('bin_minutes', 15))
+    except ValueError:
+        bin_minutes = 0
+    if not 1 <= bin_minutes <= 120:
+        return Response(
+            {'error': 'bin_minutes must be between 1 and 120'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    def get_queryset(self):
-        return SecurityLog.objects.all().select_related('user')
\ No newline at end of file
+    error_response = _archived_range_error(request.query_params)
+    if error_response is not None:
+        return error_response
+    
+    queryset = filter_attendance_queryset(AttendanceRecord.objects.all(), request.query_params)
+    
+    # Cached per filter set until a record in range is added or changed
+    params = request.query_params
+    cache_key = 'lateness:' + ':'.join(
+        params.get(name, '') for name in ('role', 'user_id', 'from_date', 'to_date')
+    ) + f':{bin_minutes}'
+    version = attendance_data_version(queryset)
+    cached = cache.get(cache_key)
+    if cached is not None and cached[0] == version:
+        return Response(cached[1])
+    
+    data = {
+        'bin_minutes': bin_minutes,
+        'roles': lateness_distribution(queryset, bin_minutes),
+    }
+    cache.set(cache_key, (version, data), settings.ANALYTICS_CACHE_SECONDS)
+    return Response(data)
+
+# NEW: Attendance history from the monthly bitmaps
+def _attendance_history_from_request(request):
+    """Build an AttendanceHistory from query parameters, returns (history, error_response)"""
+    params = request.query_params
+    user = request.user
+    
+    if params.get('user_id') and params['user_id'] != str(request.user.pk):
+        if request.user.role != 'admin':
+            return None, Response(
+                {'error': 'You can only view your own attendance history'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            user = User.objects.get(id=params['user_id'])
+        except (User.DoesNotExist, ValueError):
+            return None, Response(
+                {'error': 'User not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+    
+    try:
+        from_date = datetime.strptime(params['from_date'], '%Y-%m-%d').date() if params.get('from_date') else None
+        to_date = datetime.strptime(params['to_date'], '%Y-%m-%d').date() if params.get('to_date') else None
+    except ValueError:
+        return None, Response(
+            {'error': 'Dates must be YYYY-MM-DD'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    history_from = from_date or user.start_date or user.date_joined.date()
+    history_to = min(to_date or date.today(), date.today())
+    if history_from > history_to:
+        return None, Response(
+            {'error': 'from_date must not be after to_date or today'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if (history_to - history_from).days >= settings.ATTENDANCE_HISTORY_MAX_DAYS:
+        return None, Response(
+            {'error': f'Date range cannot exceed {settings.ATTENDANCE_HISTORY_MAX_DAYS} days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return AttendanceHistory(user, from_date, to_date), None
+
+@api_view(['GET'])
+def attendance_percentage_view(request):
+    history, error_response = _attendance_history_from_request(request)
+    if error_response is not None:
+        return error_response
+    
+    return Response(dict(history.summary(), user_id=history.user.id))
+
+@api_view(['GET'])
+def attendance_streak_view(request):
+    history, error_response = _attendance_history_from_request(request)
+    if error_response is not None:
+        return error_response
+    
+    return Response(dict(history.streaks(), user_id=history.user.id, to_date=history.to_date))
+
+@api_view(['GET'])
+def attendance_heatmap_view(request):
+    history, error_response = _attendance_history_from_request(request)
+    if error_response is not None:
+        return error_response
+    
+    return Response({
+        'user_id': history.user.id,
+        'from_date': history.from_date,
+        'to_date': history.to_date,
+        'legend': MonthlyAttendanceMatrix.LEGEND,
+        'months': history.heatmap(),
+    })
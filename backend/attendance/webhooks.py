@@ -0,0 +1,192 @@
+# attendance/webhooks.py
+import hashlib
+import hmac
+import http.client
+import json
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from .models import OutboxEvent, WebhookEndpoint
+
+SIGNATURE_HEADER = 'X-Webhook-Signature'
+
+class DeliveryError(Exception):
+    pass
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections per host, shared by the delivery threads"""
+
+    def __init__(self, timeout=10, max_idle_per_host=4):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme, netloc):
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+    def request(self, method, url, body, headers):
+        """Send a request and return the response status"""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        with self._lock:
+            connection = self._idle[key].pop() if self._idle[key] else None
+        reused = connection is not None
+
+        while True:
+            if connection is None:
+                connection = self._connect(*key)
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                connection = None
+                # The server may have dropped an idle keep-alive connection, retry once on a new one
+                if not reused:
+                    raise
+                reused = False
+
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                if len(self._idle[key]) < self.max_idle_per_host:
+                    self._idle[key].append(connection)
+                    connection = None
+            if connection is not None:
+                connection.close()
+        return response.status
+
+    def close(self):
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle.clear()
+
+def webhook_setting(name):
+    return settings.WEBHOOKS[name]
+
+def event_body(event):
+    return json.dumps({
+        'id': event.id,
+        'type': event.event_type,
+        'created_at': event.created_at,
+        'data': event.payload,
+    }, cls=DjangoJSONEncoder).encode()
+
+def sign(secret, body):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def deliver(pool, endpoint, event):
+    body = event_body(event)
+    headers = {
+        'Content-Type': 'application/json',
+        'X-Webhook-Event': event.event_type,
+        'X-Webhook-Id': str(event.id),
+    }
+    if endpoint.secret:
+        headers[SIGNATURE_HEADER] = sign(endpoint.secret, body)
+    try:
+        status = pool.request('POST', endpoint.url, body, headers)
+    except (http.client.HTTPException, OSError) as error:
+        raise DeliveryError(f'{type(error).__name__}: {error}')
+    if not 200 <= status < 300:
+        raise DeliveryError(f'HTTP {status}')
+
+def _deliver_in_order(pool, endpoint, events):
+    """Deliver events to one endpoint in id order, stopping at the first failure.
+
+    Runs in a worker thread and never touches the database. Returns
+    (last event id done, number delivered, failed event id, error).
+    """
+    last_id = endpoint.last_event_id
+    delivered = 0
+    for event in events:
+        if event.id <= last_id:
+            continue
+        if endpoint.wants(event.event_type):
+            try:
+                deliver(pool, endpoint, event)
+            except DeliveryError as error:
+                return last_id, delivered, event.id, str(error)
+            delivered += 1
+        last_id = event.id
+    return last_id, delivered, None, ''
+
+def backoff_seconds(failures):
+    return min(webhook_setting('BACKOFF_SECONDS') * 2 ** (failures - 1), webhook_setting('MAX_BACKOFF_SECONDS'))
+
+def _record_progress(endpoint, last_id, failed_id, error, now):
+    endpoint.last_event_id = last_id
+    if failed_id is None:
+        endpoint.failures = 0
+        endpoint.next_attempt_at = None
+    else:
+        endpoint.failures += 1
+        endpoint.last_error = error
+        if endpoint.failures >= webhook_setting('MAX_ATTEMPTS'):
+            # Give up on this event so it does not hold back the ones behind it
+            endpoint.last_event_id = failed_id
+            endpoint.failures = 0
+            endpoint.next_attempt_at = None
+            endpoint.last_error = f'Gave up on event {failed_id}: {error}'
+        else:
+            endpoint.next_attempt_at = now + timedelta(seconds=backoff_seconds(endpoint.failures))
+    endpoint.save(update_fields=['last_event_id', 'failures', 'next_attempt_at', 'last_error'])
+
+def prune_outbox():
+    """Delete events every active endpoint is past"""
+    done = WebhookEndpoint.objects.filter(is_active=True).order_by('last_event_id').values_list(
+        'last_event_id', flat=True
+    ).first()
+    if done is None:
+        # Nobody is subscribed, new endpoints start after the latest event anyway
+        done = OutboxEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    return OutboxEvent.objects.filter(id__lte=done).delete()[0]
+
+def dispatch_webhooks(pool, batch_size=None, max_workers=None):
+    """One dispatcher pass over the next batch of outbox events.
+
+    Endpoints are delivered to concurrently, each by one thread in event
+    order; a failed delivery stops that endpoint until its backoff expires.
+    Returns (events read for due endpoints, deliveries made), (0, 0) when idle.
+    """
+    now = timezone.now()
+    endpoints = list(WebhookEndpoint.objects.filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now), is_active=True
+    ))
+    events = []
+    if endpoints:
+        # Ids are taken at insert but visible at commit, so very recent events are left for
+        # the next pass in case a transaction holding a lower id is still committing
+        events = list(OutboxEvent.objects.filter(
+            id__gt=min(endpoint.last_event_id for endpoint in endpoints),
+            created_at__lte=now - timedelta(seconds=webhook_setting('COMMIT_LAG_SECONDS')),
+        ).order_by('id')[:batch_size or webhook_setting('BATCH_SIZE')])
+        endpoints = [endpoint for endpoint in endpoints if events and endpoint.last_event_id < events[-1].id]
+
+    if not endpoints:
+        prune_outbox()
+        return 0, 0
+
+    delivered = 0
+    workers = min(max_workers or webhook_setting('MAX_WORKERS'), len(endpoints))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda endpoint: _deliver_in_order(pool, endpoint, events), endpoints))
+    for endpoint, (last_id, count, failed_id, error) in zip(endpoints, results):
+        _record_progress(endpoint, last_id, failed_id, error, now)
+        delivered += count
+    prune_outbox()
+    return len(events), delivered
@@ -0,0 +1,114 @@
+# attendance/workdays.py
+import threading
+import time
+from datetime import date, datetime
+import numpy as np
+from django.conf import settings
+from .models import WorkCalendar
+
+def _day_of_year(day):
+    return day.toordinal() - date(day.year, 1, 1).toordinal()
+
+class CompiledCalendar:
+    """Working-day calendar compiled into one bitmap per year.
+
+    Bit n of a year's bitmap is set when day n (0 = January 1st) is a working
+    day. Years are compiled on first use and kept for the life of the object.
+    """
+
+    def __init__(self, weekend_days=(5, 6), holidays=()):
+        self.weekend_days = frozenset(int(day) for day in weekend_days)
+        self.holidays = np.array(sorted(set(holidays)), dtype='datetime64[D]')
+        self._years = {}
+
+    def year_bits(self, year):
+        """Working-day bitmap of a year as an int"""
+        bits = self._years.get(year)
+        if bits is None:
+            mask = self.year_mask(year)
+            bits = int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+            self._years[year] = bits
+        return bits
+
+    def year_mask(self, year):
+        """Working-day flags of a year as a bool array indexed by day of year"""
+        days = np.arange(np.datetime64(f'{year}-01-01'), np.datetime64(f'{year + 1}-01-01'))
+        # 1970-01-01 was a Thursday
+        mask = ~np.isin((days.astype('int64') + 3) % 7, list(self.weekend_days))
+        if len(self.holidays):
+            mask &= ~np.isin(days, self.holidays)
+        return mask
+
+    def _unpacked(self, year):
+        packed = np.frombuffer(self.year_bits(year).to_bytes(46, 'little'), dtype=np.uint8)
+        return np.unpackbits(packed, bitorder='little').astype(bool)
+
+    def is_working_day(self, day):
+        return bool((self.year_bits(day.year) >> _day_of_year(day)) & 1)
+
+    def count_working_days(self, from_date, to_date):
+        """Working days in an inclusive date range, counted with popcounts over the bitmaps"""
+        total = 0
+        for year in range(from_date.year, to_date.year + 1):
+            first = _day_of_year(from_date) if year == from_date.year else 0
+            last = _day_of_year(to_date) if year == to_date.year else 366
+            window = (1 << (last - first + 1)) - 1
+            total += ((self.year_bits(year) >> first) & window).bit_count()
+        return total
+
+    def working_day_mask(self, days):
+        """Vectorized is_working_day over a datetime64[D] array"""
+        days = np.asarray(days, dtype='datetime64[D]')
+        if not len(days):
+            return np.zeros(0, dtype=bool)
+
+        years = days.astype('datetime64[Y]').astype('int64') + 1970
+        result = np.empty(len(days), dtype=bool)
+        for year in np.unique(years):
+            in_year = years == year
+            offsets = (days[in_year] - np.datetime64(f'{year}-01-01')).astype('int64')
+            result[in_year] = self._unpacked(int(year))[offsets]
+        return result
+
+    def working_days(self, from_date, to_date):
+        """Working days of an inclusive date range as a datetime64[D] array"""
+        days = np.arange(np.datetime64(from_date, 'D'), np.datetime64(to_date, 'D') + 1)
+        return days[self.working_day_mask(days)]
+
+# Compiled calendars by role, shared by every request in the process
+_calendars = {}
+_calendars_lock = threading.Lock()
+
+def _settings_calendar():
+    holidays = [datetime.strptime(day, '%Y-%m-%d').date() for day in settings.ATTENDANCE_HOLIDAYS]
+    return CompiledCalendar(settings.ATTENDANCE_WEEKEND_DAYS, holidays)
+
+def _load_calendar(role):
+    # A role's own calendar wins over the default one
+    calendar = WorkCalendar.objects.filter(role=role).first() if role else None
+    if calendar is None:
+        calendar = WorkCalendar.objects.filter(role__isnull=True).order_by('id').first()
+
+    if calendar is None:
+        return _settings_calendar()
+    return CompiledCalendar(
+        calendar.get_weekend_days(),
+        calendar.holidays.values_list('date', flat=True),
+    )
+
+def get_calendar(role=None):
+    """Compiled working-day calendar for a role, cached in process"""
+    now = time.monotonic()
+    entry = _calendars.get(role)
+    if entry is not None and now - entry[1] < settings.WORK_CALENDAR_CACHE_SECONDS:
+        return entry[0]
+
+    calendar = _load_calendar(role)
+    with _calendars_lock:
+        _calendars[role] = (calendar, now)
+    return calendar
+
+def invalidate_calendars(**kwargs):
+    """Drop every compiled calendar, connected to calendar and holiday edits"""
+    with _calendars_lock:
+        _calendars.clear()
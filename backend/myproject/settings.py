@@ -30,10 +30,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'attendance.replicas.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'myproject.urls'
 WSGI_APPLICATION = 'myproject.wsgi.application'
+ASGI_APPLICATION = 'myproject.asgi.application'
 
 TEMPLATES = [
     {
@@ -59,6 +61,40 @@ DATABASES = {
     }
 }
 
+# Read replica for admin, report and export reads, see attendance/replicas.py. Point REPLICA_DATABASE
+# at any configured alias; REPLICA_MODE=snapshot serves them from a SQLite copy of the primary that
+# the snapshot_replica command refreshes.
+if os.environ.get('REPLICA_MODE') == 'snapshot':
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASE = 'replica'
+DATABASE_ROUTERS = ['attendance.replicas.ReplicaRouter']
+# Users read from the primary for this long after a write, keep it above the replica lag
+# (the snapshot interval in snapshot mode). Pins live in the shared default cache.
+REPLICA_PIN_SECONDS = 60
+
+# Shared by every worker process: idempotency claims and replays, replica pins and the enrollment
+# version live here. Redis when REDIS_URL is set (needs the redis package), otherwise a table in the
+# default database, created by migrate. A process-local backend is reported by the attendance.W001 check.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'attendance_cache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -115,4 +151,93 @@ OFFICE_LOCATION = {
     'radius': 100  # meters
 }
 
-AUTH_USER_MODEL = 'attendance.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'attendance.User'
+
+# Serve mark-in/mark-out with the native async views (enable when running under ASGI)
+ASYNC_ATTENDANCE_VIEWS = os.environ.get('ASYNC_ATTENDANCE_VIEWS', 'False') == 'True'
+
+# Replay cache for retried requests carrying an Idempotency-Key header. Claims and responses live in
+# the shared default cache, so a retry reaching another worker is answered too; each process also keeps
+# up to MAX_ENTRIES responses in a local LRU. A key is held in flight for IN_FLIGHT_SECONDS at most.
+IDEMPOTENCY_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'TTL_SECONDS': 24 * 60 * 60,
+    'IN_FLIGHT_SECONDS': 60,
+}
+
+# Largest batch accepted by the offline attendance sync endpoint
+OFFLINE_SYNC_MAX_EVENTS = 1000
+
+# Bulk user import: row limit, and the password hashing processes of import jobs and the import_users
+# command (None for every core), started from a forkserver so no request thread is ever forked
+USER_IMPORT_MAX_ROWS = 5000
+USER_IMPORT_HASH_WORKERS = None
+# Smaller imports are hashed in-process, starting the pool would cost more than it saves
+USER_IMPORT_PARALLEL_MIN_ROWS = 32
+
+# Working-day rules for attendance reports (Monday=0 ... Sunday=6)
+ATTENDANCE_WEEKEND_DAYS = [5, 6]
+ATTENDANCE_HOLIDAYS = []  # 'YYYY-MM-DD' strings
+ATTENDANCE_REPORT_MAX_DAYS = 366
+# Longest range the attendance history (percentage, streak, heatmap) endpoints answer
+ATTENDANCE_HISTORY_MAX_DAYS = 3660
+# Longest the in-process active-user set is trusted (enrollment edits in this process refresh it immediately)
+ACTIVE_USERS_CACHE_SECONDS = 300
+# Distinct device fingerprints kept in the in-process intern cache
+DEVICE_CACHE_MAX_ENTRIES = 10000
+
+# Repeats of a security event (same user, type, IP and device) update one log row per window of this length
+SECURITY_LOG_ROLLUP_SECONDS = 15 * 60
+
+# Rows older than these horizons are moved to the archive tables by archive_old_records
+ATTENDANCE_ARCHIVE_AFTER_DAYS = 730
+SECURITY_LOG_ARCHIVE_AFTER_DAYS = 90
+
+# Thresholds of the detect_anomalies job
+ANOMALY_DETECTION = {
+    'SHARED_WINDOW_MINUTES': 10,
+    'SHARED_DEVICE_MIN_USERS': 3,
+    # An office behind one NAT shares a public IP, so this is kept high
+    'SHARED_IP_MIN_USERS': 10,
+    'MAX_SPEED_KMH': 150,
+    'MIN_TRAVEL_KM': 1,
+    # 6 decimals is about 10 cm, real GPS fixes never repeat at that precision
+    'COORDINATE_DECIMALS': 6,
+    'REUSED_COORDINATE_MIN_DAYS': 3,
+}
+# Seconds a compiled work calendar is trusted before reloading (edits in this process invalidate immediately)
+WORK_CALENDAR_CACHE_SECONDS = 300
+
+# Webhook delivery by dispatch_webhooks; failed deliveries back off exponentially up to MAX_BACKOFF_SECONDS
+WEBHOOKS = {
+    'BATCH_SIZE': 200,
+    'MAX_WORKERS': 8,
+    'TIMEOUT_SECONDS': 10,
+    'MAX_ATTEMPTS': 8,  # An event is skipped for an endpoint after this many failures
+    'BACKOFF_SECONDS': 10,
+    'MAX_BACKOFF_SECONDS': 60 * 60,
+    'POLL_SECONDS': 2,
+    'COMMIT_LAG_SECONDS': 2,
+}
+
+# Change feed: rows changed within the lag are held back, as their transaction may still be committing
+CHANGE_FEED_LAG_SECONDS = 5
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_PAGE_SIZE = 5000
+
+# Background attendance exports; finished files are kept in CACHE_DIR, least recently used evicted past CACHE_MAX_BYTES.
+# Jobs are queued in the process that created them: a job still pending or running after TIMEOUT_SECONDS
+# is taken as lost with its process and failed, the run_export_jobs command runs the pending ones left behind.
+EXPORT_JOBS = {
+    'WORKERS': 2,
+    'CACHE_DIR': BASE_DIR / 'export_cache',
+    'CACHE_MAX_BYTES': 1024 * 1024 * 1024,
+    'TIMEOUT_SECONDS': 30 * 60,
+}
+
+# Processes the export_partitioned command renders the (role, month) files in (None for every core);
+# the HTTP endpoint renders in-process, a request thread never forks
+PARTITIONED_EXPORT_WORKERS = None
+
+# Upper bound on how long analytics results stay cached (they are also invalidated by new records)
+ANALYTICS_CACHE_SECONDS = 60 * 60